@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from config import settings
+
+# (modèle, version du template, max_chars, empreintes des fragments)
+Group = Tuple[str, str, int, Tuple[str, ...]]
+# Group + question normalisée
+Key = Tuple[Group, str]
+
+
+def normalize_question(question: str) -> str:
+    return " ".join((question or "").lower().split())
+
+
+def fragment_digest(fragment: str) -> str:
+    # Identifiant de fragment adressé par contenu (les résultats n'exposent que id_document)
+    return hashlib.sha1(" ".join((fragment or "").split()).encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass
+class _Entry:
+    answer: str
+    expires_at: float
+    question_vec: Optional[np.ndarray] = None
+
+
+class AnswerCache:
+    """
+    Cache des réponses LLM, clé = (modèle, version du template de prompt, question,
+    fragments), avec TTL et éviction LRU.
+    Mode sémantique (semantic_threshold > 0): pour le même jeu de fragments, une question
+    quasi identique (cosinus >= seuil) réutilise la réponse déjà générée.
+    """
+
+    def __init__(
+        self,
+        max_items: int = settings.answer_cache_max_items,
+        ttl_seconds: float = settings.answer_cache_ttl,
+        semantic_threshold: float = settings.answer_cache_semantic_threshold,
+    ):
+        self.max_items = max_items
+        self.ttl_seconds = ttl_seconds
+        self.semantic_threshold = semantic_threshold
+        self._entries: "OrderedDict[Key, _Entry]" = OrderedDict()
+        self._groups: Dict[Group, Set[Key]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _group(model: str, template_version: str, max_chars: int, fragments: Sequence[str]) -> Group:
+        return (model, template_version, int(max_chars), tuple(fragment_digest(f) for f in fragments))
+
+    def _embed(self, question: str) -> Optional[np.ndarray]:
+        if self.semantic_threshold <= 0:
+            return None
+        # Import local: le cache reste utilisable sans charger le modèle d'embedding
+        from rag_search import encode_texts
+
+        return encode_texts([question])[0]
+
+    async def _embed_async(self, question: str) -> Optional[np.ndarray]:
+        # Chemin asynchrone (API): encodage par le micro-batching / l'executor, la boucle
+        # d'événements n'est pas bloquée (ni par l'inférence, ni par le chargement du modèle)
+        if self.semantic_threshold <= 0:
+            return None
+        from rag_search import encode_question_async
+
+        return await encode_question_async(question)
+
+    def _remove(self, key: Key) -> None:
+        self._entries.pop(key, None)
+        keys = self._groups.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._groups[key[0]]
+
+    def _key(
+        self, model: str, template_version: str, max_chars: int, question: str, fragments: Sequence[str]
+    ) -> Key:
+        return (self._group(model, template_version, max_chars, fragments), normalize_question(question))
+
+    def _lookup_exact(self, key: Key, now: float) -> Tuple[Optional[str], List[Key]]:
+        # Réponse pour la question exacte, sinon les clés du même jeu de fragments (mode sémantique)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.answer, []
+            if entry is not None:
+                self._remove(key)
+            if self.semantic_threshold <= 0:
+                return None, []
+            return None, list(self._groups.get(key[0], ()))
+
+    def _lookup_semantic(self, q_vec: np.ndarray, candidates: List[Key], now: float) -> Optional[str]:
+        with self._lock:
+            best_key, best_sim = None, self.semantic_threshold
+            for k in candidates:
+                e = self._entries.get(k)
+                if e is None or e.question_vec is None or e.expires_at <= now:
+                    continue
+                sim = float(np.dot(q_vec, e.question_vec))
+                if sim >= best_sim:
+                    best_key, best_sim = k, sim
+            if best_key is not None:
+                self._entries.move_to_end(best_key)
+                self.semantic_hits += 1
+                return self._entries[best_key].answer
+        return None
+
+    def _miss(self) -> None:
+        with self._lock:
+            self.misses += 1
+
+    def get(
+        self,
+        model: str,
+        template_version: str,
+        max_chars: int,
+        question: str,
+        fragments: Sequence[str],
+    ) -> Optional[str]:
+        key = self._key(model, template_version, max_chars, question, fragments)
+        now = time.time()
+        answer, candidates = self._lookup_exact(key, now)
+        if answer is not None:
+            return answer
+        if candidates:
+            answer = self._lookup_semantic(self._embed(question), candidates, now)
+            if answer is not None:
+                return answer
+        self._miss()
+        return None
+
+    async def get_async(
+        self,
+        model: str,
+        template_version: str,
+        max_chars: int,
+        question: str,
+        fragments: Sequence[str],
+    ) -> Optional[str]:
+        """
+        Version asynchrone de get: la question n'est encodée (mode sémantique) que hors de
+        la boucle d'événements.
+        """
+        key = self._key(model, template_version, max_chars, question, fragments)
+        now = time.time()
+        answer, candidates = self._lookup_exact(key, now)
+        if answer is not None:
+            return answer
+        if candidates:
+            answer = self._lookup_semantic(await self._embed_async(question), candidates, now)
+            if answer is not None:
+                return answer
+        self._miss()
+        return None
+
+    def _store(self, key: Key, answer: str, q_vec: Optional[np.ndarray]) -> None:
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = _Entry(answer=answer, expires_at=time.time() + self.ttl_seconds, question_vec=q_vec)
+            self._groups.setdefault(key[0], set()).add(key)
+            while len(self._entries) > self.max_items:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def put(
+        self,
+        model: str,
+        template_version: str,
+        max_chars: int,
+        question: str,
+        fragments: Sequence[str],
+        answer: str,
+    ) -> None:
+        if not answer:
+            return
+        key = self._key(model, template_version, max_chars, question, fragments)
+        self._store(key, answer, self._embed(question))
+
+    async def put_async(
+        self,
+        model: str,
+        template_version: str,
+        max_chars: int,
+        question: str,
+        fragments: Sequence[str],
+        answer: str,
+    ) -> None:
+        if not answer:
+            return
+        key = self._key(model, template_version, max_chars, question, fragments)
+        self._store(key, answer, await self._embed_async(question))
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.semantic_hits + self.misses
+        return {
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": ((self.hits + self.semantic_hits) / lookups) if lookups else 0.0,
+            "items": len(self._entries),
+        }
+
+
+_cache: Optional[AnswerCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> Optional[AnswerCache]:
+    """
+    Cache partagé du processus (None si ANSWER_CACHE=0).
+    """
+    global _cache
+    if not settings.answer_cache_enabled:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = AnswerCache()
+        return _cache
@@ -1,11 +1,12 @@
-import os
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 
 import streamlit as st
 
-from rag_search import semantic_search, get_dsn
-from ollama_client import ollama_one_sentence_answer_for_result, ollama_answer_from_context
+from config import settings
+from metrics import RequestTrace
+from rag_search import semantic_search, get_dsn, warm_up
+from ollama_client import ollama_one_sentence_answer_for_result, ollama_answer_from_context_stream
 
 load_dotenv()
 
@@ -15,6 +16,18 @@ st.set_page_config(
     layout="wide",
 )
 
+@st.cache_resource(show_spinner="Chargement du modèle d'embeddings...")
+def _warm_up() -> dict:
+    # Une fois par processus Streamlit (et non à chaque rerun): import de torch, chargement
+    # du modèle et encodage à blanc avant la première question
+    timings = warm_up()
+    print(f"[STARTUP] streamlit: {', '.join(f'{k}={v:.0f} ms' for k, v in timings.items())}")
+    return timings
+
+
+if settings.warmup_on_startup:
+    _warm_up()
+
 st.title("Recherche sémantique dans les fiches techniques ")
 st.write(
     "Entrez une question en langage naturel. Le système renvoie les **3 fragments** les plus pertinents "
@@ -26,7 +39,18 @@ with st.sidebar:
     st.code(get_dsn(), language="text")
 
     st.subheader("Paramètres recherche")
-    top_k = st.number_input("Top K", min_value=1, max_value=20, value=int(os.getenv("TOP_K", "3")), step=1)
+    top_k = st.number_input("Top K", min_value=1, max_value=20, value=settings.top_k, step=1)
+    hybrid = st.checkbox(
+        "Recherche hybride (mots-clés + sémantique)",
+        value=settings.hybrid_search,
+        help="Ajoute la recherche plein texte: utile pour les termes exacts (amylase, xylanase, E300).",
+    )
+    rerank = st.checkbox(
+        "Re-classement (cross-encoder)",
+        value=settings.rerank_enabled,
+        help="Re-classe les RERANK_CANDIDATES meilleurs candidats (50 par défaut): utile pour les questions "
+        "à plusieurs ingrédients. Ordre vectoriel si le budget de latence est dépassé.",
+    )
     show_chars = st.slider("Affichage fragment (caractères)", min_value=200, max_value=4000, value=1200, step=100)
 
     st.subheader("LLM (Ollama)")
@@ -43,6 +67,14 @@ with st.sidebar:
         step=100,
     )
     st.caption("Conseil: phi3:mini + 700-900 chars => plus rapide.")
+    context_budget = st.number_input(
+        "Réponse finale: budget des sources (tokens)",
+        min_value=0,
+        max_value=4000,
+        value=settings.context_token_budget,
+        step=50,
+        help="Fragments dédoublonnés, fusionnés et répartis selon le score. 0 = troncature par fragment.",
+    )
 
 question = st.text_area(
     "Votre question",
@@ -63,6 +95,8 @@ if "summaries" not in st.session_state:
     st.session_state["summaries"] = {}  # index -> phrase
 if "final_answer" not in st.session_state:
     st.session_state["final_answer"] = None
+if "stream_final" not in st.session_state:
+    st.session_state["stream_final"] = False
 if "last_question" not in st.session_state:
     st.session_state["last_question"] = ""
 
@@ -75,7 +109,7 @@ if run:
 
     with st.spinner("Recherche des fragments les plus pertinents..."):
         try:
-            st.session_state["results"] = semantic_search(q, top_k=int(top_k))
+            st.session_state["results"] = semantic_search(q, top_k=int(top_k), hybrid=hybrid, rerank=rerank)
             st.session_state["summaries"] = {}
             st.session_state["final_answer"] = None
             st.session_state["last_question"] = q
@@ -128,26 +162,47 @@ if use_ollama:
 
     with c2:
         if st.button("Générer une réponse finale (Top-K)", type="secondary"):
-            contexts = [
-                {"id_document": r.id_document, "score": r.score, "texte_fragment": r.texte_fragment}
-                for r in results
-            ]
-            with st.spinner("Ollama génère une réponse à partir des fragments..."):
-                try:
-                    answer = ollama_answer_from_context(
-                        question=last_q,
-                        contexts=contexts,
-                        model=ollama_model,
-                        timeout=int(ollama_timeout),
-                        max_chars_per_context=int(max_chars_for_llm),
-                    )
-                except Exception as e:
-                    st.session_state["final_answer"] = f"(Erreur LLM: {e})"
-                else:
-                    st.session_state["final_answer"] = answer
+            # Le texte est streamé plus bas, à l'emplacement de la réponse finale
+            st.session_state["final_answer"] = None
+            st.session_state["stream_final"] = True
 
 # Display final answer
-if use_ollama and st.session_state.get("final_answer"):
+if use_ollama and st.session_state["stream_final"]:
+    st.session_state["stream_final"] = False
+    st.divider()
+    st.subheader("Réponse finale (LLM)")
+    contexts = [
+        {"id_document": r.id_document, "score": r.score, "texte_fragment": r.texte_fragment}
+        for r in results
+    ]
+
+    # Trace de l'appel: taille du prompt avant / après regroupement des sources
+    trace = RequestTrace("streamlit_final", last_q)
+
+    def _answer_tokens():
+        with trace.activate():
+            try:
+                yield from ollama_answer_from_context_stream(
+                    question=last_q,
+                    contexts=contexts,
+                    model=ollama_model,
+                    timeout=int(ollama_timeout),
+                    max_chars_per_context=int(max_chars_for_llm),
+                    context_budget_tokens=int(context_budget),
+                )
+            except Exception as e:
+                yield f"(Erreur LLM: {e})"
+
+    # Tokens affichés au fil de l'eau (time-to-first-token), texte complet gardé en session
+    answer = st.write_stream(_answer_tokens())
+    st.session_state["final_answer"] = (answer if isinstance(answer, str) else "".join(answer)).strip()
+    packing = trace.breakdown().get("info", {}).get("context_packing")
+    if packing:
+        st.caption(
+            f"Prompt: {packing['prompt_tokens_raw']} → {packing['prompt_tokens_packed']} tokens (estimés), "
+            f"{packing['fragments_in']} fragments → {packing['fragments_out']} sources"
+        )
+elif use_ollama and st.session_state.get("final_answer"):
     st.divider()
     st.subheader("Réponse finale (LLM)")
     st.success(st.session_state["final_answer"])
@@ -164,6 +219,8 @@ for i, r in enumerate(results, start=1):
         st.markdown(f"### Résultat {i}")
         st.markdown(f"**Document:** `{r.id_document}`")
         st.markdown(f"**Score de similarité:** `{r.score:.4f}` ({score_pct:.1f}%)")
+        if r.rerank_score is not None:
+            st.markdown(f"**Score de re-classement:** `{r.rerank_score:.4f}`")
         st.markdown("**Texte du fragment :**")
         st.write(display_text)
 
@@ -1,16 +1,34 @@
 from __future__ import annotations
 
+import asyncio
+import time
+import json
+from contextlib import asynccontextmanager
 from dataclasses import asdict, is_dataclass
-from typing import Any, Dict, List, Literal, Optional
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional
 
-from fastapi import FastAPI
+import httpx
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field
 
-from rag_search import semantic_search
+from config import settings
+from db import close_async_pool, close_pools, get_async_pool, get_pool, pool_metrics
+from answer_cache import get_answer_cache
+from embedding_cache import get_embedding_cache
+from embedding_engine import cache_namespace
+from metrics import RequestTrace, render_prometheus, request_trace, span
+from rag_search import close_embed_batcher, get_embed_batcher, semantic_search_async, semantic_search_many
+from ollama_pool import get_ollama_pool
+from reranker import get_reranker
+from startup import readiness, wait_for_db_async, warm_up_async
 from ollama_client import (
-    ollama_one_sentence_answer_for_result,
-    ollama_answer_from_context,
+    close_async_client,
+    llm_deadline,
+    ollama_one_sentence_answer_for_result_async,
+    ollama_answer_from_context_async,
+    ollama_answer_from_context_stream_async,
 )
 
 
@@ -20,6 +38,25 @@ from ollama_client import (
 class SearchRequest(BaseModel):
     question: str = Field(..., min_length=1, description="Question utilisateur")
     top_k: int = Field(3, ge=1, le=20, description="Nombre de fragments à retourner (Top-K)")
+    ef_search: Optional[int] = Field(
+        None, ge=1, le=1000, description="HNSW: candidats explorés (rappel vs latence), défaut serveur si absent"
+    )
+    probes: Optional[int] = Field(None, ge=1, le=1000, description="IVFFlat: listes parcourues, défaut serveur si absent")
+    hybrid: Optional[bool] = Field(
+        None, description="Plein texte + vecteurs fusionnés (RRF), pour les termes exacts; défaut: HYBRID_SEARCH"
+    )
+    document_ids: Optional[List[int]] = Field(
+        None, max_length=10000, description="Restreint la recherche à ces id_document (Top-K après filtrage)"
+    )
+    path_prefix: Optional[str] = Field(
+        None, min_length=1, description="Restreint la recherche aux PDF dont le chemin commence par ce préfixe"
+    )
+    rerank: Optional[bool] = Field(
+        None,
+        description="Re-classe RERANK_CANDIDATES candidats avec un cross-encoder (ordre vectoriel si "
+        "RERANK_BUDGET_MS est dépassé); défaut: RERANK",
+    )
+    debug: bool = Field(False, description="Ajoute à la réponse la durée de chaque étape (embed, db, LLM...)")
 
     # LLM options (Ollama)
     use_ollama: bool = Field(True, description="Active/désactive l'appel LLM")
@@ -30,13 +67,23 @@ class SearchRequest(BaseModel):
     model: str = Field("phi3:mini", description="Nom du modèle Ollama (ex: phi3:mini)")
     timeout: int = Field(60, ge=10, le=180, description="Timeout HTTP (secondes) pour Ollama")
     max_chars_for_llm: int = Field(900, ge=300, le=2500, description="Texte max envoyé au LLM par fragment")
+    context_budget_tokens: Optional[int] = Field(
+        None,
+        ge=0,
+        le=4000,
+        description="mode final: tokens des sources dans le prompt (dédoublonnées, réparties selon le score); "
+        "0 = troncature à max_chars_for_llm par fragment; défaut: CONTEXT_TOKEN_BUDGET",
+    )
 
 
 class SearchResult(BaseModel):
     id_document: Any
     score: float
     texte_fragment: str
+    rerank_score: Optional[float] = None
     phrase_llm: Optional[str] = None
+    llm_latency_ms: Optional[float] = None
+    llm_error: Optional[str] = None
 
 
 class SearchResponse(BaseModel):
@@ -44,12 +91,53 @@ class SearchResponse(BaseModel):
     top_k: int
     results: List[SearchResult]
     final_answer: Optional[str] = None
+    final_answer_latency_ms: Optional[float] = None
+    debug: Optional[Dict[str, Any]] = None
+
+
+class BatchSearchRequest(BaseModel):
+    questions: List[str] = Field(
+        ..., min_length=1, max_length=256, description="Questions (retrieval seul, sans LLM)"
+    )
+    top_k: int = Field(3, ge=1, le=20, description="Nombre de fragments à retourner par question")
+    ef_search: Optional[int] = Field(None, ge=1, le=1000, description="HNSW: candidats explorés")
+    probes: Optional[int] = Field(None, ge=1, le=1000, description="IVFFlat: listes parcourues")
+    document_ids: Optional[List[int]] = Field(None, max_length=10000, description="Filtre id_document")
+    path_prefix: Optional[str] = Field(None, min_length=1, description="Filtre préfixe du chemin PDF")
+    debug: bool = Field(False, description="Ajoute à la réponse la durée de chaque étape")
+
+
+class BatchSearchResponse(BaseModel):
+    top_k: int
+    items: List[SearchResponse]
+    debug: Optional[Dict[str, Any]] = None
 
 
 # ----------------------------
 # App + CORS
 # ----------------------------
-app = FastAPI(title="Warda Search API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    # Ouvre les pools au démarrage (min_size connexions prêtes) et les ferme proprement à l'arrêt.
+    # Pool async: routes async (/search); pool sync: routes exécutées dans le threadpool.
+    await get_async_pool()
+    get_pool()
+    # Base (SELECT 1), modèle et Ollama en tâche de fond: /health répond tout de suite,
+    # /ready quand tout est prêt
+    db_task = asyncio.create_task(wait_for_db_async())
+    warm_up_task = asyncio.create_task(warm_up_async())
+    yield
+    db_task.cancel()
+    warm_up_task.cancel()
+    # Tâches réellement terminées avant la fermeture des pools qu'elles utilisent
+    await asyncio.gather(db_task, warm_up_task, return_exceptions=True)
+    await close_embed_batcher()
+    await close_async_client()
+    await close_async_pool()
+    close_pools()
+
+
+app = FastAPI(title="Warda Search API", version="1.0.0", lifespan=lifespan)
 
 # Autoriser React (Vite) à appeler l’API en dev
 app.add_middleware(
@@ -79,12 +167,63 @@ def _to_dict(r: Any) -> Dict[str, Any]:
     return dict(r)
 
 
+def _to_api_results(results_raw: List[Any]) -> List[SearchResult]:
+    results: List[SearchResult] = []
+    for r in results_raw:
+        d = _to_dict(r)
+        results.append(
+            SearchResult(
+                id_document=d.get("id_document"),
+                score=float(d.get("score", 0.0)),
+                texte_fragment=str(d.get("texte_fragment") or ""),
+                rerank_score=d.get("rerank_score"),
+                phrase_llm=None,
+            )
+        )
+    return results
+
+
+def _json_response(response: BaseModel, trace: RequestTrace, debug: bool) -> JSONResponse:
+    # Sérialisation mesurée (étape "serialize"); le détail des étapes est ajouté si demandé
+    with span("serialize"):
+        payload = response.model_dump(mode="json")
+    if debug:
+        payload["debug"] = trace.breakdown()
+    return JSONResponse(payload)
+
+
+def _sse(event: str, data: Any) -> str:
+    # Format Server-Sent Events: une ligne "event", une ligne "data" (JSON), une ligne vide
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _fill_phrase(req: SearchRequest, result: SearchResult) -> None:
+    t0 = time.perf_counter()
+    try:
+        result.phrase_llm = await asyncio.wait_for(
+            ollama_one_sentence_answer_for_result_async(
+                question=req.question,
+                fragment=result.texte_fragment[: req.max_chars_for_llm],
+                model=req.model,
+                timeout=req.timeout,
+                max_chars=req.max_chars_for_llm,
+            ),
+            timeout=llm_deadline(req.timeout),
+        )
+    except (asyncio.TimeoutError, httpx.TimeoutException):
+        result.llm_error = "timeout"
+    except Exception as e:
+        result.llm_error = f"{type(e).__name__}: {e}"
+    finally:
+        result.llm_latency_ms = (time.perf_counter() - t0) * 1000
+
+
 # ----------------------------
 # Routes
 # ----------------------------
 @app.get("/")
 def root() -> Dict[str, str]:
-    return {"message": "Warda API is running. Use GET /health and POST /search."}
+    return {"message": "Warda API is running. Use GET /health, GET /ready, POST /search and POST /search/batch."}
 
 
 @app.get("/health")
@@ -92,54 +231,214 @@ def health() -> Dict[str, str]:
     return {"status": "ok"}
 
 
+@app.get("/ready")
+def ready() -> JSONResponse:
+    # Sonde de disponibilité (≠ /health): 503 tant que modèle, pool PostgreSQL et Ollama ne sont pas prêts
+    status = readiness.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics() -> PlainTextResponse:
+    # Format texte Prometheus: histogrammes de latence par étape et par endpoint
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/health/pool")
+def health_pool() -> Dict[str, Any]:
+    # Temps d'attente, connexions prêtées / créées => dimensionnement du pool
+    return pool_metrics()
+
+
+@app.get("/health/batcher")
+async def health_batcher() -> Dict[str, Any]:
+    # Histogrammes taille de lot / attente en file du micro-batching des embeddings
+    batcher = get_embed_batcher()
+    return {"enabled": batcher is not None, **(batcher.stats() if batcher else {})}
+
+
+@app.get("/health/ollama")
+def health_ollama() -> Dict[str, Any]:
+    # Instances Ollama: appels en cours, état du disjoncteur (closed / open / half_open), erreurs
+    return {"endpoints": get_ollama_pool().stats(), "keep_alive": settings.ollama_keep_alive or None}
+
+
+@app.get("/health/cache")
+def health_cache() -> Dict[str, Any]:
+    # Compteurs hit/miss du cache d'embeddings (questions répétées), du cache de réponses LLM
+    # et des scores de re-classement
+    emb_cache = get_embedding_cache(cache_namespace())
+    ans_cache = get_answer_cache()
+    return {
+        "embeddings": {"enabled": emb_cache is not None, **(emb_cache.stats() if emb_cache else {})},
+        "answers": {"enabled": ans_cache is not None, **(ans_cache.stats() if ans_cache else {})},
+        "rerank_scores": get_reranker().cache.stats(),
+    }
+
+
 @app.post("/search", response_model=SearchResponse)
-def search(req: SearchRequest) -> SearchResponse:
-    # 1) Retrieval (pgvector)
-    results_raw = semantic_search(req.question, top_k=req.top_k)
+async def search(req: SearchRequest) -> JSONResponse:
+    # Durée de chaque étape: histogrammes /metrics, champ debug, journal des requêtes lentes
+    with request_trace("search", req.question) as trace:
+        response = await _search(req)
+        return _json_response(response, trace, req.debug)
 
-    results: List[SearchResult] = []
-    for r in results_raw:
-        d = _to_dict(r)
-        results.append(
-            SearchResult(
-                id_document=d.get("id_document"),
-                score=float(d.get("score", 0.0)),
-                texte_fragment=str(d.get("texte_fragment") or ""),
-                phrase_llm=None,
-            )
-        )
+
+async def _search(req: SearchRequest) -> SearchResponse:
+    # Route async: aucun thread n'est bloqué pendant l'attente de PostgreSQL / Ollama
+    # 1) Retrieval (pgvector)
+    raw = await semantic_search_async(
+        req.question,
+        top_k=req.top_k,
+        ef_search=req.ef_search,
+        probes=req.probes,
+        hybrid=req.hybrid,
+        document_ids=req.document_ids,
+        path_prefix=req.path_prefix,
+        rerank=req.rerank,
+    )
+    results = _to_api_results(raw)
 
     final_answer: Optional[str] = None
+    final_answer_latency_ms: Optional[float] = None
 
     # 2) Generation (Ollama) optionnelle
     if req.use_ollama and req.mode != "none":
         if req.mode == "per_result":
-            for i in range(len(results)):
-                frag = results[i].texte_fragment[: req.max_chars_for_llm]
-                results[i].phrase_llm = ollama_one_sentence_answer_for_result(
-                    question=req.question,
-                    fragment=frag,
-                    model=req.model,
-                    timeout=req.timeout,
-                    max_chars=req.max_chars_for_llm,
-                )
+            # Appels en parallèle (bornés par OLLAMA_MAX_CONCURRENCY par backend);
+            # un appel en échec ou hors délai n'empêche pas de renvoyer les autres phrases.
+            await asyncio.gather(*(_fill_phrase(req, r) for r in results))
 
         elif req.mode == "final":
             contexts = [
                 {"id_document": r.id_document, "score": r.score, "texte_fragment": r.texte_fragment}
                 for r in results
             ]
-            final_answer = ollama_answer_from_context(
+            t0 = time.perf_counter()
+            final_answer = await ollama_answer_from_context_async(
                 question=req.question,
                 contexts=contexts,
                 model=req.model,
                 timeout=req.timeout,
                 max_chars_per_context=req.max_chars_for_llm,
+                context_budget_tokens=req.context_budget_tokens,
             )
+            final_answer_latency_ms = (time.perf_counter() - t0) * 1000
 
     return SearchResponse(
         question=req.question,
         top_k=req.top_k,
         results=results,
         final_answer=final_answer,
-    )
\ No newline at end of file
+        final_answer_latency_ms=final_answer_latency_ms,
+    )
+
+
+@app.post("/search/batch", response_model=BatchSearchResponse)
+def search_batch(req: BatchSearchRequest) -> JSONResponse:
+    # Un seul encode (batch) + un seul aller-retour SQL pour toutes les questions
+    questions = [q.strip() for q in req.questions]
+    if any(not q for q in questions):
+        raise HTTPException(status_code=422, detail="Question vide dans le lot")
+
+    with request_trace("search_batch", questions) as trace:
+        per_question = semantic_search_many(
+            questions,
+            top_k=req.top_k,
+            ef_search=req.ef_search,
+            probes=req.probes,
+            document_ids=req.document_ids,
+            path_prefix=req.path_prefix,
+        )
+        response = BatchSearchResponse(
+            top_k=req.top_k,
+            items=[
+                SearchResponse(question=q, top_k=req.top_k, results=_to_api_results(raw))
+                for q, raw in zip(questions, per_question)
+            ],
+        )
+        return _json_response(response, trace, req.debug)
+
+
+@app.post("/search/stream")
+async def search_stream(req: SearchRequest) -> StreamingResponse:
+    """
+    Server-Sent Events:
+    - event "results": les Top-K fragments, dès la fin du retrieval
+    - event "token": chaque morceau de la réponse finale Top-K dès réception
+      (si use_ollama et mode == "final"; per_result n'est pas streamé: résultats puis "done",
+      sans réponse générée; utiliser POST /search pour une phrase par fragment)
+    - event "done": réponse complète + latence (+ durée des étapes si debug);
+      event "error" en cas d'échec LLM
+    La trace de la requête se termine avec le flux (appel LLM compris).
+    """
+    trace = RequestTrace("search_stream", req.question)
+    try:
+        with trace.activate():
+            raw = await semantic_search_async(
+                req.question,
+                top_k=req.top_k,
+                ef_search=req.ef_search,
+                probes=req.probes,
+                hybrid=req.hybrid,
+                document_ids=req.document_ids,
+                path_prefix=req.path_prefix,
+                rerank=req.rerank,
+            )
+    except BaseException:
+        trace.finish()
+        raise
+    results = _to_api_results(raw)
+
+    def done(data: Dict[str, Any]) -> str:
+        return _sse("done", {**data, "debug": trace.breakdown()} if req.debug else data)
+
+    async def events() -> AsyncIterator[str]:
+        yield _sse(
+            "results",
+            {"question": req.question, "top_k": req.top_k, "results": [r.model_dump() for r in results]},
+        )
+        if not req.use_ollama or req.mode != "final":
+            yield done({"final_answer": None})
+            return
+
+        contexts = [
+            {"id_document": r.id_document, "score": r.score, "texte_fragment": r.texte_fragment}
+            for r in results
+        ]
+        parts: List[str] = []
+        t0 = time.perf_counter()
+        try:
+            async for token in ollama_answer_from_context_stream_async(
+                question=req.question,
+                contexts=contexts,
+                model=req.model,
+                timeout=req.timeout,
+                max_chars_per_context=req.max_chars_for_llm,
+                context_budget_tokens=req.context_budget_tokens,
+            ):
+                parts.append(token)
+                yield _sse("token", {"token": token})
+        except Exception as e:
+            yield _sse("error", {"detail": f"{type(e).__name__}: {e}"})
+            return
+        yield done(
+            {
+                "final_answer": "".join(parts).strip(),
+                "final_answer_latency_ms": (time.perf_counter() - t0) * 1000,
+            }
+        )
+
+    async def traced_events() -> AsyncIterator[str]:
+        try:
+            with trace.activate():
+                async for event in events():
+                    yield event
+        finally:
+            trace.finish()
+
+    return StreamingResponse(
+        traced_events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,93 @@
+"""
+Balayage des réglages de recherche pgvector: recall@K vs latence, contre la recherche exacte.
+
+Pour chaque valeur de ef_search (index HNSW) et de probes (index IVFFlat) présents sur la
+table embeddings, la même série de requêtes passe par PgVectorBackend avec
+SearchOptions(ef_search=..., probes=...). La vérité terrain est un scan complet sans index.
+
+Usage (construire l'index à tester avec vector_index.py):
+    python benchmarks/bench_index_tuning.py --queries 200 --top_k 10
+    python benchmarks/bench_index_tuning.py --ef_search 10,20,40,80,160,320 --probes 1,4,16,64
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Set
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from bench_quantization import Hit, _exact, _keys, _sample_queries  # noqa: E402
+from db import get_connection  # noqa: E402
+from retrieval import PgVectorBackend, SearchOptions  # noqa: E402
+from vector_index import INDEX_METHODS, index_name, list_vector_indexes  # noqa: E402
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def _measure(
+    backend: PgVectorBackend, queries: np.ndarray, truth: List[Set[Hit]], top_k: int, options: SearchOptions
+) -> Dict[str, float]:
+    for q in queries[:5]:  # warm-up (cache + plans préparés)
+        backend.search(q, top_k, options)
+
+    latencies, recalls = [], []
+    for q, expected in zip(queries, truth):
+        t0 = time.perf_counter()
+        got = backend.search(q, top_k, options)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        recalls.append(len(_keys(got) & expected) / max(1, len(expected)))
+    return {
+        "recall": float(np.mean(recalls)),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+
+def run(n_queries: int, top_k: int, ef_values: List[int], probe_values: List[int], noise: float) -> List[Dict]:
+    with get_connection() as conn:
+        valid = {idx["name"] for idx in list_vector_indexes(conn) if idx["valid"] == "oui"}
+    methods = {m for m in INDEX_METHODS if index_name("full", m) in valid}
+    if not methods:
+        raise RuntimeError("Aucun index hnsw / ivfflat sur embeddings (voir vector_index.py)")
+
+    queries = _sample_queries(n_queries, noise, seed=0)
+    truth = _exact(queries, top_k)
+    backend = PgVectorBackend(storage="full")
+
+    # Si les deux index existent, le planificateur choisit: garder un seul index (--replace)
+    sweep = []
+    if "hnsw" in methods:
+        sweep += [("hnsw", f"ef_search={ef}", SearchOptions(ef_search=ef)) for ef in ef_values]
+    if "ivfflat" in methods:
+        sweep += [("ivfflat", f"probes={p}", SearchOptions(probes=p)) for p in probe_values]
+
+    return [
+        {"method": method, "param": param, **_measure(backend, queries, truth, top_k, options)}
+        for method, param, options in sweep
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="pgvector: recall@K vs latence selon ef_search / probes.")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top_k", type=int, default=10)
+    parser.add_argument("--ef_search", type=_int_list, default=[10, 20, 40, 80, 160, 320])
+    parser.add_argument("--probes", type=_int_list, default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--noise", type=float, default=0.05, help="Bruit ajouté aux vecteurs requêtes")
+    args = parser.parse_args()
+
+    rows = run(args.queries, args.top_k, args.ef_search, args.probes, args.noise)
+    print(f"{'index':<8} {'réglage':<16} {'recall@' + str(args.top_k):>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for r in rows:
+        print(f"{r['method']:<8} {r['param']:<16} {r['recall']:>10.3f} {r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
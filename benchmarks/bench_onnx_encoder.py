@@ -0,0 +1,116 @@
+"""
+Vérifie le moteur d'embedding ONNX (EMBEDDING_ENGINE=onnx) contre PyTorch (SentenceTransformer).
+
+- accord: cosinus entre les vecteurs PyTorch et ONNX pour les mêmes textes (moyenne / min),
+  et part des textes dont le cosinus dépasse --min_cosine
+- vitesse: latence p50 en batch 1 (questions) et débit en batch (ingestion), speedup ONNX/PyTorch
+
+Les textes viennent de la table embeddings (--db) ou d'un petit corpus intégré.
+
+Usage:
+    python benchmarks/bench_onnx_encoder.py --n 256
+    python benchmarks/bench_onnx_encoder.py --n 1000 --db --threads 4
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from config import settings  # noqa: E402
+from embedding_engine import OnnxEncoder, load_model, onnx_model_dir  # noqa: E402
+
+SAMPLE_TEXTS = [
+    "Quel dosage est conseillé pour un blocage froid positif (2°C) ?",
+    "c'est quoi l'acide ascorbique ?",
+    "L'amylase fongique améliore la couleur de la croûte et le volume du pain.",
+    "Xylanase: dosage recommandé de 5 à 20 ppm sur le poids de farine.",
+    "Améliorant de panification pour pâtes surgelées, à conserver au sec.",
+    "E300 (acide ascorbique) renforce le réseau glutineux pendant le pétrissage.",
+    "Mentions légales: fiche technique non contractuelle, susceptible d'évoluer.",
+    "Pour la viennoiserie, incorporer 0,5 % du poids de farine en début de pétrissage.",
+]
+
+
+def _texts(n: int, from_db: bool) -> List[str]:
+    if from_db:
+        from db import get_connection
+
+        with get_connection() as conn:
+            rows = conn.execute("SELECT texte_fragment FROM embeddings ORDER BY random() LIMIT %s", (n,)).fetchall()
+        return [r[0] for r in rows]
+    # Corpus intégré: phrases combinées pour varier les longueurs
+    rng = np.random.default_rng(0)
+    return [" ".join(rng.choice(SAMPLE_TEXTS, size=int(rng.integers(1, 6)))) for _ in range(n)]
+
+
+def _p50_ms(fn: Callable[[], object], repeat: int) -> float:
+    fn()  # warm-up
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return float(np.percentile(times, 50))
+
+
+def run(n: int, from_db: bool, batch_size: int, threads: int, min_cosine: float) -> Dict[str, float]:
+    texts = _texts(n, from_db)
+    torch_model = load_model("torch")
+    model_dir = onnx_model_dir()
+    if not (model_dir / "meta.json").exists():
+        load_model("onnx")  # export
+    onnx_model = OnnxEncoder(model_dir, intra_op_threads=threads)
+
+    ref = np.asarray(torch_model.encode(texts, batch_size=batch_size, normalize_embeddings=True), dtype=np.float32)
+    got = onnx_model.encode(texts, batch_size=batch_size, normalize_embeddings=True)
+    if got.shape != ref.shape:
+        raise ValueError(f"Dimensions différentes: onnx {got.shape} vs torch {ref.shape}")
+    cos = np.sum(ref * got, axis=1)
+
+    question = texts[:1]
+    torch_q = _p50_ms(lambda: torch_model.encode(question, normalize_embeddings=True), repeat=50)
+    onnx_q = _p50_ms(lambda: onnx_model.encode(question, normalize_embeddings=True), repeat=50)
+
+    t0 = time.perf_counter()
+    torch_model.encode(texts, batch_size=batch_size, normalize_embeddings=True)
+    torch_batch = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    onnx_model.encode(texts, batch_size=batch_size, normalize_embeddings=True)
+    onnx_batch = time.perf_counter() - t0
+
+    return {
+        "cosine_mean": float(cos.mean()),
+        "cosine_min": float(cos.min()),
+        f"share_cosine>={min_cosine}": float(np.mean(cos >= min_cosine)),
+        "torch_query_p50_ms": torch_q,
+        "onnx_query_p50_ms": onnx_q,
+        "query_speedup": torch_q / onnx_q,
+        "torch_texts_per_s": n / torch_batch,
+        "onnx_texts_per_s": n / onnx_batch,
+        "batch_speedup": torch_batch / onnx_batch,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Accord cosinus et speedup ONNX int8 vs PyTorch.")
+    parser.add_argument("--n", type=int, default=256, help="Nombre de textes")
+    parser.add_argument("--db", action="store_true", help="Textes tirés de la table embeddings")
+    parser.add_argument("--batch_size", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=settings.onnx_intra_op_threads, help="Threads ONNX Runtime")
+    parser.add_argument("--min_cosine", type=float, default=0.99)
+    args = parser.parse_args()
+
+    report = run(args.n, args.db, args.batch_size, args.threads, args.min_cosine)
+    for name, value in report.items():
+        print(f"{name:<28} {value:>10.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Compare les modes de stockage/index pgvector (VECTOR_STORAGE): full, halfvec, binary.
+
+Pour chaque mode: taille de l'index, recall@K contre la recherche exacte (scan complet,
+sans index) et latence p50/p99 par requête. Les requêtes sont des vecteurs de la table
+légèrement bruités (pas besoin du modèle d'embedding).
+
+Usage (les index compacts doivent exister: VECTOR_STORAGE=halfvec python ingest.py ...
+ou psql -f schema_quantized.sql):
+    python benchmarks/bench_quantization.py --queries 200 --top_k 10 --oversample 4
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Set, Tuple
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from db import get_connection  # noqa: E402
+from retrieval import VECTOR_STORAGES, PgVectorBackend, SearchResult, top_k_sql  # noqa: E402
+
+INDEX_BY_STORAGE = {
+    "full": "embeddings_vecteur_hnsw",
+    "halfvec": "embeddings_vecteur_halfvec_hnsw",
+    "binary": "embeddings_vecteur_bq_hnsw",
+}
+
+Hit = Tuple[int, str]
+
+
+def _keys(results: List[SearchResult]) -> Set[Hit]:
+    # Les résultats n'exposent pas l'id du fragment: (id_document, texte) sert d'identifiant
+    return {(r.id_document, r.texte_fragment) for r in results}
+
+
+def _sample_queries(n: int, noise: float, seed: int) -> np.ndarray:
+    with get_connection() as conn:
+        with conn.cursor(binary=True) as cur:
+            cur.execute("SELECT vecteur FROM embeddings ORDER BY random() LIMIT %s", (n,))
+            vecs = np.vstack([r[0] for r in cur.fetchall()])
+    rng = np.random.default_rng(seed)
+    vecs = vecs + noise * rng.standard_normal(vecs.shape).astype(np.float32)
+    return (vecs / np.linalg.norm(vecs, axis=1, keepdims=True)).astype(np.float32)
+
+
+def _exact(queries: np.ndarray, top_k: int) -> List[Set[Hit]]:
+    out = []
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            # Scan complet + tri: vérité terrain exacte (aucun index approximatif)
+            cur.execute("SET LOCAL enable_indexscan = off")
+            cur.execute("SET LOCAL enable_bitmapscan = off")
+            for q in queries:
+                cur.execute(top_k_sql("full"), {"vec": q, "top_k": top_k})
+                out.append({(int(r[0]), str(r[1])) for r in cur.fetchall()})
+    return out
+
+
+def _index_size(name: str) -> str:
+    with get_connection() as conn:
+        row = conn.execute(
+            "SELECT pg_size_pretty(pg_relation_size(c)) FROM to_regclass(%s) c", (name,)
+        ).fetchone()
+    return row[0] or "absent"
+
+
+def run(n_queries: int, top_k: int, oversample: int, noise: float) -> Dict[str, Dict[str, object]]:
+    queries = _sample_queries(n_queries, noise, seed=0)
+    truth = _exact(queries, top_k)
+    report: Dict[str, Dict[str, object]] = {}
+
+    for storage in VECTOR_STORAGES:
+        backend = PgVectorBackend(storage=storage, oversample=oversample)
+        for q in queries[:5]:  # warm-up (cache + plans préparés)
+            backend.search(q, top_k)
+
+        latencies, recalls = [], []
+        for q, expected in zip(queries, truth):
+            t0 = time.perf_counter()
+            got = backend.search(q, top_k)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            recalls.append(len(_keys(got) & expected) / max(1, len(expected)))
+
+        report[storage] = {
+            "index": INDEX_BY_STORAGE[storage],
+            "index_size": _index_size(INDEX_BY_STORAGE[storage]),
+            f"recall@{top_k}": float(np.mean(recalls)),
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p99_ms": float(np.percentile(latencies, 99)),
+        }
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Index pgvector: full vs halfvec vs binaire (+ re-ranking).")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top_k", type=int, default=10)
+    parser.add_argument("--oversample", type=int, default=4, help="Candidats = oversample x top_k")
+    parser.add_argument("--noise", type=float, default=0.05, help="Bruit ajouté aux vecteurs requêtes")
+    args = parser.parse_args()
+
+    report = run(args.queries, args.top_k, args.oversample, args.noise)
+    print(f"{'mode':<8} {'index':<34} {'taille':>10} {'recall@' + str(args.top_k):>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for storage, r in report.items():
+        print(
+            f"{storage:<8} {r['index']:<34} {r['index_size']:>10} {r[f'recall@{args.top_k}']:>10.3f}"
+            f" {r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
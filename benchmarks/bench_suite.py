@@ -0,0 +1,384 @@
+"""
+Suite de benchmarks reproductible (corpus synthétique, Ollama simulé), résultats en JSON pour
+comparer deux commits.
+
+- ingest: lignes/s du chargement (numpy: construction de l'instantané en mémoire;
+  pgvector: COPY binaire dans embeddings, index compris, lignes supprimées à la fin)
+- search: QPS et latence p50/p95/p99 de get_backend().search pour chaque niveau de concurrence
+- e2e: latence de POST /search (API FastAPI en processus, transport ASGI) pour chaque mode
+  (none, per_result, final), avec des faux serveurs Ollama à latence fixe (stub_ollama.py)
+
+Hors ligne par défaut: backend numpy chargé depuis le corpus synthétique, encodeur par hachage
+(--encoder model pour le vrai modèle), caches d'embeddings et de réponses désactivés.
+
+Usage:
+    python benchmarks/bench_suite.py --fragments 50000 --concurrency 1,4,16
+    python benchmarks/bench_suite.py --backend pgvector --phases ingest,search
+    python benchmarks/bench_suite.py --compare .cache/bench/ancien.json
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+# Mesures sans cache (chaque question est nouvelle); à fixer avant l'import de config
+os.environ.setdefault("EMBEDDING_CACHE", "0")
+os.environ.setdefault("ANSWER_CACHE", "0")
+os.environ.setdefault("WARMUP_ON_STARTUP", "0")
+# Hors ligne: pas de tokenizer à télécharger (CONTEXT_TOKEN_BUDGET=600 pour mesurer le regroupement)
+os.environ.setdefault("CONTEXT_TOKEN_BUDGET", "0")
+
+from config import settings  # noqa: E402
+
+PHASES = ("ingest", "search", "e2e")
+MODES = ("none", "per_result", "final")
+# id_document des fragments synthétiques (pgvector): hors de la plage des vrais documents
+BENCH_DOCUMENT_BASE = 2_000_000_000
+
+VOCAB = (
+    "farine amylase xylanase acide ascorbique E300 dosage ppm levure pétrissage pointage "
+    "apprêt cuisson croûte mie volume blocage froid surgelé viennoiserie baguette améliorant "
+    "enzyme gluten hydratation température fiche technique conservation poids pâte four"
+).split()
+
+
+# ----------------------------
+# Corpus synthétique
+# ----------------------------
+def synthetic_corpus(n_fragments: int, n_documents: int, seed: int = 0) -> Tuple[np.ndarray, List[str], np.ndarray]:
+    """
+    (id_document, textes, vecteurs normalisés (n, 384) float32), déterministe pour un seed donné.
+    """
+    rng = np.random.default_rng(seed)
+    doc_ids = np.sort(rng.integers(1, max(1, n_documents) + 1, size=n_fragments)).astype(np.int64)
+    lengths = rng.integers(40, 160, size=n_fragments)
+    words = rng.integers(0, len(VOCAB), size=int(lengths.sum()))
+    texts, start = [], 0
+    for i, n in enumerate(lengths):
+        texts.append(f"[{i}] " + " ".join(VOCAB[w] for w in words[start : start + n]))
+        start += n
+    vectors = rng.standard_normal((n_fragments, 384), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return doc_ids, texts, vectors
+
+
+def sample_queries(vectors: np.ndarray, n: int, noise: float = 0.05, seed: int = 1) -> np.ndarray:
+    # Fragments du corpus légèrement bruités: chaque requête a de vrais voisins proches
+    rng = np.random.default_rng(seed)
+    q = vectors[rng.integers(0, vectors.shape[0], size=n)]
+    q = q + noise * rng.standard_normal(q.shape, dtype=np.float32)
+    return (q / np.linalg.norm(q, axis=1, keepdims=True)).astype(np.float32)
+
+
+class HashEncoder:
+    """
+    Encodeur déterministe sans modèle (vecteur pseudo-aléatoire dérivé du hash du texte):
+    isole le coût du retrieval, de l'API et du LLM.
+    """
+
+    def encode(self, sentences: Any, batch_size: int = 32, normalize_embeddings: bool = False, **_: Any) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        out = np.empty((len(texts), 384), dtype=np.float32)
+        for i, t in enumerate(texts):
+            seed = int.from_bytes(hashlib.blake2b(t.encode("utf-8"), digest_size=8).digest(), "little")
+            out[i] = np.random.default_rng(seed).standard_normal(384, dtype=np.float32)
+        if normalize_embeddings:
+            out /= np.linalg.norm(out, axis=1, keepdims=True)
+        return out[0] if single else out
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return 384
+
+
+# ----------------------------
+# Mesures
+# ----------------------------
+def _latency_stats(latencies_ms: Sequence[float], wall_s: float) -> Dict[str, float]:
+    arr = np.asarray(latencies_ms)
+    return {
+        "requests": int(arr.size),
+        "qps": float(arr.size / wall_s) if wall_s > 0 else 0.0,
+        "p50_ms": float(np.percentile(arr, 50)),
+        "p95_ms": float(np.percentile(arr, 95)),
+        "p99_ms": float(np.percentile(arr, 99)),
+        "mean_ms": float(arr.mean()),
+    }
+
+
+def bench_ingest(backend_name: str, doc_ids: np.ndarray, texts: List[str], vectors: np.ndarray, batch_size: int) -> Dict:
+    if backend_name == "numpy":
+        from retrieval import NumpyBackend
+
+        backend = NumpyBackend()
+        t0 = time.perf_counter()
+        backend.load_arrays(doc_ids, texts, vectors)
+        seconds = time.perf_counter() - t0
+        return {"backend": backend_name, "rows": len(texts), "seconds": seconds, "rows_per_s": len(texts) / seconds}
+
+    from db import get_connection
+    from ingest import copy_rows, ensure_schema
+
+    ensure_schema()
+    rows = [(BENCH_DOCUMENT_BASE + int(d), t, v) for d, t, v in zip(doc_ids, texts, vectors)]
+    with get_connection() as conn:
+        t0 = time.perf_counter()
+        for start in range(0, len(rows), batch_size):
+            copy_rows(conn, rows[start : start + batch_size])
+        seconds = time.perf_counter() - t0
+    return {
+        "backend": backend_name,
+        "rows": len(rows),
+        "seconds": seconds,
+        "rows_per_s": len(rows) / seconds,
+        "batch_size": batch_size,
+        "index_method": settings.vector_index_method,
+    }
+
+
+def cleanup_pgvector() -> int:
+    from db import get_connection
+
+    with get_connection() as conn:
+        cur = conn.execute("DELETE FROM embeddings WHERE id_document >= %s", (BENCH_DOCUMENT_BASE,))
+        return cur.rowcount
+
+
+def bench_search(queries: np.ndarray, top_k: int, concurrency: Sequence[int]) -> List[Dict]:
+    from retrieval import get_backend
+
+    backend = get_backend()
+    for q in queries[:10]:  # warm-up (plans préparés, pages en cache)
+        backend.search(q, top_k)
+
+    def timed(q: np.ndarray) -> float:
+        t0 = time.perf_counter()
+        backend.search(q, top_k)
+        return (time.perf_counter() - t0) * 1000
+
+    out = []
+    for c in concurrency:
+        with ThreadPoolExecutor(max_workers=c) as ex:
+            t0 = time.perf_counter()
+            latencies = list(ex.map(timed, queries))
+            wall = time.perf_counter() - t0
+        out.append({"concurrency": c, "top_k": top_k, **_latency_stats(latencies, wall)})
+    return out
+
+
+async def _bench_e2e_async(n_requests: int, top_k: int, concurrency: Sequence[int], modes: Sequence[str]) -> List[Dict]:
+    import httpx
+
+    from backend.api import app
+    from db import close_async_pool, close_pools
+    from ollama_client import close_async_client
+    from rag_search import close_embed_batcher
+
+    out = []
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+            for mode in modes:
+                for c in concurrency:
+                    sem = asyncio.Semaphore(c)
+                    errors = 0
+
+                    async def one(i: int) -> Optional[float]:
+                        nonlocal errors
+                        body = {
+                            # Question unique: ni cache d'embeddings ni cache de réponses
+                            "question": f"Quel dosage d'amylase pour une baguette ? #{mode}-{c}-{i}",
+                            "top_k": top_k,
+                            "use_ollama": mode != "none",
+                            "mode": mode,
+                        }
+                        async with sem:
+                            t0 = time.perf_counter()
+                            resp = await client.post("/search", json=body)
+                            ms = (time.perf_counter() - t0) * 1000
+                        results = resp.json().get("results", []) if resp.status_code == 200 else []
+                        if resp.status_code != 200 or any(r.get("llm_error") for r in results):
+                            errors += 1
+                        return ms
+
+                    t0 = time.perf_counter()
+                    latencies = await asyncio.gather(*(one(i) for i in range(n_requests)))
+                    wall = time.perf_counter() - t0
+                    out.append(
+                        {"mode": mode, "concurrency": c, "top_k": top_k, "errors": errors, **_latency_stats(latencies, wall)}
+                    )
+                    print(f"[E2E] mode={mode} concurrency={c}: p50={out[-1]['p50_ms']:.1f} ms, {errors} erreur(s)")
+    finally:
+        await close_embed_batcher()
+        await close_async_client()
+        await close_async_pool()
+        close_pools()
+    return out
+
+
+# ----------------------------
+# Résultats
+# ----------------------------
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _rows_by_key(report: Dict, section: str) -> Dict[Tuple, Dict]:
+    return {(r.get("mode"), r["concurrency"]): r for r in report.get(section) or []}
+
+
+def compare(old: Dict, new: Dict) -> None:
+    """
+    Affiche les écarts nouveau / ancien (ratio > 1 = plus lent pour les latences).
+    """
+    print(f"[COMPARE] {old['meta'].get('commit')} -> {new['meta'].get('commit')}")
+    if old.get("ingest") and new.get("ingest"):
+        ratio = new["ingest"]["rows_per_s"] / old["ingest"]["rows_per_s"]
+        print(f"ingest rows_per_s          x{ratio:.2f}")
+    for section in ("search", "e2e"):
+        before = _rows_by_key(old, section)
+        for key, row in _rows_by_key(new, section).items():
+            if key not in before:
+                continue
+            label = f"{section} {key[0] or ''} c={key[1]}".replace("  ", " ")
+            ratios = "  ".join(
+                f"{m} x{row[m] / before[key][m]:.2f}" for m in ("qps", "p50_ms", "p99_ms") if before[key][m]
+            )
+            print(f"{label:<26} {ratios}")
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def _str_list(value: str) -> List[str]:
+    return [v.strip() for v in value.split(",") if v.strip()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmarks ingestion / recherche / API de bout en bout (JSON).")
+    parser.add_argument("--backend", choices=("numpy", "pgvector"), default="numpy")
+    parser.add_argument("--phases", type=_str_list, default=list(PHASES), help="Parmi: ingest,search,e2e")
+    parser.add_argument("--fragments", type=int, default=20000, help="Taille du corpus synthétique")
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=1000, help="Requêtes par niveau de concurrence (search)")
+    parser.add_argument("--requests", type=int, default=50, help="Requêtes /search par mode et concurrence (e2e)")
+    parser.add_argument("--top_k", type=int, default=3)
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 4, 16])
+    parser.add_argument("--modes", type=_str_list, default=list(MODES))
+    parser.add_argument("--batch_size", type=int, default=settings.ingest_batch_size, help="Lignes par COPY (pgvector)")
+    parser.add_argument("--encoder", choices=("hash", "model"), default="hash")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--llm_latency_ms", type=float, default=200.0, help="Ollama simulé: délai avant 1er token")
+    parser.add_argument("--llm_tokens_per_s", type=float, default=50.0)
+    parser.add_argument("--stubs", type=int, default=1, help="Nombre d'instances Ollama simulées (répartition)")
+    parser.add_argument("--stub_error_rate", type=float, default=0.0, help="Part des appels en erreur 503 (disjoncteur)")
+    parser.add_argument("--no_stub", action="store_true", help="Utiliser les instances OLLAMA_ENDPOINTS réelles")
+    parser.add_argument("--keep", action="store_true", help="pgvector: garder les lignes synthétiques")
+    parser.add_argument("--out", type=Path, default=None, help="Fichier JSON (défaut: .cache/bench/<date>-<commit>.json)")
+    parser.add_argument("--compare", type=Path, default=None, help="Résultat précédent à comparer")
+    args = parser.parse_args()
+
+    unknown = set(args.phases) - set(PHASES) or set(args.modes) - set(MODES)
+    if unknown:
+        raise SystemExit(f"Valeur inconnue: {', '.join(sorted(unknown))}")
+
+    import rag_search
+    import retrieval
+    from retrieval import NumpyBackend, PgVectorBackend
+
+    doc_ids, texts, vectors = synthetic_corpus(args.fragments, args.documents, args.seed)
+    report: Dict[str, Any] = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "args": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()},
+            "settings": {
+                "vector_storage": settings.vector_storage,
+                "vector_index_method": settings.vector_index_method,
+                "numpy_ivf_lists": settings.numpy_ivf_lists,
+                "embed_batch_enabled": settings.embed_batch_enabled,
+                "ollama_max_concurrency": settings.ollama_max_concurrency,
+                "ollama_keep_alive": settings.ollama_keep_alive,
+                "context_token_budget": settings.context_token_budget,
+            },
+        }
+    }
+
+    # Backend utilisé par semantic_search / l'API pendant tout le benchmark
+    if args.backend == "numpy":
+        backend = NumpyBackend()
+        backend.load_arrays(doc_ids, texts, vectors)
+    else:
+        backend = PgVectorBackend()
+    retrieval._backend = backend
+    if args.encoder == "hash":
+        rag_search._model = HashEncoder()
+
+    try:
+        if "ingest" in args.phases:
+            report["ingest"] = bench_ingest(args.backend, doc_ids, texts, vectors, args.batch_size)
+            print(f"[INGEST] {report['ingest']['rows_per_s']:.0f} lignes/s")
+
+        if "search" in args.phases:
+            queries = sample_queries(vectors, args.queries, seed=args.seed + 1)
+            report["search"] = bench_search(queries, args.top_k, args.concurrency)
+            for row in report["search"]:
+                print(f"[SEARCH] concurrency={row['concurrency']}: {row['qps']:.0f} QPS, p99={row['p99_ms']:.2f} ms")
+
+        if "e2e" in args.phases:
+            stubs = []
+            if not args.no_stub and any(m != "none" for m in args.modes):
+                from ollama_pool import set_ollama_endpoints
+                from stub_ollama import StubOllamaServer
+
+                # Faux serveurs sur des ports libres (port 0), utilisés à la place d'OLLAMA_ENDPOINTS
+                stubs = [
+                    StubOllamaServer(
+                        0, args.llm_latency_ms, tokens_per_s=args.llm_tokens_per_s, error_rate=args.stub_error_rate, seed=i
+                    ).start()
+                    for i in range(args.stubs)
+                ]
+                set_ollama_endpoints([stub.url for stub in stubs])
+            try:
+                report["e2e"] = asyncio.run(_bench_e2e_async(args.requests, args.top_k, args.concurrency, args.modes))
+            finally:
+                if stubs:
+                    report["meta"]["stub_ollama_requests"] = [stub.requests for stub in stubs]
+                for stub in stubs:
+                    stub.stop()
+    finally:
+        if args.backend == "pgvector" and "ingest" in args.phases and not args.keep:
+            print(f"[CLEAN] {cleanup_pgvector()} fragment(s) synthétique(s) supprimé(s)")
+
+    out = args.out or ROOT / ".cache" / "bench" / f"{time.strftime('%Y%m%d-%H%M%S')}-{report['meta']['commit']}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"[OK] résultats: {out}")
+
+    if args.compare is not None:
+        compare(json.loads(args.compare.read_text(encoding="utf-8")), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Micro-benchmark: encodage texte "[x1,...]" vs binaire pgvector, par vecteur (384-d).
+
+- encode: coût Python côté client seulement (hors ligne, pas de base nécessaire)
+- round-trip: SELECT %s::vector sur PostgreSQL (si --db)
+
+Usage:
+    python benchmarks/bench_vector_codec.py --n 2000
+    python benchmarks/bench_vector_codec.py --n 2000 --db
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from vector_codec import encode_vector_binary, to_pgvector_literal  # noqa: E402
+
+
+def _random_vectors(n: int, dim: int = 384, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    vecs = rng.standard_normal((n, dim)).astype(np.float32)
+    return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+
+
+def _per_vector_us(fn: Callable[[np.ndarray], object], vecs: np.ndarray) -> List[float]:
+    out = []
+    for v in vecs:
+        t0 = time.perf_counter()
+        fn(v)
+        out.append((time.perf_counter() - t0) * 1e6)
+    return out
+
+
+def _report(label: str, samples: List[float], payload_bytes: int) -> None:
+    arr = np.asarray(samples)
+    print(
+        f"{label:<22} p50={np.percentile(arr, 50):8.1f} us  p99={np.percentile(arr, 99):8.1f} us"
+        f"  mean={arr.mean():8.1f} us  payload={payload_bytes} B"
+    )
+
+
+def bench_encode(vecs: np.ndarray) -> None:
+    print("== encode (client) ==")
+    _report("text literal", _per_vector_us(to_pgvector_literal, vecs), len(to_pgvector_literal(vecs[0])))
+    _report("binary", _per_vector_us(encode_vector_binary, vecs), len(encode_vector_binary(vecs[0])))
+
+
+def bench_round_trip(vecs: np.ndarray) -> None:
+    import psycopg
+
+    from db import get_dsn
+    from vector_codec import register_vector
+
+    print("== encode + round-trip (SELECT %s::vector) ==")
+    with psycopg.connect(get_dsn(), autocommit=True) as conn:
+        with conn.cursor() as cur:
+
+            def text_rt(v: np.ndarray) -> object:
+                cur.execute("SELECT %s::vector", (to_pgvector_literal(v),), prepare=True)
+                return cur.fetchone()
+
+            _report("text literal", _per_vector_us(text_rt, vecs), len(to_pgvector_literal(vecs[0])))
+
+        if not register_vector(conn):
+            print("Extension pgvector absente: round-trip binaire ignoré.")
+            return
+
+        with conn.cursor(binary=True) as cur:
+
+            def binary_rt(v: np.ndarray) -> object:
+                cur.execute("SELECT %s::vector", (v,), prepare=True)
+                return cur.fetchone()
+
+            _report("binary", _per_vector_us(binary_rt, vecs), len(encode_vector_binary(vecs[0])))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark encodage texte vs binaire des vecteurs.")
+    parser.add_argument("--n", type=int, default=2000, help="Nombre de vecteurs")
+    parser.add_argument("--db", action="store_true", help="Mesurer aussi le round-trip PostgreSQL")
+    args = parser.parse_args()
+
+    vecs = _random_vectors(args.n)
+    bench_encode(vecs)
+    if args.db:
+        bench_round_trip(vecs)
+
+
+if __name__ == "__main__":
+    main()
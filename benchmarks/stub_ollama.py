@@ -0,0 +1,150 @@
+"""
+Serveur HTTP imitant l'API Ollama (/api/tags, /api/generate avec ou sans streaming), avec une
+latence réglable: mesurer l'API de bout en bout sans GPU ni modèle, de façon reproductible.
+
+Durée d'une génération = latency_ms (+ jitter aléatoire) avant le premier token, puis
+un token toutes les 1/tokens_per_s secondes (min(num_predict, tokens) tokens).
+error_rate: part des appels qui répondent 503 après latency_ms (tester le disjoncteur).
+
+Usage (plusieurs instances: OLLAMA_ENDPOINTS=http://127.0.0.1:11534,http://127.0.0.1:11535):
+    python benchmarks/stub_ollama.py --port 11534 --latency_ms 300 --tokens_per_s 40
+    python benchmarks/stub_ollama.py --port 11535 --latency_ms 300 --error_rate 0.5
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+
+STUB_WORDS = ["Dosage", "conseillé", ":", "20", "ppm", "sur", "le", "poids", "de", "farine", "."]
+
+
+class StubOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        port: int = 11534,
+        latency_ms: float = 200.0,
+        jitter_ms: float = 0.0,
+        tokens_per_s: float = 50.0,
+        tokens: int = 40,
+        seed: int = 0,
+        error_rate: float = 0.0,
+    ):
+        # port=0: port libre choisi par le système (voir self.url)
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.tokens_per_s = tokens_per_s
+        self.tokens = tokens
+        self.error_rate = error_rate
+        self.requests = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def next_call(self) -> Tuple[float, bool]:
+        # (délai avant le premier token en s, appel en erreur)
+        with self._lock:
+            self.requests += 1
+            jitter = self._rng.uniform(0, self.jitter_ms) if self.jitter_ms > 0 else 0.0
+            failed = self.error_rate > 0 and self._rng.random() < self.error_rate
+        return (self.latency_ms + jitter) / 1000, failed
+
+    def start(self) -> "StubOllamaServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="stub-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: StubOllamaServer
+
+    def log_message(self, format: str, *args: Any) -> None:  # pas de log par requête
+        pass
+
+    def _send_json(self, data: Dict[str, Any], status: int = 200) -> None:
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        if self.path == "/api/tags":
+            self._send_json({"models": [{"name": "phi3:mini"}]})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self) -> None:
+        if self.path != "/api/generate":
+            self._send_json({"error": "not found"}, status=404)
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        n_tokens = min(int(payload.get("options", {}).get("num_predict", 120)), self.server.tokens)
+        words = [STUB_WORDS[i % len(STUB_WORDS)] for i in range(n_tokens)]
+        per_token = 1 / self.server.tokens_per_s if self.server.tokens_per_s > 0 else 0.0
+
+        delay, failed = self.server.next_call()
+        time.sleep(delay)
+        if failed:
+            self._send_json({"error": "stub: erreur simulée"}, status=503)
+            return
+        if not payload.get("stream", True):
+            time.sleep(per_token * max(0, n_tokens - 1))
+            self._send_json({"model": payload.get("model"), "response": " ".join(words), "done": True})
+            return
+
+        # NDJSON en flux: une ligne par token, connexion fermée à la fin (pas de Content-Length)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(per_token)
+            self.wfile.write((json.dumps({"response": word + " ", "done": False}) + "\n").encode("utf-8"))
+            self.wfile.flush()
+        self.wfile.write((json.dumps({"response": "", "done": True}) + "\n").encode("utf-8"))
+        self.wfile.flush()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Faux serveur Ollama à latence réglable.")
+    parser.add_argument("--port", type=int, default=11534)
+    parser.add_argument("--latency_ms", type=float, default=200.0, help="Délai avant le premier token")
+    parser.add_argument("--jitter_ms", type=float, default=0.0, help="Délai aléatoire ajouté (0..jitter)")
+    parser.add_argument("--tokens_per_s", type=float, default=50.0)
+    parser.add_argument("--tokens", type=int, default=40, help="Tokens max par réponse")
+    parser.add_argument("--error_rate", type=float, default=0.0, help="Part des appels en erreur 503")
+    args = parser.parse_args()
+
+    server = StubOllamaServer(
+        args.port, args.latency_ms, args.jitter_ms, args.tokens_per_s, args.tokens, error_rate=args.error_rate
+    )
+    print(f"[STUB] Ollama simulé sur {server.url} (Ctrl+C pour arrêter)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+Chunking structurel (CHUNKER=structure): blocs de mise en page PyMuPDF, puis lignes, phrases et
+en dernier recours fenêtres de tokens, regroupés jusqu'à max_tokens tokens du tokenizer du
+modèle d'embedding (256 tokens pour all-MiniLM-L6-v2: au-delà, le texte est tronqué à
+l'encodage). Le PDF est lu page par page (générateurs): le texte complet n'est jamais
+assemblé en mémoire.
+
+Rapport sur un dossier, sans ingestion (distribution des longueurs en tokens, taux de troncature):
+    python chunking.py --pdf_dir ./embedding
+    python chunking.py --pdf_dir ./embedding --chunker chars
+"""
+from __future__ import annotations
+
+import re
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import settings
+
+if TYPE_CHECKING:
+    from transformers import PreTrainedTokenizerBase
+
+CHUNKERS = ("chars", "structure")
+
+# Longueur max. de séquence de SentenceTransformer pour all-MiniLM-L6-v2 (max_seq_length)
+MODEL_WINDOW_TOKENS = 256
+
+# Fin de phrase suivie d'un espace (les décimales "0,5" et "2.5" ne sont pas coupées)
+_SENTENCE_END = re.compile(r"(?<=[.!?;:])\s+(?=[A-ZÀ-Ý0-9«\"(•\-–])")
+
+_tokenizers: Dict[str, "PreTrainedTokenizerBase"] = {}
+
+
+def get_tokenizer(model_name: str = settings.embedding_model) -> "PreTrainedTokenizerBase":
+    # Un tokenizer par processus (les workers d'extraction le chargent au premier PDF)
+    tok = _tokenizers.get(model_name)
+    if tok is None:
+        from transformers import AutoTokenizer
+
+        tok = AutoTokenizer.from_pretrained(model_name)
+        _tokenizers[model_name] = tok
+    return tok
+
+
+def model_max_tokens(tokenizer: "PreTrainedTokenizerBase") -> int:
+    """
+    Tokens de texte réellement vus par le modèle: fenêtre (256 pour MiniLM) moins [CLS]/[SEP].
+    """
+    # model_max_length vaut 512 (ou "infini") pour certains tokenizers: la fenêtre utile est 256
+    window = min(int(tokenizer.model_max_length), MODEL_WINDOW_TOKENS)
+    return window - tokenizer.num_special_tokens_to_add()
+
+
+def count_tokens(tokenizer: "PreTrainedTokenizerBase", text: str) -> int:
+    return len(tokenizer(text, add_special_tokens=False)["input_ids"])
+
+
+def iter_pdf_blocks(pdf_path: Path, pages: Optional[range] = None) -> Iterator[str]:
+    """
+    Blocs de texte de chaque page (toutes, ou seulement pages), dans l'ordre de lecture
+    (paragraphes, cellules / lignes de tableau, en-têtes). Une page à la fois.
+    """
+    import fitz  # pymupdf
+
+    with fitz.open(pdf_path) as doc:
+        for page in doc.pages(pages.start, pages.stop) if pages is not None else doc:
+            for block in page.get_text("blocks", sort=True):
+                if block[6] != 0:  # 1 = image
+                    continue
+                text = re.sub(r"[ \t]+", " ", block[4]).strip()
+                if text:
+                    yield text
+
+
+def _token_windows(tokenizer: "PreTrainedTokenizerBase", text: str, max_tokens: int) -> Iterator[str]:
+    # Dernier recours (phrase sans ponctuation, longue ligne de tableau): coupe aux frontières de tokens
+    offsets = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
+    for start in range(0, len(offsets), max_tokens):
+        window = offsets[start : start + max_tokens]
+        piece = text[window[0][0] : window[-1][1]].strip()
+        if piece:
+            yield piece
+
+
+def _units(tokenizer: "PreTrainedTokenizerBase", block: str, max_tokens: int) -> Iterator[Tuple[str, int]]:
+    """
+    Découpe un bloc en unités (texte, nb tokens) de max_tokens tokens au plus:
+    bloc entier, sinon ses lignes, sinon ses phrases, sinon des fenêtres de tokens.
+    """
+    n = count_tokens(tokenizer, block)
+    if n <= max_tokens:
+        yield block, n
+        return
+    for line in block.split("\n"):
+        line = line.strip()
+        if not line:
+            continue
+        n = count_tokens(tokenizer, line)
+        if n <= max_tokens:
+            yield line, n
+            continue
+        for sentence in _SENTENCE_END.split(line):
+            if not sentence.strip():
+                continue
+            n = count_tokens(tokenizer, sentence)
+            if n <= max_tokens:
+                yield sentence, n
+            else:
+                for piece in _token_windows(tokenizer, sentence, max_tokens):
+                    yield piece, count_tokens(tokenizer, piece)
+
+
+def iter_structured_chunks(
+    blocks: Iterable[str],
+    tokenizer: "PreTrainedTokenizerBase",
+    max_tokens: int,
+    overlap_tokens: int = 0,
+) -> Iterator[str]:
+    """
+    Regroupe les unités consécutives tant que le chunk reste sous max_tokens tokens.
+    Recouvrement: les dernières unités entières du chunk précédent (au plus overlap_tokens
+    tokens) ouvrent le chunk suivant; aucune phrase n'est coupée par le recouvrement.
+    """
+    current: List[Tuple[str, int]] = []
+    size = 0
+    for block in blocks:
+        for text, n in _units(tokenizer, block, max_tokens):
+            if current and size + n > max_tokens:
+                yield "\n".join(t for t, _ in current)
+                carried: List[Tuple[str, int]] = []
+                carried_size = 0
+                for unit in reversed(current):
+                    if carried_size + unit[1] > overlap_tokens or carried_size + unit[1] + n > max_tokens:
+                        break
+                    carried.insert(0, unit)
+                    carried_size += unit[1]
+                current, size = carried, carried_size
+            current.append((text, n))
+            size += n
+    if current:
+        yield "\n".join(t for t, _ in current)
+
+
+def chunk_pdf_structured(
+    pdf_path: Path,
+    max_tokens: int = settings.chunk_max_tokens,
+    overlap_tokens: int = settings.chunk_overlap_tokens,
+    model_name: str = settings.embedding_model,
+    pages: Optional[range] = None,
+) -> Iterator[str]:
+    tokenizer = get_tokenizer(model_name)
+    max_tokens = min(max_tokens, model_max_tokens(tokenizer))
+    return iter_structured_chunks(iter_pdf_blocks(pdf_path, pages), tokenizer, max_tokens, overlap_tokens)
+
+
+def token_lengths(chunks: List[str], tokenizer: Optional["PreTrainedTokenizerBase"] = None) -> List[int]:
+    if not chunks:
+        return []
+    ids = (tokenizer or get_tokenizer())(chunks, add_special_tokens=False)["input_ids"]
+    return [len(i) for i in ids]
+
+
+class ChunkStats:
+    """
+    Distribution des longueurs de chunks (tokens) et taux de troncature à l'encodage
+    (chunks plus longs que limit tokens: la fin n'est pas vue par le modèle).
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.lengths: List[int] = []
+
+    def add(self, lengths: Sequence[int]) -> None:
+        self.lengths.extend(lengths)
+
+    def report(self) -> Dict[str, float]:
+        if not self.lengths:
+            return {"chunks": 0}
+        arr = np.asarray(self.lengths)
+        truncated = arr > self.limit
+        return {
+            "chunks": int(arr.size),
+            "tokens_p50": float(np.percentile(arr, 50)),
+            "tokens_p90": float(np.percentile(arr, 90)),
+            "tokens_p99": float(np.percentile(arr, 99)),
+            "tokens_max": int(arr.max()),
+            "truncated_rate": float(truncated.mean()),
+            # Part des tokens ignorés par le modèle (texte extrait et stocké mais jamais encodé)
+            "truncated_tokens_rate": float((arr[truncated] - self.limit).sum() / arr.sum()),
+        }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from ingest import chunk_pdf
+
+    parser = argparse.ArgumentParser(description="Rapport de chunking (longueurs en tokens, troncature).")
+    parser.add_argument("--pdf_dir", required=True)
+    parser.add_argument("--chunker", choices=CHUNKERS, default=settings.chunker)
+    args = parser.parse_args()
+
+    tokenizer = get_tokenizer()
+    stats = ChunkStats(model_max_tokens(tokenizer))
+    for pdf in sorted(Path(args.pdf_dir).rglob("*.pdf")):
+        stats.add(token_lengths(chunk_pdf(pdf, args.chunker), tokenizer))
+    print(f"[CHUNKS] chunker={args.chunker} limite modèle={stats.limit} tokens")
+    for name, value in stats.report().items():
+        print(f"{name:<22} {value:>10.3f}" if isinstance(value, float) else f"{name:<22} {value:>10}")
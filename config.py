@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Tuple
+
+from dotenv import load_dotenv
+
+# Chargé une seule fois à l'import (et non plus à chaque requête)
+load_dotenv()
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    return os.getenv(name, "1" if default else "0").strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_path(name: str, default: str) -> Optional[Path]:
+    # Valeur vide => désactivé
+    value = os.getenv(name, default).strip()
+    return Path(value) if value else None
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+def _env_list(name: str, default: str) -> Tuple[str, ...]:
+    # Valeurs séparées par des virgules
+    return tuple(v.strip() for v in os.getenv(name, default).split(",") if v.strip())
+
+
+@dataclass(frozen=True)
+class Settings:
+    # PostgreSQL / pgvector
+    pg_host: str = os.getenv("PG_HOST", "127.0.0.1")
+    pg_port: str = os.getenv("PG_PORT", "5433")
+    pg_db: str = os.getenv("PG_DB", "rag_db")
+    pg_user: str = os.getenv("PG_USER", "postgres")
+    pg_password: str = os.getenv("PG_PASSWORD", "postgres")
+
+    # Pool de connexions (psycopg_pool)
+    pg_pool_min_size: int = _env_int("PG_POOL_MIN_SIZE", 1)
+    pg_pool_max_size: int = _env_int("PG_POOL_MAX_SIZE", 10)
+    pg_pool_timeout: float = _env_float("PG_POOL_TIMEOUT", 30.0)
+    pg_pool_max_idle: float = _env_float("PG_POOL_MAX_IDLE", 600.0)
+
+    # Backend de recherche: pgvector (PostgreSQL) | numpy (matrice en mémoire)
+    retrieval_backend: str = os.getenv("RETRIEVAL_BACKEND", "pgvector").strip().lower()
+    numpy_index_dir: Path = Path(os.getenv("NUMPY_INDEX_DIR", ".cache/numpy_index"))
+    numpy_refresh_seconds: float = _env_float("NUMPY_REFRESH_SECONDS", 30.0)
+    numpy_ivf_lists: int = _env_int("NUMPY_IVF_LISTS", 0)  # 0 = recherche exacte
+    numpy_ivf_probes: int = _env_int("NUMPY_IVF_PROBES", 8)
+
+    # Index pgvector utilisé pour le Top-K: full (vector) | halfvec | binary,
+    # les modes compacts re-classent oversample x top_k candidats avec les vecteurs complets
+    vector_storage: str = os.getenv("VECTOR_STORAGE", "full").strip().lower()
+    quantized_oversample: int = _env_int("QUANTIZED_OVERSAMPLE", 4)
+
+    # Index vectoriel créé par ingest.py / vector_index.py: hnsw | ivfflat, et ses paramètres
+    vector_index_method: str = os.getenv("VECTOR_INDEX_METHOD", "hnsw").strip().lower()
+    hnsw_m: int = _env_int("HNSW_M", 16)
+    hnsw_ef_construction: int = _env_int("HNSW_EF_CONSTRUCTION", 64)
+    ivfflat_lists: int = _env_int("IVFFLAT_LISTS", 100)
+
+    # Filtre par document: recherche exacte si le filtre retient au plus N fragments, sinon
+    # index vectoriel filtré en parcours itératif (relaxed_order | strict_order | off si pgvector < 0.8)
+    filter_exact_max_rows: int = _env_int("FILTER_EXACT_MAX_ROWS", 20000)
+    pgvector_iterative_scan: str = os.getenv("PGVECTOR_ITERATIVE_SCAN", "relaxed_order").strip().lower()
+
+    # Recherche hybride (plein texte français + vecteurs, fusion RRF): candidats par liste, constante k
+    hybrid_search: bool = _env_bool("HYBRID_SEARCH", False)
+    hybrid_candidates: int = _env_int("HYBRID_CANDIDATES", 50)
+    rrf_k: int = _env_int("RRF_K", 60)
+
+    # Re-classement (cross-encoder CPU) de RERANK_CANDIDATES candidats en un seul lot; au-delà de
+    # RERANK_BUDGET_MS, l'ordre vectoriel est conservé (scores mis en cache quand le lot se termine)
+    rerank_enabled: bool = _env_bool("RERANK", False)
+    rerank_model: str = os.getenv("RERANK_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+    rerank_candidates: int = _env_int("RERANK_CANDIDATES", 50)
+    rerank_budget_ms: float = _env_float("RERANK_BUDGET_MS", 300.0)
+    rerank_max_length: int = _env_int("RERANK_MAX_LENGTH", 256)
+    rerank_cache_items: int = _env_int("RERANK_CACHE_ITEMS", 20000)
+
+    # Embeddings / chunking
+    embedding_model: str = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+    chunk_size: int = _env_int("CHUNK_SIZE", 1000)
+    chunk_overlap: int = _env_int("CHUNK_OVERLAP", 200)
+    # Chunker: chars (CHUNK_SIZE caractères) | structure (blocs / phrases, taille en tokens du modèle)
+    chunker: str = os.getenv("CHUNKER", "chars").strip().lower()
+    chunk_max_tokens: int = _env_int("CHUNK_MAX_TOKENS", 200)
+    chunk_overlap_tokens: int = _env_int("CHUNK_OVERLAP_TOKENS", 32)
+
+    # Moteur d'embedding: torch (SentenceTransformer) | onnx (ONNX Runtime, int8, threads fixés)
+    embedding_engine: str = os.getenv("EMBEDDING_ENGINE", "torch").strip().lower()
+    onnx_model_dir: Path = Path(os.getenv("ONNX_MODEL_DIR", ".cache/onnx"))
+    onnx_quantize: bool = _env_bool("ONNX_QUANTIZE", True)
+    onnx_intra_op_threads: int = _env_int("ONNX_INTRA_OP_THREADS", min(4, os.cpu_count() or 1))
+    onnx_inter_op_threads: int = _env_int("ONNX_INTER_OP_THREADS", 1)
+
+    # Démarrage: préchargement + encodage à blanc du modèle; Ollama requis pour /ready
+    warmup_on_startup: bool = _env_bool("WARMUP_ON_STARTUP", True)
+    ready_requires_ollama: bool = _env_bool("READY_REQUIRES_OLLAMA", True)
+    ready_retry_seconds: float = _env_float("READY_RETRY_SECONDS", 5.0)
+
+    # Threads dédiés à l'encodage des questions (chemin async de l'API)
+    embed_workers: int = _env_int("EMBED_WORKERS", 2)
+
+    # Micro-batching des questions concurrentes (API): lot fermé après N textes ou X ms
+    embed_batch_enabled: bool = _env_bool("EMBED_BATCH", True)
+    embed_batch_max_size: int = _env_int("EMBED_BATCH_MAX_SIZE", 32)
+    embed_batch_max_wait_ms: float = _env_float("EMBED_BATCH_MAX_WAIT_MS", 5.0)
+
+    # Requêtes lentes (API): question + durée de chaque étape journalisées au-delà de N ms
+    # (0 = désactivé); SLOW_QUERY_LOG: fichier JSONL en plus de la sortie standard
+    slow_query_ms: float = _env_float("SLOW_QUERY_MS", 2000.0)
+    slow_query_log: Optional[Path] = _env_path("SLOW_QUERY_LOG", "")
+
+    # Ollama: instances (séparées par des virgules), chaque appel va à la moins chargée;
+    # au plus OLLAMA_MAX_CONCURRENCY générations simultanées par instance
+    ollama_endpoints: Tuple[str, ...] = _env_list("OLLAMA_ENDPOINTS", "http://localhost:11434")
+    ollama_max_concurrency: int = _env_int("OLLAMA_MAX_CONCURRENCY", 4)
+    # Disjoncteur: instance écartée après N échecs consécutifs, nouvel essai après X secondes
+    ollama_breaker_failures: int = _env_int("OLLAMA_BREAKER_FAILURES", 3)
+    ollama_breaker_cooldown: float = _env_float("OLLAMA_BREAKER_COOLDOWN", 30.0)
+    ollama_connect_timeout: float = _env_float("OLLAMA_CONNECT_TIMEOUT", 3.0)
+    # Durée de maintien du modèle en mémoire après un appel (30m, 1h, -1 = toujours, vide = défaut Ollama)
+    ollama_keep_alive: str = os.getenv("OLLAMA_KEEP_ALIVE", "30m").strip()
+
+    # Réponse finale: budget de tokens des sources du prompt (fragments dédoublonnés, fusionnés,
+    # répartis selon le score); 0 = ancienne troncature à max_chars_per_context par fragment
+    context_token_budget: int = _env_int("CONTEXT_TOKEN_BUDGET", 600)
+    context_min_tokens: int = _env_int("CONTEXT_MIN_TOKENS", 32)
+
+    # Cache des réponses LLM (TTL + LRU, mode sémantique si seuil > 0, ex: 0.95)
+    answer_cache_enabled: bool = _env_bool("ANSWER_CACHE", True)
+    answer_cache_max_items: int = _env_int("ANSWER_CACHE_MAX_ITEMS", 1000)
+    answer_cache_ttl: float = _env_float("ANSWER_CACHE_TTL", 3600.0)
+    answer_cache_semantic_threshold: float = _env_float("ANSWER_CACHE_SEMANTIC_THRESHOLD", 0.0)
+
+    # Cache d'embeddings (LRU mémoire + SQLite disque)
+    embedding_cache_enabled: bool = _env_bool("EMBEDDING_CACHE", True)
+    embedding_cache_memory_items: int = _env_int("EMBEDDING_CACHE_MEMORY_ITEMS", 10000)
+    embedding_cache_path: Optional[Path] = _env_path("EMBEDDING_CACHE_PATH", ".cache/embeddings.sqlite")
+    embedding_cache_disk_mb: int = _env_int("EMBEDDING_CACHE_DISK_MB", 512)
+
+    # Ingestion (COPY binaire, pipeline extraction / embedding / écriture)
+    ingest_batch_size: int = _env_int("INGEST_BATCH_SIZE", 5000)
+    ingest_workers: int = _env_int("INGEST_WORKERS", max(1, (os.cpu_count() or 2) - 1))
+    ingest_queue_size: int = _env_int("INGEST_QUEUE_SIZE", 8)
+    # Un grand PDF est découpé en tâches de N pages (mémoire bornée, pages réparties entre workers)
+    ingest_pages_per_task: int = _env_int("INGEST_PAGES_PER_TASK", 50)
+
+    # Interface Streamlit: valeur initiale du Top K
+    top_k: int = _env_int("TOP_K", 3)
+
+    @property
+    def dsn(self) -> str:
+        return (
+            f"postgresql://{self.pg_user}:{self.pg_password}"
+            f"@{self.pg_host}:{self.pg_port}/{self.pg_db}"
+        )
+
+
+settings = Settings()
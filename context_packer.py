@@ -0,0 +1,219 @@
+"""
+Sources du prompt de réponse finale dans un budget de tokens (CONTEXT_TOKEN_BUDGET):
+1. fusion des fragments d'un même document qui se chevauchent (recouvrement du chunking:
+   fin du fragment i = début du fragment i+1) ou qui se contiennent
+2. suppression des lignes déjà présentes dans une source mieux classée
+3. budget réparti au prorata du score; une source plus courte que sa part laisse le reste
+   aux autres, une part sous CONTEXT_MIN_TOKENS est supprimée (sauf la meilleure source)
+4. coupe de chaque source à sa part, en fin de phrase si possible
+
+Les tokens sont comptés avec le tokenizer du modèle d'embedding (estimation: le LLM a son
+propre tokenizer, l'écart est stable d'un prompt à l'autre).
+"""
+from __future__ import annotations
+
+import re
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+from chunking import get_tokenizer
+from config import settings
+
+if TYPE_CHECKING:
+    from transformers import PreTrainedTokenizerBase
+
+# Recouvrement minimal pour fusionner deux fragments (en deçà: coïncidence probable)
+MIN_OVERLAP_CHARS = 40
+# Lignes plus courtes jamais dédoublonnées ("20 ppm", en-têtes de tableau répétés utiles)
+MIN_DEDUPE_LINE_CHARS = 30
+
+_SENTENCE_END = re.compile(r"[.!?;:](?=\s)|\n")
+
+
+def count_tokens(texts: Sequence[str], tokenizer: Optional["PreTrainedTokenizerBase"] = None) -> List[int]:
+    if not texts:
+        return []
+    ids = (tokenizer or get_tokenizer())(list(texts), add_special_tokens=False, verbose=False)["input_ids"]
+    return [len(i) for i in ids]
+
+
+def _clean(text: str) -> str:
+    return (text or "").strip().replace("\r", "")
+
+
+def _truncate_chars(text: str, max_chars: int) -> str:
+    # Troncature du prompt sans regroupement (ollama_client._final_answer_prompt)
+    if max_chars and len(text) > max_chars:
+        return text[:max_chars].rstrip() + " ..."
+    return text
+
+
+def _merge(a: str, b: str) -> Optional[str]:
+    """
+    Texte couvrant a et b s'ils se contiennent ou se chevauchent (dans un sens ou dans
+    l'autre), sinon None.
+    """
+    if b in a:
+        return a
+    if a in b:
+        return b
+    for left, right in ((a, b), (b, a)):
+        head = right[:MIN_OVERLAP_CHARS]
+        if len(head) < MIN_OVERLAP_CHARS:
+            continue
+        idx = left.find(head)
+        while idx != -1:
+            # La fin de left doit être exactement le début de right
+            if right.startswith(left[idx:]):
+                return left + right[len(left) - idx :]
+            idx = left.find(head, idx + 1)
+    return None
+
+
+def _merge_overlapping(items: List[Dict]) -> Tuple[List[Dict], int]:
+    merged: List[Dict] = []
+    n_merges = 0
+    for item in items:
+        current = dict(item)
+        changed = True
+        # Une fusion peut rendre la source voisine d'une autre déjà retenue: on recommence
+        while changed:
+            changed = False
+            for kept in merged:
+                if kept["id_document"] != current["id_document"]:
+                    continue
+                text = _merge(kept["texte_fragment"], current["texte_fragment"])
+                if text is None:
+                    continue
+                merged.remove(kept)
+                current = {
+                    "id_document": current["id_document"],
+                    "score": max(kept["score"], current["score"]),
+                    "texte_fragment": text,
+                    "sources": sorted(kept["sources"] + current["sources"]),
+                }
+                n_merges += 1
+                changed = True
+                break
+        merged.append(current)
+    merged.sort(key=lambda c: c["score"], reverse=True)
+    return merged, n_merges
+
+
+def _normalize_line(line: str) -> str:
+    return re.sub(r"\s+", " ", line).strip().lower()
+
+
+def _dedupe_lines(items: List[Dict]) -> Tuple[List[Dict], int]:
+    seen = set()
+    kept: List[Dict] = []
+    n_removed = 0
+    for item in items:
+        lines = []
+        for line in item["texte_fragment"].split("\n"):
+            key = _normalize_line(line)
+            if len(key) >= MIN_DEDUPE_LINE_CHARS:
+                if key in seen:
+                    n_removed += 1
+                    continue
+                seen.add(key)
+            lines.append(line)
+        text = "\n".join(lines).strip()
+        if text:
+            kept.append({**item, "texte_fragment": text})
+    return kept, n_removed
+
+
+def allocate_budget(scores: Sequence[float], needs: Sequence[int], budget: int, min_tokens: int) -> List[int]:
+    """
+    Tokens accordés à chaque source: part du budget proportionnelle au score (water-filling:
+    une source qui n'utilise pas toute sa part libère le reste). 0 = source supprimée.
+    """
+    weights = [max(float(s), 0.0) + 1e-6 for s in scores]
+    alloc = [0] * len(needs)
+    active = [i for i in range(len(needs)) if needs[i] > 0]
+    remaining = budget
+    while active:
+        total = sum(weights[i] for i in active)
+        shares = {i: remaining * weights[i] / total for i in active}
+        satisfied = [i for i in active if needs[i] <= shares[i]]
+        if satisfied:
+            for i in satisfied:
+                alloc[i] = needs[i]
+                remaining -= needs[i]
+            active = [i for i in active if i not in satisfied]
+            continue
+        # Parts trop petites pour être utiles: la moins bien classée est retirée (la meilleure est gardée)
+        too_small = [i for i in active if shares[i] < min_tokens]
+        if too_small and len(active) > 1:
+            active.remove(min(too_small, key=lambda i: weights[i]))
+            continue
+        for i in active:
+            alloc[i] = int(shares[i])
+        break
+    return alloc
+
+
+def _truncate(text: str, max_tokens: int, tokenizer: "PreTrainedTokenizerBase") -> str:
+    offsets = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)["offset_mapping"]
+    if len(offsets) <= max_tokens:
+        return text
+    cut = offsets[max_tokens - 1][1] if max_tokens > 0 else 0
+    # Fin de phrase (ou de ligne) dans la seconde moitié de la part, sinon dernier espace
+    ends = [m.end() for m in _SENTENCE_END.finditer(text, 0, cut)]
+    if ends and ends[-1] >= cut // 2:
+        cut = ends[-1]
+    elif " " in text[:cut]:
+        cut = text.rindex(" ", 0, cut)
+    return text[:cut].rstrip() + " ..."
+
+
+def pack_contexts(
+    contexts: Sequence[Dict],
+    token_budget: int = settings.context_token_budget,
+    min_tokens: int = settings.context_min_tokens,
+    tokenizer: Optional["PreTrainedTokenizerBase"] = None,
+    max_chars_per_context: int = 0,
+) -> Tuple[List[Dict], Dict[str, int]]:
+    """
+    contexts: Top-K (id_document, score, texte_fragment), du meilleur au moins bon.
+    Retourne les sources à mettre dans le prompt (mêmes clés + "sources": rangs d'origine
+    fusionnés, à partir de 1) et des compteurs (fragments, fusions, lignes supprimées, tokens).
+    context_tokens_in: tokens des fragments tels qu'envoyés sans regroupement (tronqués à
+    max_chars_per_context si > 0).
+    """
+    tokenizer = tokenizer or get_tokenizer()
+    items = [
+        {
+            "id_document": c.get("id_document"),
+            "score": float(c.get("score", 0.0)),
+            "texte_fragment": _clean(c.get("texte_fragment")),
+            "sources": [rank],
+        }
+        for rank, c in enumerate(contexts, start=1)
+        if _clean(c.get("texte_fragment"))
+    ]
+    raw = [_truncate_chars(c["texte_fragment"], max_chars_per_context) for c in items]
+    tokens_in = sum(count_tokens(raw, tokenizer))
+
+    items, n_merges = _merge_overlapping(items)
+    items, n_lines = _dedupe_lines(items)
+    needs = count_tokens([c["texte_fragment"] for c in items], tokenizer)
+    alloc = allocate_budget([c["score"] for c in items], needs, token_budget, min_tokens)
+
+    packed: List[Dict] = []
+    for item, need, n in zip(items, needs, alloc):
+        if n <= 0:
+            continue
+        if n < need:
+            item = {**item, "texte_fragment": _truncate(item["texte_fragment"], n, tokenizer)}
+        packed.append(item)
+
+    stats = {
+        "fragments_in": len(contexts),
+        "fragments_out": len(packed),
+        "merged": n_merges,
+        "duplicate_lines": n_lines,
+        "context_tokens_in": tokens_in,
+        "context_tokens_out": sum(count_tokens([c["texte_fragment"] for c in packed], tokenizer)),
+    }
+    return packed, stats
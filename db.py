@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+import psycopg
+from psycopg_pool import AsyncConnectionPool, ConnectionPool
+
+from config import settings
+from vector_codec import register_vector, register_vector_async
+
+# Pools partagés par rag_search, ingest.py, app.py et backend/api.py.
+# Créés paresseusement: l'import de ce module n'ouvre aucune connexion.
+_pool: Optional[ConnectionPool] = None
+_async_pool: Optional[AsyncConnectionPool] = None
+_lock = threading.Lock()
+# Créé à la première demande (dans la boucle qui utilise le pool), remis à zéro à la fermeture
+_async_lock: Optional[asyncio.Lock] = None
+
+
+def get_dsn() -> str:
+    return settings.dsn
+
+
+def _configure(conn: psycopg.Connection) -> None:
+    # Appelé une fois par connexion physique: adaptateur binaire numpy <-> vector
+    register_vector(conn)
+    conn.commit()
+
+
+async def _configure_async(conn: psycopg.AsyncConnection) -> None:
+    await register_vector_async(conn)
+    await conn.commit()
+
+
+def get_pool() -> ConnectionPool:
+    """
+    Pool synchrone (Streamlit, ingestion, routes FastAPI sync).
+    La connexion est vérifiée (SELECT 1) avant d'être prêtée.
+    """
+    global _pool
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    get_dsn(),
+                    min_size=settings.pg_pool_min_size,
+                    max_size=settings.pg_pool_max_size,
+                    timeout=settings.pg_pool_timeout,
+                    max_idle=settings.pg_pool_max_idle,
+                    configure=_configure,
+                    check=ConnectionPool.check_connection,
+                    name="rag-sync",
+                    open=False,
+                )
+                _pool.open()
+    return _pool
+
+
+async def get_async_pool() -> AsyncConnectionPool:
+    """
+    Pool asynchrone (routes FastAPI async). Doit être créé dans la boucle d'événements
+    qui l'utilise.
+    """
+    global _async_pool, _async_lock
+    if _async_pool is None:
+        if _async_lock is None:
+            _async_lock = asyncio.Lock()
+        # Premiers appels concurrents: un seul pool est ouvert, les autres attendent le verrou
+        async with _async_lock:
+            if _async_pool is None:
+                pool = AsyncConnectionPool(
+                    get_dsn(),
+                    min_size=settings.pg_pool_min_size,
+                    max_size=settings.pg_pool_max_size,
+                    timeout=settings.pg_pool_timeout,
+                    max_idle=settings.pg_pool_max_idle,
+                    configure=_configure_async,
+                    check=AsyncConnectionPool.check_connection,
+                    name="rag-async",
+                    open=False,
+                )
+                await pool.open()
+                _async_pool = pool
+    return _async_pool
+
+
+@contextmanager
+def get_connection() -> Iterator[psycopg.Connection]:
+    """
+    Emprunte une connexion au pool synchrone. La transaction est validée à la sortie
+    du bloc (ou annulée en cas d'exception), puis la connexion est rendue au pool.
+    """
+    with get_pool().connection() as conn:
+        yield conn
+
+
+def close_pools() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        _pool = None
+
+
+async def close_async_pool() -> None:
+    global _async_pool, _async_lock
+    if _async_pool is not None:
+        await _async_pool.close()
+        _async_pool = None
+    _async_lock = None
+
+
+def _metrics_from_stats(stats: Dict[str, int]) -> Dict[str, Any]:
+    size = stats.get("pool_size", 0)
+    available = stats.get("pool_available", 0)
+    requests = stats.get("requests_num", 0)
+    wait_ms = stats.get("requests_wait_ms", 0)
+    return {
+        "min_size": stats.get("pool_min", 0),
+        "max_size": stats.get("pool_max", 0),
+        "size": size,
+        "available": available,
+        "in_use": max(0, size - available),
+        "requests_waiting": stats.get("requests_waiting", 0),
+        "requests": requests,
+        "requests_queued": stats.get("requests_queued", 0),
+        "wait_ms_total": wait_ms,
+        "wait_ms_avg": (wait_ms / requests) if requests else 0.0,
+        "connections_created": stats.get("connections_num", 0),
+        "connections_errors": stats.get("connections_errors", 0),
+        "connections_lost": stats.get("connections_lost", 0),
+        "returns_bad": stats.get("returns_bad", 0),
+    }
+
+
+def pool_metrics() -> Dict[str, Dict[str, Any]]:
+    """
+    Métriques des pools ouverts (temps d'attente, connexions prêtées, créées...).
+    Sert à dimensionner PG_POOL_MIN_SIZE / PG_POOL_MAX_SIZE en production.
+    """
+    out: Dict[str, Dict[str, Any]] = {}
+    if _pool is not None:
+        out["sync"] = _metrics_from_stats(_pool.get_stats())
+    if _async_pool is not None:
+        out["async"] = _metrics_from_stats(_async_pool.get_stats())
+    return out
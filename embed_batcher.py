@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from metrics import Histogram
+
+# Bornes supérieures des buckets (cumulatifs, comme Prometheus)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+QUEUE_MS_BUCKETS = (0.5, 1, 2, 5, 10, 20, 50, 100, 250, 1000)
+
+Pending = Tuple[str, "asyncio.Future[np.ndarray]", float]
+
+
+class EmbeddingBatcher:
+    """
+    Regroupe les encodages de questions concurrents (API async) en un seul model.encode:
+    le premier texte arrivé ouvre un lot, fermé après max_wait_ms ou max_batch_size textes.
+    Au plus max_inflight lots sont encodés en même temps (threads de l'executor); tant que
+    ceux-ci sont occupés, les demandes s'accumulent et le lot suivant est plus gros.
+    """
+
+    def __init__(
+        self,
+        encode: Callable[[List[str]], np.ndarray],
+        executor: Executor,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+        max_inflight: int = 1,
+    ):
+        self._encode = encode
+        self._executor = executor
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._queue: "asyncio.Queue[Pending]" = asyncio.Queue()
+        self._slots = asyncio.Semaphore(max(1, max_inflight))
+        self._task: Optional[asyncio.Task] = None
+        # Lots en cours d'encodage: référence gardée (sinon la tâche peut être collectée en
+        # cours de route) et attendus par close()
+        self._inflight: Set[asyncio.Task] = set()
+        # Lot en cours de constitution (déjà retiré de la file): échoué par close() si _run est
+        # annulé pendant l'attente
+        self._collecting: List[Pending] = []
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_ms = Histogram(QUEUE_MS_BUCKETS)
+
+    async def encode(self, text: str) -> np.ndarray:
+        """
+        Embedding normalisé (384,) de text, calculé dans un lot partagé.
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="embed-batcher")
+        fut: "asyncio.Future[np.ndarray]" = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, fut, time.perf_counter()))
+        return await fut
+
+    async def _collect(self) -> List[Pending]:
+        batch = self._collecting = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        # Ce qui est déjà en file part dans le même lot, sans attendre
+        while len(batch) < self.max_batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        # Remis à _dispatch sans point d'attente: plus rien à échouer côté close()
+        self._collecting = []
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            await self._slots.acquire()
+            try:
+                batch = await self._collect()
+            except BaseException:
+                self._slots.release()
+                raise
+            task = asyncio.create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch: List[Pending]) -> None:
+        try:
+            # Appelants annulés entre-temps (ex: timeout HTTP): inutile de les encoder
+            batch = [p for p in batch if not p[1].done()]
+            if not batch:
+                return
+            now = time.perf_counter()
+            for _, _, t_enqueued in batch:
+                self.queue_ms.observe((now - t_enqueued) * 1000)
+            self.batch_sizes.observe(len(batch))
+
+            loop = asyncio.get_running_loop()
+            try:
+                vecs = await loop.run_in_executor(self._executor, self._encode, [p[0] for p in batch])
+            except Exception as e:
+                for _, fut, _ in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                return
+            for (_, fut, _), vec in zip(batch, vecs):
+                if not fut.done():
+                    fut.set_result(vec)
+        finally:
+            self._slots.release()
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Les lots déjà partis vers l'executor se terminent: leurs appelants reçoivent le résultat
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+        stranded = self._collecting
+        self._collecting = []
+        while not self._queue.empty():
+            stranded.append(self._queue.get_nowait())
+        for _, fut, _ in stranded:
+            if not fut.done():
+                fut.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "queued": self._queue.qsize(),
+            "batch_size": self.batch_sizes.snapshot(),
+            "queue_ms": self.queue_ms.snapshot(),
+        }
@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from config import settings
+
+
+def normalize_text(text: str) -> str:
+    # Espaces / retours à la ligne multiples => un seul espace (les en-têtes répétés
+    # des fiches techniques ne diffèrent souvent que par la mise en page)
+    return " ".join((text or "").split())
+
+
+def cache_key(model_name: str, text: str) -> str:
+    return hashlib.sha256(f"{model_name}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Cache d'embeddings adressé par contenu: clé = sha256(modèle, texte normalisé).
+    - niveau 1: LRU en mémoire (memory_items entrées)
+    - niveau 2: SQLite sur disque (vecteurs float32 en BLOB), éviction des entrées
+      les moins récemment utilisées au-delà de disk_max_bytes
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        memory_items: int = settings.embedding_cache_memory_items,
+        disk_path: Optional[Path] = settings.embedding_cache_path,
+        disk_max_bytes: int = settings.embedding_cache_disk_mb * 1024 * 1024,
+    ):
+        self.model_name = model_name
+        self.memory_items = memory_items
+        self.disk_max_bytes = disk_max_bytes
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+
+        self._db: Optional[sqlite3.Connection] = None
+        if disk_path is not None:
+            disk_path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(disk_path), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS embedding_cache (
+                  key TEXT PRIMARY KEY,
+                  vec BLOB NOT NULL,
+                  last_access REAL NOT NULL
+                )
+                """
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS embedding_cache_last_access ON embedding_cache (last_access)"
+            )
+            self._db.commit()
+        self._disk_bytes = self._disk_size()
+
+    # ----------------------------
+    # Mémoire (LRU)
+    # ----------------------------
+    def _memory_put(self, key: str, vec: np.ndarray) -> None:
+        self._memory[key] = vec
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    # ----------------------------
+    # Disque (SQLite)
+    # ----------------------------
+    def _disk_get(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        if self._db is None or not keys:
+            return {}
+        found: Dict[str, np.ndarray] = {}
+        for i in range(0, len(keys), 500):
+            part = keys[i : i + 500]
+            placeholders = ",".join("?" * len(part))
+            rows = self._db.execute(
+                f"SELECT key, vec FROM embedding_cache WHERE key IN ({placeholders})", part
+            ).fetchall()
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32)
+        if found:
+            now = time.time()
+            self._db.executemany(
+                "UPDATE embedding_cache SET last_access = ? WHERE key = ?", [(now, k) for k in found]
+            )
+            self._db.commit()
+        return found
+
+    def _disk_put(self, items: Dict[str, np.ndarray]) -> None:
+        if self._db is None or not items:
+            return
+        now = time.time()
+        self._db.executemany(
+            "INSERT OR REPLACE INTO embedding_cache (key, vec, last_access) VALUES (?, ?, ?)",
+            [(k, np.asarray(v, dtype=np.float32).tobytes(), now) for k, v in items.items()],
+        )
+        # Estimation incrémentale (surestimée en cas de remplacement); recalculée à l'éviction
+        self._disk_bytes += sum(v.nbytes for v in items.values())
+        if self._disk_bytes > self.disk_max_bytes:
+            self._evict_disk()
+        self._db.commit()
+
+    def _disk_size(self) -> int:
+        if self._db is None:
+            return 0
+        return int(self._db.execute("SELECT COALESCE(SUM(LENGTH(vec)), 0) FROM embedding_cache").fetchone()[0])
+
+    def _evict_disk(self) -> None:
+        assert self._db is not None
+        count, total = self._db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(vec)), 0) FROM embedding_cache"
+        ).fetchone()
+        if total > self.disk_max_bytes and count:
+            # Retire les entrées les moins récemment lues jusqu'à repasser sous ~90% de la limite
+            avg = total / count
+            n_evict = int((total - 0.9 * self.disk_max_bytes) / avg) + 1
+            self._db.execute(
+                """
+                DELETE FROM embedding_cache WHERE key IN (
+                  SELECT key FROM embedding_cache ORDER BY last_access LIMIT ?
+                )
+                """,
+                (n_evict,),
+            )
+        self._disk_bytes = self._disk_size()
+
+    # ----------------------------
+    # API
+    # ----------------------------
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        keys = [cache_key(self.model_name, t) for t in texts]
+        out: List[Optional[np.ndarray]] = [None] * len(keys)
+        with self._lock:
+            missing: List[str] = []
+            for i, key in enumerate(keys):
+                vec = self._memory.get(key)
+                if vec is not None:
+                    self._memory.move_to_end(key)
+                    self.hits_memory += 1
+                    out[i] = vec
+                else:
+                    missing.append(key)
+
+            from_disk = self._disk_get(sorted(set(missing)))
+            for i, key in enumerate(keys):
+                if out[i] is not None:
+                    continue
+                vec = from_disk.get(key)
+                if vec is not None:
+                    self.hits_disk += 1
+                    self._memory_put(key, vec)
+                    out[i] = vec
+                else:
+                    self.misses += 1
+        return out
+
+    def put_many(self, texts: Sequence[str], vectors: np.ndarray) -> None:
+        items = {
+            cache_key(self.model_name, t): np.asarray(v, dtype=np.float32)
+            for t, v in zip(texts, vectors)
+        }
+        with self._lock:
+            for key, vec in items.items():
+                self._memory_put(key, vec)
+            self._disk_put(items)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits_memory + self.hits_disk + self.misses
+        return {
+            "hits_memory": self.hits_memory,
+            "hits_disk": self.hits_disk,
+            "misses": self.misses,
+            "hit_rate": ((self.hits_memory + self.hits_disk) / lookups) if lookups else 0.0,
+            "memory_items": len(self._memory),
+        }
+
+
+def encode_with_cache(model, texts: Sequence[str], cache: Optional[EmbeddingCache]) -> np.ndarray:
+    """
+    Equivalent de model.encode(texts, normalize_embeddings=True) (shape (n, dim), float32),
+    mais seuls les textes absents du cache sont encodés, en un seul batch.
+    Les doublons d'un même appel ne sont encodés qu'une fois.
+    """
+    texts = list(texts)
+    if cache is None:
+        return np.asarray(model.encode(texts, normalize_embeddings=True), dtype=np.float32)
+
+    cached = cache.get_many(texts)
+    todo: Dict[str, str] = {}  # texte normalisé -> premier texte rencontré
+    for text, vec in zip(texts, cached):
+        if vec is None:
+            todo.setdefault(normalize_text(text), text)
+
+    if todo:
+        new_texts = list(todo.values())
+        new_vecs = np.asarray(model.encode(new_texts, normalize_embeddings=True), dtype=np.float32)
+        cache.put_many(new_texts, new_vecs)
+        computed = dict(zip(todo, new_vecs))
+        cached = [
+            vec if vec is not None else computed[normalize_text(text)]
+            for text, vec in zip(texts, cached)
+        ]
+
+    if not cached:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.vstack(cached).astype(np.float32, copy=False)
+
+
+_caches: Dict[str, EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(model_name: str = settings.embedding_model) -> Optional[EmbeddingCache]:
+    """
+    Cache partagé par modèle (None si EMBEDDING_CACHE=0).
+    """
+    if not settings.embedding_cache_enabled:
+        return None
+    with _caches_lock:
+        cache = _caches.get(model_name)
+        if cache is None:
+            cache = EmbeddingCache(model_name)
+            _caches[model_name] = cache
+        return cache
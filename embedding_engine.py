@@ -0,0 +1,198 @@
+"""
+Moteurs d'embedding interchangeables (EMBEDDING_ENGINE):
+- torch: SentenceTransformer (PyTorch), comportement historique
+- onnx: même modèle exporté vers ONNX Runtime, quantifié en int8 (quantification dynamique),
+  nombre de threads fixé. Mean pooling + normalisation identiques => vecteurs 384-d
+  compatibles avec les lignes déjà en base.
+
+Les deux moteurs exposent encode(texts, normalize_embeddings=True) (interface SentenceTransformer).
+
+Usage (export une fois; sinon fait automatiquement au premier chargement):
+    python embedding_engine.py --export
+    python embedding_engine.py --export --no_quantize
+"""
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Any, List, Sequence, Union
+
+import numpy as np
+
+from config import settings
+
+ENGINES = ("torch", "onnx")
+
+
+def onnx_model_dir(model_name: str = settings.embedding_model, quantize: bool = settings.onnx_quantize) -> Path:
+    suffix = "int8" if quantize else "fp32"
+    return settings.onnx_model_dir / f"{model_name.replace('/', '__')}-{suffix}"
+
+
+def export_onnx(
+    model_name: str = settings.embedding_model,
+    quantize: bool = settings.onnx_quantize,
+    opset: int = 14,
+) -> Path:
+    """
+    Exporte le transformer du modèle SentenceTransformer (sortie: last_hidden_state) vers ONNX,
+    puis applique la quantification dynamique int8 des poids. Nécessite torch, onnx et
+    onnxruntime (seulement pour l'export: l'inférence n'utilise ni torch ni sentence_transformers).
+    """
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+
+    target = onnx_model_dir(model_name, quantize)
+    target.mkdir(parents=True, exist_ok=True)
+
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0]
+    hf_model = transformer.auto_model.eval()
+    tokenizer = transformer.tokenizer
+
+    class _LastHiddenState(torch.nn.Module):
+        def __init__(self, model: torch.nn.Module):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.model(
+                input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids
+            )[0]
+
+    names = ["input_ids", "attention_mask", "token_type_ids"]
+    sample = tokenizer(["exemple d'export"], return_tensors="pt")
+    fp32_path = target / "model_fp32.onnx"
+    torch.onnx.export(
+        _LastHiddenState(hf_model),
+        tuple(sample[n] for n in names),
+        str(fp32_path),
+        input_names=names,
+        output_names=["last_hidden_state"],
+        dynamic_axes={n: {0: "batch", 1: "seq"} for n in names + ["last_hidden_state"]},
+        opset_version=opset,
+    )
+
+    model_path = target / "model.onnx"
+    if quantize:
+        quantize_dynamic(str(fp32_path), str(model_path), weight_type=QuantType.QInt8)
+        fp32_path.unlink()
+    else:
+        fp32_path.replace(model_path)
+
+    tokenizer.save_pretrained(str(target))
+    meta = {"model_name": model_name, "quantize": quantize, "max_seq_length": int(st_model.max_seq_length)}
+    (target / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+    return target
+
+
+class OnnxEncoder:
+    """
+    Encodeur ONNX Runtime (CPU): tokenisation HF, inférence ONNX, mean pooling sur le masque
+    d'attention, normalisation L2 optionnelle. Les textes sont triés par longueur avant le
+    découpage en lots (moins de padding), puis remis dans l'ordre d'origine.
+    """
+
+    def __init__(
+        self,
+        model_dir: Path,
+        intra_op_threads: int = settings.onnx_intra_op_threads,
+        inter_op_threads: int = settings.onnx_inter_op_threads,
+    ):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        meta = json.loads((model_dir / "meta.json").read_text(encoding="utf-8"))
+        self.model_name = meta["model_name"]
+        self.max_seq_length = int(meta["max_seq_length"])
+        self.tokenizer = AutoTokenizer.from_pretrained(str(model_dir))
+
+        opts = ort.SessionOptions()
+        # Threads fixés: pas de sur-souscription quand plusieurs processus partagent les cœurs
+        opts.intra_op_num_threads = intra_op_threads
+        opts.inter_op_num_threads = inter_op_threads
+        opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(str(model_dir / "model.onnx"), opts, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return int(self.session.get_outputs()[0].shape[-1] or 384)
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        enc = self.tokenizer(
+            texts, padding=True, truncation=True, max_length=self.max_seq_length, return_tensors="np"
+        )
+        feeds = {k: np.asarray(v, dtype=np.int64) for k, v in enc.items() if k in self._input_names}
+        hidden = self.session.run(None, feeds)[0]
+        mask = np.asarray(enc["attention_mask"], dtype=np.float32)[..., None]
+        return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+    def encode(
+        self,
+        sentences: Union[str, Sequence[str]],
+        batch_size: int = 32,
+        normalize_embeddings: bool = False,
+        **_: Any,
+    ) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+
+        order = np.argsort([-len(t) for t in texts], kind="stable")
+        out = np.empty((len(texts), self.get_sentence_embedding_dimension()), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            idx = order[start : start + batch_size]
+            out[idx] = self._encode_batch([texts[i] for i in idx])
+
+        if normalize_embeddings:
+            out /= np.clip(np.linalg.norm(out, axis=1, keepdims=True), 1e-12, None)
+        return out[0] if single else out
+
+
+def load_model(engine: str = settings.embedding_engine, model_name: str = settings.embedding_model):
+    """
+    Modèle d'embedding du moteur demandé (import paresseux de torch / onnxruntime).
+    onnx: l'export est fait au premier chargement s'il n'existe pas encore.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"EMBEDDING_ENGINE inconnu: {engine} (attendu: {', '.join(ENGINES)})")
+    if engine == "torch":
+        from sentence_transformers import SentenceTransformer
+
+        return SentenceTransformer(model_name)
+
+    model_dir = onnx_model_dir(model_name)
+    if not (model_dir / "meta.json").exists():
+        print(f"[ONNX] export de {model_name} vers {model_dir} ...")
+        export_onnx(model_name)
+    return OnnxEncoder(model_dir)
+
+
+def cache_namespace(engine: str = settings.embedding_engine, model_name: str = settings.embedding_model) -> str:
+    """
+    Nom utilisé pour le cache d'embeddings: les vecteurs int8 diffèrent légèrement de ceux
+    de PyTorch, ils ne sont pas mélangés dans le cache.
+    """
+    if engine == "torch":
+        return model_name
+    return f"{model_name}@onnx-{'int8' if settings.onnx_quantize else 'fp32'}"
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export ONNX (+ quantification int8) du modèle d'embedding.")
+    parser.add_argument("--export", action="store_true", help="(Ré)exporte le modèle ONNX")
+    parser.add_argument("--no_quantize", action="store_true", help="Garde les poids float32")
+    args = parser.parse_args()
+
+    if args.export:
+        path = export_onnx(quantize=not args.no_quantize)
+        size_mb = sum(f.stat().st_size for f in path.glob("*.onnx")) / 1e6
+        print(f"[ONNX] {path} ({size_mb:.1f} MB, {os.cpu_count()} cœurs détectés)")
+    else:
+        parser.print_help()
@@ -1,22 +1,35 @@
 from __future__ import annotations
 
-import os
+import hashlib
+import queue
 import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Tuple
+from typing import Deque, Iterator, List, Optional, Tuple
 
 import fitz  # pymupdf
 import numpy as np
-from sentence_transformers import SentenceTransformer
+import psycopg
 
+from chunking import CHUNKERS, ChunkStats, chunk_pdf_structured, get_tokenizer, model_max_tokens, token_lengths
 from config import settings
-from db import get_connection
+from db import get_connection, get_dsn
+from embedding_cache import encode_with_cache, get_embedding_cache
+from embedding_engine import cache_namespace, load_model
+from vector_index import VECTOR_INDEX_NAMES, IndexParams, create_index_sql, index_name
 
 
-def extract_text_from_pdf(pdf_path: Path) -> str:
+Row = Tuple[int, str, np.ndarray]
+
+
+def extract_text_from_pdf(pdf_path: Path, pages: Optional[range] = None) -> str:
     doc = fitz.open(pdf_path)
     parts = []
-    for page in doc:
+    for page in doc.pages(pages.start, pages.stop) if pages is not None else doc:
         parts.append(page.get_text("text"))
     doc.close()
     text = "\n".join(parts)
@@ -28,8 +41,8 @@ def extract_text_from_pdf(pdf_path: Path) -> str:
 
 def chunk_text(text: str, chunk_size: int, overlap: int) -> List[str]:
     """
-    Chunking simple par longueur de caractères, avec overlap.
-    (Suffisant pour prototype. Peut être amélioré par chunking par paragraphes.)
+    Chunking simple par longueur de caractères, avec overlap (CHUNKER=chars).
+    Voir chunking.py pour le découpage par blocs / phrases en tokens (CHUNKER=structure).
     """
     text = text.strip()
     if not text:
@@ -52,68 +65,490 @@ def chunk_text(text: str, chunk_size: int, overlap: int) -> List[str]:
     return chunks
 
 
-def to_pgvector_literal(vec: np.ndarray) -> str:
-    vec_list = vec.astype(float).tolist()
-    return "[" + ",".join(f"{x:.8f}" for x in vec_list) + "]"
+def chunk_params(chunker: str = settings.chunker) -> Tuple[str, int, int]:
+    """
+    (chunker, taille, recouvrement) enregistrés dans documents: caractères pour chars,
+    tokens pour structure.
+    """
+    if chunker not in CHUNKERS:
+        raise ValueError(f"CHUNKER inconnu: {chunker} (attendu: {', '.join(CHUNKERS)})")
+    if chunker == "structure":
+        return chunker, settings.chunk_max_tokens, settings.chunk_overlap_tokens
+    return chunker, settings.chunk_size, settings.chunk_overlap
 
 
-def ensure_schema():
-    schema_path = Path("schema.sql")
-    sql = schema_path.read_text(encoding="utf-8")
-    with get_connection() as conn:
+def chunk_pdf(pdf_path: Path, chunker: str = settings.chunker, pages: Optional[range] = None) -> List[str]:
+    """
+    Chunks du PDF entier, ou des seules pages (une tâche d'ingestion): la liste reste bornée
+    par la taille de la tâche, un chunk ne franchit pas la limite entre deux tâches.
+    """
+    _, size, overlap = chunk_params(chunker)
+    if chunker == "structure":
+        return list(chunk_pdf_structured(pdf_path, size, overlap, pages=pages))
+    return chunk_text(extract_text_from_pdf(pdf_path, pages), size, overlap)
+
+
+def schema_sql(vector_index: bool = True) -> str:
+    """
+    schema.sql, les index compacts (schema_quantized.sql) si VECTOR_STORAGE != full et,
+    si vector_index, l'index vectoriel configuré (VECTOR_INDEX_METHOD, HNSW_M...).
+    Tout est idempotent (IF NOT EXISTS).
+    """
+    sql = Path("schema.sql").read_text(encoding="utf-8")
+    if settings.vector_storage != "full":
+        sql += "\n\n" + Path("schema_quantized.sql").read_text(encoding="utf-8")
+    if vector_index:
+        params = IndexParams()
+        sql += "\n\n" + create_index_sql(params, index_name("full", params.method), concurrently=False) + ";"
+    return sql
+
+
+def ensure_vector_index(conn: psycopg.Connection) -> bool:
+    """
+    Crée l'index vectoriel configuré s'il n'existe pas. IVFFlat apprend ses centroïdes sur les
+    lignes présentes à la création: sur une table vide, il n'est pas créé (appel suivant, à la
+    fin de l'ingestion). Retourne False si la création a été reportée.
+    """
+    params = IndexParams()
+    with conn.cursor() as cur:
+        if params.method == "ivfflat":
+            cur.execute("SELECT EXISTS (SELECT 1 FROM embeddings)")
+            if not cur.fetchone()[0]:
+                conn.commit()
+                return False
+        cur.execute(create_index_sql(params, index_name("full", params.method), concurrently=False))
+    conn.commit()
+    return True
+
+
+def ensure_schema(vector_index: bool = True):
+    # Connexion directe (hors pool): l'extension vector doit exister avant que les
+    # connexions du pool n'enregistrent l'adaptateur binaire.
+    # vector_index=False: mode bulk, l'index serait supprimé avant le COPY puis reconstruit
+    with psycopg.connect(get_dsn()) as conn:
         with conn.cursor() as cur:
-            cur.execute(sql)
+            cur.execute(schema_sql(vector_index=False))
         conn.commit()
+        if vector_index and not ensure_vector_index(conn):
+            print("[INDEX] IVFFlat: table vide, index créé après le chargement")
+
+
+COPY_SQL = "COPY embeddings (id_document, texte_fragment, vecteur) FROM STDIN (FORMAT BINARY)"
+
+# Index supprimés avant un chargement massif (--bulk), recréés par build_vector_index()
+BULK_DROPPED_INDEX_NAMES = VECTOR_INDEX_NAMES + ("embeddings_texte_tsv_gin",)
+
+
+def drop_vector_index(conn: psycopg.Connection) -> None:
+    with conn.cursor() as cur:
+        for name in BULK_DROPPED_INDEX_NAMES:
+            cur.execute(f"DROP INDEX IF EXISTS {name}")
+    conn.commit()
+
+
+def build_vector_index(conn: psycopg.Connection) -> float:
+    """
+    (Re)construit les index vectoriels et plein texte après un chargement massif. Retourne la durée (s).
+    """
+    t0 = time.perf_counter()
+    with conn.cursor() as cur:
+        cur.execute(schema_sql(vector_index=False))
+    conn.commit()
+    ensure_vector_index(conn)
+    return time.perf_counter() - t0
 
 
-def ingest_folder(pdf_folder: Path):
+def copy_rows(conn: psycopg.Connection, rows: List[Row]) -> None:
     """
-    Ingestion:
-    - pour chaque PDF => id_document incremental
-    - extraction texte -> chunks
-    - embedding de chaque chunk (normalisé) avec all-MiniLM-L6-v2
-    - insertion dans embeddings(id_document, texte_fragment, vecteur)
+    Envoie un lot de lignes via COPY binaire puis valide la transaction.
     """
-    ensure_schema()
+    with conn.cursor() as cur:
+        with cur.copy(COPY_SQL) as copy:
+            copy.set_types(["int4", "text", "vector"])
+            for row in rows:
+                copy.write_row(row)
+    conn.commit()
+
+
+INSERT_SQL = """
+INSERT INTO embeddings (id_document, texte_fragment, vecteur)
+VALUES (%s, %s, %s::vector)
+"""
+
+
+def _extract_and_chunk(pdf_path: Path, chunker: str, pages: Optional[range]) -> Tuple[List[str], List[int]]:
+    # Exécuté dans un processus worker (fonction top-level => picklable); les longueurs en
+    # tokens (rapport [CHUNKS]) sont calculées ici plutôt que dans le processus d'embedding.
+    # CHUNKER=chars: pas de tokenizer (ni chargement, ni téléchargement), rapport via chunking.py
+    chunks = chunk_pdf(pdf_path, chunker, pages)
+    return chunks, (token_lengths(chunks) if chunker == "structure" else [])
+
+
+# (pdf, pages de la tâche, première tâche du PDF, dernière tâche du PDF)
+PageTask = Tuple[Path, range, bool, bool]
+
+
+def iter_page_tasks(pdf_files: List[Path], pages_per_task: int = settings.ingest_pages_per_task) -> Iterator[PageTask]:
+    """
+    Tâches d'extraction: pages_per_task pages au plus par tâche, dans l'ordre des fichiers.
+    Un PDF sans page donne une tâche vide (le document est quand même enregistré).
+    """
+    step = max(1, pages_per_task)
+    for pdf in pdf_files:
+        with fitz.open(pdf) as doc:
+            n_pages = doc.page_count
+        starts = list(range(0, n_pages, step)) or [0]
+        for i, start in enumerate(starts):
+            yield pdf, range(start, min(start + step, n_pages)), i == 0, i == len(starts) - 1
+
+
+def iter_chunked_pdfs(
+    pdf_files: List[Path],
+    workers: int = settings.ingest_workers,
+    max_pending: int = settings.ingest_queue_size,
+    pages_per_task: int = settings.ingest_pages_per_task,
+) -> Iterator[Tuple[Path, List[str], List[int], bool, bool]]:
+    """
+    Étape 1 du pipeline: extraction PyMuPDF + chunking (CHUNKER) dans un pool de processus,
+    par tâches de pages_per_task pages: un grand PDF n'est jamais chargé entier (ni dans un
+    worker, ni dans le processus principal), ses tâches sont réparties entre les workers.
+    Produit (pdf, chunks, longueur de chaque chunk en tokens (vide si CHUNKER=chars),
+    première tâche du PDF, dernière tâche du PDF).
+    Au plus max_pending tâches sont en cours ou en attente (contre-pression): si l'embedding
+    est plus lent, les workers s'arrêtent au lieu d'accumuler du texte en mémoire.
+    L'ordre des fichiers et des pages est conservé (id_document déterministe).
+    workers=0 => extraction en série dans le processus courant.
+    """
+    tasks = iter_page_tasks(pdf_files, pages_per_task)
+    if workers <= 0:
+        for pdf, pages, first, last in tasks:
+            yield (pdf, *_extract_and_chunk(pdf, settings.chunker, pages), first, last)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        pending: Deque[Tuple[PageTask, Future]] = deque()
+
+        def submit_next() -> None:
+            task = next(tasks, None)
+            if task is not None:
+                pending.append((task, ex.submit(_extract_and_chunk, task[0], settings.chunker, task[1])))
+
+        for _ in range(max(1, max_pending)):
+            submit_next()
+
+        while pending:
+            (pdf, _, first, last), fut = pending.popleft()
+            submit_next()
+            yield (pdf, *fut.result(), first, last)
+
+
+@dataclass(frozen=True)
+class FileState:
+    path: str
+    sha256: str
+    mtime: float
+    size: int
+
+
+# (fichier, chunks, embeddings, première partie, dernière partie) transmis du processus
+# principal au thread d'écriture; un grand PDF arrive en plusieurs parties (tâches de pages)
+DocumentJob = Tuple[FileState, List[str], np.ndarray, bool, bool]
+
+
+def file_sha256(path: Path, block_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
 
-    model = SentenceTransformer(settings.embedding_model)
-    test_vec = model.encode("test", normalize_embeddings=True)
-    if len(test_vec) != 384:
-        raise ValueError(f"Le modèle n'est pas en 384 dimensions: {len(test_vec)}")
+
+DOCUMENT_UPSERT_SQL = """
+INSERT INTO documents (path, sha256, mtime, size, chunker, chunk_size, chunk_overlap, model_name, n_fragments)
+VALUES (%(path)s, %(sha256)s, %(mtime)s, %(size)s, %(chunker)s, %(chunk_size)s, %(chunk_overlap)s, %(model_name)s,
+        %(n_fragments)s)
+ON CONFLICT (path) DO UPDATE SET
+  sha256 = EXCLUDED.sha256,
+  mtime = EXCLUDED.mtime,
+  size = EXCLUDED.size,
+  chunker = EXCLUDED.chunker,
+  chunk_size = EXCLUDED.chunk_size,
+  chunk_overlap = EXCLUDED.chunk_overlap,
+  model_name = EXCLUDED.model_name,
+  n_fragments = EXCLUDED.n_fragments,
+  ingested_at = now()
+RETURNING id_document
+"""
+
+
+def plan_ingestion(
+    conn: psycopg.Connection,
+    pdf_folder: Path,
+    pdf_files: List[Path],
+) -> Tuple[List[Tuple[Path, FileState]], int]:
+    """
+    Compare le dossier à la table documents:
+    - fichier inchangé (mtime + taille, sinon sha256) => ignoré (seul mtime est rafraîchi)
+    - fichier nouveau/modifié, ou chunking/modèle différent => à (ré)ingérer
+    - fichier supprimé du dossier => ses fragments et sa ligne documents sont supprimés
+    Les fragments orphelins (sans ligne documents, ex: anciennes ingestions) sont purgés.
+    Retourne (fichiers à ingérer, nombre de fichiers inchangés).
+    """
+    params = (*chunk_params(), settings.embedding_model)
+    folder_prefix = pdf_folder.resolve().as_posix().rstrip("/") + "/"
+
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT id_document, path, sha256, mtime, size, chunker, chunk_size, chunk_overlap, model_name
+            FROM documents
+            WHERE starts_with(path, %s)
+            """,
+            (folder_prefix,),
+        )
+        known = {r[1]: r for r in cur.fetchall()}
+
+        to_ingest: List[Tuple[Path, FileState]] = []
+        unchanged = 0
+        seen = set()
+        for pdf in pdf_files:
+            path = pdf.resolve().as_posix()
+            seen.add(path)
+            st = pdf.stat()
+            row = known.get(path)
+            same_params = row is not None and tuple(row[5:9]) == params
+
+            if same_params and row[3] == st.st_mtime and row[4] == st.st_size:
+                unchanged += 1
+                continue
+
+            sha = file_sha256(pdf)
+            if same_params and row[2] == sha:
+                cur.execute(
+                    "UPDATE documents SET mtime = %s, size = %s WHERE id_document = %s",
+                    (st.st_mtime, st.st_size, row[0]),
+                )
+                unchanged += 1
+                continue
+
+            to_ingest.append((pdf, FileState(path=path, sha256=sha, mtime=st.st_mtime, size=st.st_size)))
+
+        removed = [r[0] for path, r in known.items() if path not in seen]
+        if removed:
+            cur.execute("DELETE FROM embeddings WHERE id_document = ANY(%s)", (removed,))
+            cur.execute("DELETE FROM documents WHERE id_document = ANY(%s)", (removed,))
+            print(f"[DEL] {len(removed)} document(s) supprimé(s) du dossier")
+
+        cur.execute(
+            """
+            DELETE FROM embeddings e
+            WHERE NOT EXISTS (SELECT 1 FROM documents d WHERE d.id_document = e.id_document)
+            """
+        )
+        if cur.rowcount:
+            print(f"[DEL] {cur.rowcount} fragment(s) orphelin(s) purgé(s)")
+    conn.commit()
+
+    return to_ingest, unchanged
+
+
+class _RowWriter(threading.Thread):
+    """
+    Étape 3 du pipeline: écriture en base dans un thread dédié, alimenté par une file
+    bornée. Pendant que ce thread attend PostgreSQL, le processus principal encode le
+    document suivant.
+    Chaque document est (ré)enregistré dans documents (id_document stable par chemin),
+    ses anciens fragments sont supprimés, puis les nouveaux insérés, dans la même
+    transaction.
+    """
+
+    def __init__(self, conn: psycopg.Connection, bulk: bool, batch_size: int, queue_size: int):
+        super().__init__(name="ingest-writer", daemon=True)
+        self.conn = conn
+        self.bulk = bulk
+        self.batch_size = batch_size
+        self.jobs: "queue.Queue[Optional[DocumentJob]]" = queue.Queue(maxsize=max(1, queue_size))
+        self.error: Optional[BaseException] = None
+        self.rows_written = 0
+        self.t_start = time.perf_counter()
+        # Document en cours (ses parties arrivent à la suite)
+        self._doc_id = 0
+        self._doc_fragments = 0
+
+    def put(self, job: DocumentJob) -> None:
+        if self.error is not None:
+            raise self.error
+        self.jobs.put(job)
+
+    def close(self) -> None:
+        self.jobs.put(None)
+        self.join()
+        if self.error is not None:
+            raise self.error
+
+    def _write(self, cur: psycopg.Cursor, job: DocumentJob, pending: List[Row]) -> int:
+        state, chunks, embeddings, first, last = job
+        if first:
+            chunker, chunk_size, chunk_overlap = chunk_params()
+            cur.execute(
+                DOCUMENT_UPSERT_SQL,
+                {
+                    "path": state.path,
+                    "sha256": state.sha256,
+                    "mtime": state.mtime,
+                    "size": state.size,
+                    "chunker": chunker,
+                    "chunk_size": chunk_size,
+                    "chunk_overlap": chunk_overlap,
+                    "model_name": settings.embedding_model,
+                    "n_fragments": len(chunks),
+                },
+            )
+            self._doc_id = int(cur.fetchone()[0])
+            self._doc_fragments = 0
+            cur.execute("DELETE FROM embeddings WHERE id_document = %s", (self._doc_id,))
+        doc_id = self._doc_id
+        self._doc_fragments += len(chunks)
+        if last and not first:
+            cur.execute(
+                "UPDATE documents SET n_fragments = %s WHERE id_document = %s", (self._doc_fragments, doc_id)
+            )
+
+        rows = [
+            (doc_id, chunk, np.asarray(emb, dtype=np.float32))
+            for chunk, emb in zip(chunks, embeddings)
+        ]
+        if self.bulk:
+            pending.extend(rows)
+        elif rows:
+            cur.executemany(INSERT_SQL, rows)
+        return doc_id
+
+    def run(self) -> None:
+        finished = False
+        try:
+            pending: List[Row] = []
+            with self.conn.cursor() as cur:
+                while True:
+                    job = self.jobs.get()
+                    if job is None:
+                        finished = True
+                        break
+
+                    doc_id = self._write(cur, job, pending)
+                    if len(pending) >= self.batch_size:
+                        copy_rows(self.conn, pending)
+                        pending = []
+
+                    self.rows_written += len(job[1])
+                    if job[4]:
+                        elapsed = time.perf_counter() - self.t_start
+                        print(
+                            f"[OK] {Path(job[0].path).name}: {self._doc_fragments} fragments "
+                            f"(id_document={doc_id}) - {self.rows_written / elapsed:.1f} lignes/s"
+                        )
+            if pending:
+                copy_rows(self.conn, pending)
+            self.conn.commit()
+        except BaseException as e:
+            self.error = e
+            # Vide la file pour ne pas bloquer le producteur jusqu'au close()
+            while not finished:
+                finished = self.jobs.get() is None
+
+
+def ingest_folder(
+    pdf_folder: Path,
+    bulk: bool = False,
+    batch_size: int = settings.ingest_batch_size,
+    workers: int = settings.ingest_workers,
+    queue_size: int = settings.ingest_queue_size,
+    pages_per_task: int = settings.ingest_pages_per_task,
+):
+    """
+    Ingestion incrémentale et idempotente (pipeline en 3 étapes reliées par des files bornées):
+    - plan: seuls les PDF nouveaux/modifiés sont traités, les supprimés sont purgés
+    - pool de processus: extraction texte -> chunks (workers processus, CHUNKER=chars|structure),
+      par tâches de pages_per_task pages (mémoire bornée même pour un très grand PDF)
+    - processus principal: embedding de chaque chunk (normalisé) avec all-MiniLM-L6-v2
+    - thread d'écriture: documents + embeddings(id_document, texte_fragment, vecteur)
+    Un PDF garde le même id_document d'une exécution à l'autre (clé: chemin du fichier).
+
+    bulk=True (chargement complet):
+    - les index HNSW sont supprimés avant le chargement puis reconstruits à la fin
+    - les lignes sont envoyées par COPY binaire, avec un commit tous les batch_size fragments
+    """
+    ensure_schema(vector_index=not bulk)
 
     pdf_files = sorted([p for p in pdf_folder.rglob("*.pdf")])
     if not pdf_files:
         raise RuntimeError(f"Aucun PDF trouvé dans: {pdf_folder}")
 
     with get_connection() as conn:
-        with conn.cursor() as cur:
-            doc_id = 1
-            for pdf in pdf_files:
-                text = extract_text_from_pdf(pdf)
-                chunks = chunk_text(text, settings.chunk_size, settings.chunk_overlap)
-                if not chunks:
+        to_ingest, unchanged = plan_ingestion(conn, pdf_folder, pdf_files)
+        print(f"[PLAN] {len(to_ingest)} PDF à (ré)ingérer, {unchanged} inchangé(s)")
+        if not to_ingest:
+            if bulk:
+                # Rien à charger: l'index (non créé par ensure_schema) doit tout de même exister
+                ensure_vector_index(conn)
+            return
+
+        model = load_model()  # EMBEDDING_ENGINE: torch | onnx (vecteurs compatibles)
+        test_vec = model.encode("test", normalize_embeddings=True)
+        if len(test_vec) != 384:
+            raise ValueError(f"Le modèle n'est pas en 384 dimensions: {len(test_vec)}")
+
+        # Les blocs répétés (en-têtes, mentions légales) ne sont encodés qu'une fois
+        cache = get_embedding_cache(cache_namespace())
+        states = dict(to_ingest)
+        chunk_stats = ChunkStats(model_max_tokens(get_tokenizer())) if settings.chunker == "structure" else None
+        total_rows = 0
+        t_start = time.perf_counter()
+
+        if bulk:
+            drop_vector_index(conn)
+
+        writer = _RowWriter(conn, bulk=bulk, batch_size=batch_size, queue_size=queue_size)
+        writer.start()
+        try:
+            doc_rows = 0
+            for pdf, chunks, n_tokens, first, last in iter_chunked_pdfs(
+                list(states), workers=workers, max_pending=queue_size, pages_per_task=pages_per_task
+            ):
+                if chunk_stats is not None:
+                    chunk_stats.add(n_tokens)
+                if first:
+                    doc_rows = 0
+                doc_rows += len(chunks)
+                if last and not doc_rows:
                     print(f"[SKIP] {pdf.name}: texte vide")
-                    doc_id += 1
-                    continue
-
-                embeddings = model.encode(chunks, normalize_embeddings=True)
-                # Insert chunk par chunk
-                for chunk, emb in zip(chunks, embeddings):
-                    emb = np.array(emb, dtype=np.float32)
-                    vec_literal = to_pgvector_literal(emb)
-
-                    cur.execute(
-                        """
-                        INSERT INTO embeddings (id_document, texte_fragment, vecteur)
-                        VALUES (%s, %s, %s::vector)
-                        """,
-                        (doc_id, chunk, vec_literal),
-                    )
-
-                print(f"[OK] {pdf.name}: {len(chunks)} fragments insérés (id_document={doc_id})")
-                doc_id += 1
 
-        conn.commit()
+                if chunks:
+                    embeddings = encode_with_cache(model, chunks, cache)
+                else:
+                    embeddings = np.zeros((0, 384), dtype=np.float32)
+                writer.put((states[pdf], chunks, embeddings, first, last))
+                total_rows += len(chunks)
+        finally:
+            writer.close()
+
+        load_seconds = time.perf_counter() - t_start
+        rows_per_sec = total_rows / max(load_seconds, 1e-9)
+        print(f"[LOAD] {total_rows} fragments en {load_seconds:.1f}s ({rows_per_sec:.1f} lignes/s)")
+        if cache is not None:
+            print(f"[CACHE] {cache.stats()}")
+        if chunk_stats is not None:
+            print(f"[CHUNKS] {settings.chunker}: {chunk_stats.report()}")
+        else:
+            # Tailles en caractères: le rapport en tokens chargerait le tokenizer pour rien
+            print("[CHUNKS] chars: rapport en tokens avec python chunking.py --chunker chars")
+
+        if bulk:
+            index_seconds = build_vector_index(conn)
+            print(f"[INDEX] index vectoriels reconstruits en {index_seconds:.1f}s")
+        else:
+            # IVFFlat reporté par ensure_schema (table vide au départ): créé sur les lignes chargées
+            ensure_vector_index(conn)
 
 
 if __name__ == "__main__":
@@ -125,6 +560,42 @@ if __name__ == "__main__":
         required=True,
         help="Chemin du dossier contenant les PDF (ex: ./embedding)",
     )
+    parser.add_argument(
+        "--bulk",
+        action="store_true",
+        help="Chargement complet: COPY binaire + index HNSW reconstruit à la fin",
+    )
+    parser.add_argument(
+        "--batch_size",
+        type=int,
+        default=settings.ingest_batch_size,
+        help="Nombre de fragments par COPY/commit en mode --bulk",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=settings.ingest_workers,
+        help="Processus d'extraction PDF en parallèle (0 = extraction en série)",
+    )
+    parser.add_argument(
+        "--queue_size",
+        type=int,
+        default=settings.ingest_queue_size,
+        help="Taille des files entre les étapes (contre-pression)",
+    )
+    parser.add_argument(
+        "--pages_per_task",
+        type=int,
+        default=settings.ingest_pages_per_task,
+        help="Pages par tâche d'extraction (un grand PDF est traité par morceaux)",
+    )
     args = parser.parse_args()
 
-    ingest_folder(Path(args.pdf_dir))
\ No newline at end of file
+    ingest_folder(
+        Path(args.pdf_dir),
+        bulk=args.bulk,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        queue_size=args.queue_size,
+        pages_per_task=args.pages_per_task,
+    )
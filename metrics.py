@@ -0,0 +1,243 @@
+"""
+Latence par étape d'une requête (embed, retrieve, db_acquire, db_query, llm_*, serialize):
+- histogrammes Prometheus exposés par GET /metrics (format texte, sans dépendance)
+- détail de la requête en cours (RequestTrace, contextvar): champ debug de /search,
+  journal des requêtes lentes au-delà de SLOW_QUERY_MS
+- taille du prompt de réponse finale avant / après regroupement des sources (context_packer)
+"""
+from __future__ import annotations
+
+import bisect
+import json
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from config import settings
+
+# Bornes des buckets en secondes (de l'encodage ~ms aux appels LLM ~10 s)
+LATENCY_SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+PROMPT_TOKENS_BUCKETS = (128, 256, 384, 512, 768, 1024, 1536, 2048, 3072, 4096)
+
+
+class Histogram:
+    """
+    Histogramme à buckets fixes (compteurs cumulatifs + somme), thread-safe.
+    """
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)  # dernier = +Inf
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self._counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._sum += value
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        cumulative, running = {}, 0
+        for bound, c in zip([*map(str, self.buckets), "+Inf"], counts):
+            running += c
+            cumulative[bound] = running
+        return {
+            "buckets": cumulative,
+            "count": running,
+            "sum": total,
+            "mean": (total / running) if running else 0.0,
+        }
+
+
+class HistogramFamily:
+    """
+    Histogrammes d'une même métrique, un par valeur de label (ex: stage="embed").
+    """
+
+    def __init__(self, name: str, help_text: str, label: str, buckets: Sequence[float]):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._children: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, value: str) -> Histogram:
+        child = self._children.get(value)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(value, Histogram(self.buckets))
+        return child
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for value, child in sorted(self._children.items()):
+            snap = child.snapshot()
+            for bound, count in snap["buckets"].items():
+                lines.append(f'{self.name}_bucket{{{self.label}="{value}",le="{bound}"}} {count}')
+            lines.append(f'{self.name}_sum{{{self.label}="{value}"}} {snap["sum"]}')
+            lines.append(f'{self.name}_count{{{self.label}="{value}"}} {snap["count"]}')
+        return lines
+
+
+class CounterFamily:
+    def __init__(self, name: str, help_text: str, label: str):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self._values: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value: str) -> None:
+        with self._lock:
+            self._values[value] = self._values.get(value, 0) + 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        lines.extend(f'{self.name}{{{self.label}="{value}"}} {count}' for value, count in items)
+        return lines
+
+
+STAGE_SECONDS = HistogramFamily(
+    "rag_stage_duration_seconds", "Durée de chaque étape d'une recherche.", "stage", LATENCY_SECONDS_BUCKETS
+)
+REQUEST_SECONDS = HistogramFamily(
+    "rag_request_duration_seconds", "Durée totale des requêtes par endpoint.", "endpoint", LATENCY_SECONDS_BUCKETS
+)
+SLOW_REQUESTS = CounterFamily("rag_slow_requests_total", "Requêtes au-delà de SLOW_QUERY_MS.", "endpoint")
+RERANKS = CounterFamily(
+    "rag_rerank_total", "Re-classements: reranked, cached (scores en cache), fallback (budget dépassé).", "outcome"
+)
+PROMPT_TOKENS = HistogramFamily(
+    "rag_prompt_tokens",
+    "Tokens (estimés) du prompt de réponse finale: raw = fragments tronqués, packed = sources regroupées.",
+    "prompt",
+    PROMPT_TOKENS_BUCKETS,
+)
+
+
+class RequestTrace:
+    """
+    Durées cumulées par étape pour une requête (les appels LLM parallèles s'additionnent:
+    la somme peut dépasser la durée totale).
+    """
+
+    def __init__(self, endpoint: str, question: Any):
+        self.endpoint = endpoint
+        self.question = question
+        self.t_start = time.perf_counter()
+        self.stages_ms: Dict[str, float] = {}
+        self.stage_counts: Dict[str, int] = {}
+        self.info: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, ms: float) -> None:
+        with self._lock:
+            self.stages_ms[stage] = self.stages_ms.get(stage, 0.0) + ms
+            self.stage_counts[stage] = self.stage_counts.get(stage, 0) + 1
+
+    def annotate(self, key: str, value: Any) -> None:
+        with self._lock:
+            self.info[key] = value
+
+    @contextmanager
+    def activate(self) -> Iterator["RequestTrace"]:
+        # Les étapes mesurées dans ce bloc (et les tâches qu'il crée) sont ajoutées à cette trace
+        token = _current_trace.set(self)
+        try:
+            yield self
+        finally:
+            _current_trace.reset(token)
+
+    def breakdown(self) -> Dict[str, Any]:
+        with self._lock:
+            report = {
+                "total_ms": (time.perf_counter() - self.t_start) * 1000,
+                "stages_ms": dict(self.stages_ms),
+                "stage_counts": dict(self.stage_counts),
+            }
+            if self.info:
+                report["info"] = dict(self.info)
+            return report
+
+    def finish(self) -> Dict[str, Any]:
+        """
+        Enregistre la durée totale (histogramme par endpoint) et journalise la requête si
+        elle dépasse SLOW_QUERY_MS.
+        """
+        report = self.breakdown()
+        REQUEST_SECONDS.labels(self.endpoint).observe(report["total_ms"] / 1000)
+        if settings.slow_query_ms > 0 and report["total_ms"] >= settings.slow_query_ms:
+            SLOW_REQUESTS.inc(self.endpoint)
+            _log_slow({"endpoint": self.endpoint, "question": self.question, **report})
+        return report
+
+
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("rag_request_trace", default=None)
+_slow_log_lock = threading.Lock()
+
+
+def _log_slow(entry: Dict[str, Any]) -> None:
+    line = json.dumps({"ts": time.time(), **entry}, ensure_ascii=False)
+    print(f"[SLOW] {line}")
+    if settings.slow_query_log is not None:
+        with _slow_log_lock:
+            settings.slow_query_log.parent.mkdir(parents=True, exist_ok=True)
+            with settings.slow_query_log.open("a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    STAGE_SECONDS.labels(stage).observe(seconds)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(stage, seconds * 1000)
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+def record_prompt_tokens(stats: Dict[str, int]) -> None:
+    """
+    Tokens du prompt avant / après regroupement des sources (prompt_tokens_raw /
+    prompt_tokens_packed): histogrammes /metrics et champ "info" de la requête en cours.
+    """
+    PROMPT_TOKENS.labels("raw").observe(stats["prompt_tokens_raw"])
+    PROMPT_TOKENS.labels("packed").observe(stats["prompt_tokens_packed"])
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.annotate("context_packing", stats)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - t0)
+
+
+@contextmanager
+def request_trace(endpoint: str, question: Any) -> Iterator[RequestTrace]:
+    trace = RequestTrace(endpoint, question)
+    try:
+        with trace.activate():
+            yield trace
+    finally:
+        trace.finish()
+
+
+def render_prometheus() -> str:
+    lines: List[str] = []
+    for family in (STAGE_SECONDS, REQUEST_SECONDS, SLOW_REQUESTS, RERANKS, PROMPT_TOKENS):
+        lines.extend(family.render())
+    return "\n".join(lines) + "\n"
@@ -1,53 +1,282 @@
 from __future__ import annotations
 
+import asyncio
 import json
-import urllib.request
-from typing import List, Dict
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
 
+import httpx
 
-def _ollama_generate(
+from answer_cache import AnswerCache, get_answer_cache
+from config import settings
+from context_packer import count_tokens, pack_contexts
+from metrics import record_prompt_tokens, record_stage, span
+from ollama_pool import Endpoint, get_ollama_pool, is_connect_error
+
+# Versions des templates de prompt: à incrémenter à chaque modification du texte
+# d'un prompt (invalide les réponses déjà en cache)
+ONE_SENTENCE_PROMPT_VERSION = "one_sentence-v1"
+FINAL_PROMPT_VERSION = "final-v1"
+# Réponse finale avec sources regroupées dans un budget de tokens (context_packer)
+PACKED_FINAL_PROMPT_VERSION = "final-packed-v2"
+
+# base_url=None: appels répartis entre les instances OLLAMA_ENDPOINTS (ollama_pool);
+# une base_url explicite n'utilise que cette instance
+
+
+def _keep_alive(value: str) -> Any:
+    # "30m", "1h" => durée; "-1", "0", "3600" => secondes (nombre)
+    return int(value) if value.lstrip("-").isdigit() else value
+
+
+def _generate_payload(
     prompt: str,
-    model: str = "phi3:mini",
-    base_url: str = "http://localhost:11434",
-    timeout: int = 60,
-    num_predict: int = 120,
-    temperature: float = 0.2,
-) -> str:
-    payload = {
+    model: str,
+    num_predict: int,
+    temperature: float,
+    stream: bool = False,
+) -> Dict[str, Any]:
+    payload: Dict[str, Any] = {
         "model": model,
         "prompt": prompt,
-        "stream": False,
+        "stream": stream,
         "options": {
             "temperature": temperature,
             "num_predict": num_predict,
         },
     }
+    # Modèle gardé en mémoire entre deux appels (pas de rechargement)
+    if settings.ollama_keep_alive:
+        payload["keep_alive"] = _keep_alive(settings.ollama_keep_alive)
+    return payload
 
-    req = urllib.request.Request(
-        f"{base_url}/api/generate",
-        data=json.dumps(payload).encode("utf-8"),
-        headers={"Content-Type": "application/json"},
-        method="POST",
-    )
 
-    with urllib.request.urlopen(req, timeout=timeout) as resp:
-        data = json.loads(resp.read().decode("utf-8"))
+def _timeout(timeout: float) -> httpx.Timeout:
+    # Connexion courte: une instance arrêtée est détectée (et évitée) sans attendre timeout
+    return httpx.Timeout(timeout, connect=min(timeout, settings.ollama_connect_timeout))
 
-    return (data.get("response") or "").strip()
 
+def llm_deadline(timeout: float) -> float:
+    """
+    Délai global d'un appel (asyncio.wait_for côté API), attente d'une place comprise: plus long
+    que le timeout httpx, pour que le ReadTimeout d'une instance bloquée arrive en premier et
+    compte pour le disjoncteur (une annulation par wait_for n'est pas imputée à l'instance).
+    """
+    return 2 * timeout + settings.ollama_connect_timeout
 
-def ollama_one_sentence_answer_for_result(
-    question: str,
-    fragment: str,
+
+# ----------------------------
+# Client synchrone (Streamlit, threads): mêmes délais et même bascule que le client asynchrone
+# ----------------------------
+_sync_client: Optional[httpx.Client] = None
+_sync_client_lock = threading.Lock()
+
+
+def get_sync_client() -> httpx.Client:
+    global _sync_client
+    if _sync_client is None:
+        with _sync_client_lock:
+            if _sync_client is None:
+                _sync_client = httpx.Client(
+                    limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60.0),
+                    headers={"Content-Type": "application/json"},
+                )
+    return _sync_client
+
+
+def _ollama_generate(
+    prompt: str,
     model: str = "phi3:mini",
-    base_url: str = "http://localhost:11434",
+    base_url: Optional[str] = None,
     timeout: int = 60,
-    max_chars: int = 900,
+    num_predict: int = 120,
+    temperature: float = 0.2,
 ) -> str:
+    payload = _generate_payload(prompt, model, num_predict, temperature)
+    pool = get_ollama_pool(base_url)
+    tried: List[Endpoint] = []
+
+    while True:
+        try:
+            with pool.lease(exclude=tried) as ep:
+                tried.append(ep)
+                with span("llm_generate"):
+                    resp = get_sync_client().post(f"{ep.url}/api/generate", json=payload, timeout=_timeout(timeout))
+                resp.raise_for_status()
+            return (resp.json().get("response") or "").strip()
+        except Exception as e:
+            # Instance injoignable: rien n'a été généré, l'appel part vers une autre instance
+            if not (is_connect_error(e) and pool.can_failover(tried)):
+                raise
+
+
+def _ollama_generate_stream(
+    prompt: str,
+    model: str = "phi3:mini",
+    base_url: Optional[str] = None,
+    timeout: int = 60,
+    num_predict: int = 120,
+    temperature: float = 0.2,
+) -> Iterator[str]:
     """
-    Génère UNE phrase qui répond à la question en utilisant UNIQUEMENT le fragment.
-    Si le fragment ne contient pas l'info => "Non indiqué dans ce fragment."
+    Génération en streaming: Ollama renvoie du NDJSON (une ligne JSON par morceau),
+    chaque morceau est produit dès sa réception.
+    """
+    payload = _generate_payload(prompt, model, num_predict, temperature, stream=True)
+    pool = get_ollama_pool(base_url)
+    tried: List[Endpoint] = []
+
+    while True:
+        started = False
+        try:
+            with pool.lease(exclude=tried) as ep:
+                tried.append(ep)
+                t0 = time.perf_counter()
+                with span("llm_stream"), get_sync_client().stream(
+                    "POST", f"{ep.url}/api/generate", json=payload, timeout=_timeout(timeout)
+                ) as resp:
+                    resp.raise_for_status()
+                    for line in resp.iter_lines():
+                        if not line.strip():
+                            continue
+                        chunk = json.loads(line)
+                        if chunk.get("error"):
+                            raise RuntimeError(chunk["error"])
+                        token = chunk.get("response") or ""
+                        if token:
+                            if not started:
+                                record_stage("llm_first_token", time.perf_counter() - t0)
+                                started = True
+                            yield token
+                        if chunk.get("done"):
+                            break
+            return
+        except Exception as e:
+            # Nouvelle instance seulement si aucun token n'a encore été produit
+            if started or not (is_connect_error(e) and pool.can_failover(tried)):
+                raise
+
+
+# ----------------------------
+# Client asynchrone (FastAPI): connexions HTTP keep-alive réutilisées entre requêtes
+# ----------------------------
+_async_client: Optional[httpx.AsyncClient] = None
+
+
+def get_async_client() -> httpx.AsyncClient:
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60.0),
+            headers={"Content-Type": "application/json"},
+        )
+    return _async_client
+
+
+async def close_async_client() -> None:
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+
+async def ollama_ping_async(base_url: Optional[str] = None, timeout: float = 5.0) -> List[str]:
     """
+    Vérifie chaque instance Ollama (GET /api/tags) et met à jour son disjoncteur.
+    Retourne les modèles installés sur la première instance qui répond; échoue si aucune ne répond.
+    """
+    pool = get_ollama_pool(base_url)
+
+    async def probe(ep: Endpoint) -> List[str]:
+        try:
+            resp = await get_async_client().get(f"{ep.url}/api/tags", timeout=_timeout(timeout))
+            resp.raise_for_status()
+        except Exception as e:
+            pool.mark(ep, e)
+            raise
+        pool.mark(ep)
+        return [m.get("name", "") for m in resp.json().get("models", [])]
+
+    results = await asyncio.gather(*(probe(ep) for ep in pool.endpoints), return_exceptions=True)
+    for r in results:
+        if not isinstance(r, BaseException):
+            return r
+    raise results[0]
+
+
+async def _ollama_generate_async(
+    prompt: str,
+    model: str = "phi3:mini",
+    base_url: Optional[str] = None,
+    timeout: int = 60,
+    num_predict: int = 120,
+    temperature: float = 0.2,
+) -> str:
+    payload = _generate_payload(prompt, model, num_predict, temperature)
+    pool = get_ollama_pool(base_url)
+    tried: List[Endpoint] = []
+
+    while True:
+        try:
+            # Attente d'une place sous OLLAMA_MAX_CONCURRENCY (llm_queue), puis l'appel HTTP
+            async with pool.lease_async(exclude=tried) as ep:
+                tried.append(ep)
+                with span("llm_generate"):
+                    resp = await get_async_client().post(
+                        f"{ep.url}/api/generate", json=payload, timeout=_timeout(timeout)
+                    )
+                resp.raise_for_status()
+            return (resp.json().get("response") or "").strip()
+        except Exception as e:
+            if not (is_connect_error(e) and pool.can_failover(tried)):
+                raise
+
+
+async def _ollama_generate_stream_async(
+    prompt: str,
+    model: str = "phi3:mini",
+    base_url: Optional[str] = None,
+    timeout: int = 60,
+    num_predict: int = 120,
+    temperature: float = 0.2,
+) -> AsyncIterator[str]:
+    payload = _generate_payload(prompt, model, num_predict, temperature, stream=True)
+    pool = get_ollama_pool(base_url)
+    tried: List[Endpoint] = []
+
+    while True:
+        started = False
+        try:
+            async with pool.lease_async(exclude=tried) as ep:
+                tried.append(ep)
+                t0 = time.perf_counter()
+                with span("llm_stream"):
+                    async with get_async_client().stream(
+                        "POST", f"{ep.url}/api/generate", json=payload, timeout=_timeout(timeout)
+                    ) as resp:
+                        resp.raise_for_status()
+                        async for line in resp.aiter_lines():
+                            if not line.strip():
+                                continue
+                            chunk = json.loads(line)
+                            if chunk.get("error"):
+                                raise RuntimeError(chunk["error"])
+                            token = chunk.get("response") or ""
+                            if token:
+                                if not started:
+                                    record_stage("llm_first_token", time.perf_counter() - t0)
+                                    started = True
+                                yield token
+                            if chunk.get("done"):
+                                break
+            return
+        except Exception as e:
+            if started or not (is_connect_error(e) and pool.can_failover(tried)):
+                raise
+
+
+def _one_sentence_prompt(question: str, fragment: str, max_chars: int) -> str:
     frag = (fragment or "").strip().replace("\r", "")
     if len(frag) > max_chars:
         frag = frag[:max_chars].rstrip() + " ..."
@@ -67,39 +296,39 @@ Règles:
 - Si le fragment ne contient pas la réponse, écris exactement: "Non indiqué dans ce fragment."
 
 Phrase:"""
+    return prompt
 
-    return _ollama_generate(
-        prompt=prompt,
-        model=model,
-        base_url=base_url,
-        timeout=timeout,
-        num_predict=90,
-        temperature=0.1,
-    )
 
+def _source_label(c: Dict, i: int) -> str:
+    # Sources regroupées: rangs d'origine du Top-K ("Résultat i" dans l'UI et l'API)
+    ranks = c.get("sources") or [i]
+    if len(ranks) == 1:
+        return f"Source {ranks[0]}"
+    return "Sources " + "+".join(str(r) for r in ranks)
 
-def ollama_answer_from_context(
-    question: str,
-    contexts: List[Dict],
-    model: str = "phi3:mini",
-    base_url: str = "http://localhost:11434",
-    timeout: int = 60,
-    max_chars_per_context: int = 900,
+
+def _final_answer_prompt(
+    question: str, contexts: List[Dict], max_chars_per_context: int, packed: bool = False
 ) -> str:
-    """
-    Génère une réponse finale (1-2 phrases) en se basant UNIQUEMENT sur les Top-K fragments.
-    """
     sources_txt = []
     for i, c in enumerate(contexts, start=1):
         frag = (c.get("texte_fragment") or "").strip().replace("\r", "")
-        if len(frag) > max_chars_per_context:
+        # max_chars_per_context=0: sources déjà ramenées au budget de tokens
+        if max_chars_per_context and len(frag) > max_chars_per_context:
             frag = frag[:max_chars_per_context].rstrip() + " ..."
 
         sources_txt.append(
-            f"[Source {i}] doc={c.get('id_document')} score={float(c.get('score', 0.0)):.4f}\n{frag}"
+            f"[{_source_label(c, i)}] doc={c.get('id_document')} score={float(c.get('score', 0.0)):.4f}\n{frag}"
         )
 
     joined_sources = "\n\n".join(sources_txt)
+    if packed:
+        citation = (
+            "- Termine par: Sources utilisées: les numéros entre crochets des sources réellement utilisées "
+            "(ex: [Sources 1+3] se cite 1,3)."
+        )
+    else:
+        citation = "- Termine par: Sources utilisées: 1,2,3 (uniquement celles réellement utilisées)."
 
     prompt = f"""Tu es un assistant expert en boulangerie/pâtisserie.
 Réponds à la question UNIQUEMENT à partir des sources.
@@ -115,15 +344,259 @@ Consignes:
 - Réponse courte (1 à 2 phrases).
 - Garde les chiffres et unités (ppm, %, g/tonne).
 - Si plusieurs ingrédients sont demandés, répond par ingrédient SI l’info existe dans les sources.
-- Termine par: Sources utilisées: 1,2,3 (uniquement celles réellement utilisées).
+{citation}
 
 Réponse:"""
+    return prompt
+
+
+def _context_fragments(contexts: List[Dict]) -> List[str]:
+    return [c.get("texte_fragment") or "" for c in contexts]
+
+
+def _context_budget(context_budget_tokens: Optional[int]) -> int:
+    return settings.context_token_budget if context_budget_tokens is None else context_budget_tokens
+
+
+def _final_cache_key(
+    model: str, question: str, contexts: List[Dict], max_chars_per_context: int, budget: int
+) -> Tuple:
+    if budget > 0:
+        # Le budget de tokens remplace la troncature par fragment
+        return (model, PACKED_FINAL_PROMPT_VERSION, budget, question, _context_fragments(contexts))
+    return (model, FINAL_PROMPT_VERSION, max_chars_per_context, question, _context_fragments(contexts))
+
+
+def _final_prompt(question: str, contexts: List[Dict], max_chars_per_context: int, budget: int) -> str:
+    """
+    Prompt de réponse finale; si budget > 0, sources dédoublonnées, fusionnées et réparties
+    selon le score (context_packer). Les tokens avant / après sont enregistrés (metrics).
+    Tokenisation CPU: appelé via asyncio.to_thread depuis les chemins asynchrones.
+    """
+    if budget <= 0:
+        return _final_answer_prompt(question, contexts, max_chars_per_context)
+    with span("pack_context"):
+        packed, stats = pack_contexts(contexts, budget, max_chars_per_context=max_chars_per_context)
+        prompt = _final_answer_prompt(question, packed, 0, packed=True)
+        packed_tokens = count_tokens([prompt])[0]
+    # Prompt sans regroupement estimé sans le construire: même gabarit, fragments tronqués
+    # à max_chars_per_context (context_tokens_in)
+    raw_tokens = packed_tokens - stats["context_tokens_out"] + stats["context_tokens_in"]
+    record_prompt_tokens({**stats, "prompt_tokens_raw": raw_tokens, "prompt_tokens_packed": packed_tokens})
+    return prompt
+
+
+def _cache_lookup(use_cache: bool, key: Tuple) -> Tuple[Optional[AnswerCache], Optional[str]]:
+    cache = get_answer_cache() if use_cache else None
+    return cache, (cache.get(*key) if cache is not None else None)
+
+
+async def _cache_lookup_async(use_cache: bool, key: Tuple) -> Tuple[Optional[AnswerCache], Optional[str]]:
+    # Mode sémantique: encodage de la question hors de la boucle d'événements
+    cache = get_answer_cache() if use_cache else None
+    return cache, ((await cache.get_async(*key)) if cache is not None else None)
+
+
+def ollama_one_sentence_answer_for_result(
+    question: str,
+    fragment: str,
+    model: str = "phi3:mini",
+    base_url: Optional[str] = None,
+    timeout: int = 60,
+    max_chars: int = 900,
+    use_cache: bool = True,
+) -> str:
+    """
+    Génère UNE phrase qui répond à la question en utilisant UNIQUEMENT le fragment.
+    Si le fragment ne contient pas l'info => "Non indiqué dans ce fragment."
+    """
+    key = (model, ONE_SENTENCE_PROMPT_VERSION, max_chars, question, [fragment])
+    cache, cached = _cache_lookup(use_cache, key)
+    if cached is not None:
+        return cached
+
+    prompt = _one_sentence_prompt(question, fragment, max_chars)
+
+    answer = _ollama_generate(
+        prompt=prompt,
+        model=model,
+        base_url=base_url,
+        timeout=timeout,
+        num_predict=90,
+        temperature=0.1,
+    )
+    if cache is not None:
+        cache.put(*key, answer)
+    return answer
+
+
+def ollama_answer_from_context(
+    question: str,
+    contexts: List[Dict],
+    model: str = "phi3:mini",
+    base_url: Optional[str] = None,
+    timeout: int = 60,
+    max_chars_per_context: int = 900,
+    use_cache: bool = True,
+    context_budget_tokens: Optional[int] = None,
+) -> str:
+    """
+    Génère une réponse finale (1-2 phrases) en se basant UNIQUEMENT sur les Top-K fragments.
+    context_budget_tokens: tokens des sources dans le prompt (None = CONTEXT_TOKEN_BUDGET,
+    0 = chaque fragment tronqué à max_chars_per_context).
+    """
+    budget = _context_budget(context_budget_tokens)
+    key = _final_cache_key(model, question, contexts, max_chars_per_context, budget)
+    cache, cached = _cache_lookup(use_cache, key)
+    if cached is not None:
+        return cached
+
+    prompt = _final_prompt(question, contexts, max_chars_per_context, budget)
+
+    answer = _ollama_generate(
+        prompt=prompt,
+        model=model,
+        base_url=base_url,
+        timeout=timeout,
+        num_predict=160,
+        temperature=0.2,
+    )
+    if cache is not None:
+        cache.put(*key, answer)
+    return answer
+
+
+async def ollama_one_sentence_answer_for_result_async(
+    question: str,
+    fragment: str,
+    model: str = "phi3:mini",
+    base_url: Optional[str] = None,
+    timeout: int = 60,
+    max_chars: int = 900,
+    use_cache: bool = True,
+) -> str:
+    """
+    Version asynchrone de ollama_one_sentence_answer_for_result.
+    """
+    key = (model, ONE_SENTENCE_PROMPT_VERSION, max_chars, question, [fragment])
+    cache, cached = await _cache_lookup_async(use_cache, key)
+    if cached is not None:
+        return cached
+
+    answer = await _ollama_generate_async(
+        prompt=_one_sentence_prompt(question, fragment, max_chars),
+        model=model,
+        base_url=base_url,
+        timeout=timeout,
+        num_predict=90,
+        temperature=0.1,
+    )
+    if cache is not None:
+        await cache.put_async(*key, answer)
+    return answer
+
+
+async def ollama_answer_from_context_async(
+    question: str,
+    contexts: List[Dict],
+    model: str = "phi3:mini",
+    base_url: Optional[str] = None,
+    timeout: int = 60,
+    max_chars_per_context: int = 900,
+    use_cache: bool = True,
+    context_budget_tokens: Optional[int] = None,
+) -> str:
+    """
+    Version asynchrone de ollama_answer_from_context.
+    """
+    budget = _context_budget(context_budget_tokens)
+    key = _final_cache_key(model, question, contexts, max_chars_per_context, budget)
+    cache, cached = await _cache_lookup_async(use_cache, key)
+    if cached is not None:
+        return cached
+
+    # Regroupement + tokenisation hors de la boucle d'événements
+    prompt = await asyncio.to_thread(_final_prompt, question, contexts, max_chars_per_context, budget)
+    answer = await _ollama_generate_async(
+        prompt=prompt,
+        model=model,
+        base_url=base_url,
+        timeout=timeout,
+        num_predict=160,
+        temperature=0.2,
+    )
+    if cache is not None:
+        await cache.put_async(*key, answer)
+    return answer
+
+
+def ollama_answer_from_context_stream(
+    question: str,
+    contexts: List[Dict],
+    model: str = "phi3:mini",
+    base_url: Optional[str] = None,
+    timeout: int = 60,
+    max_chars_per_context: int = 900,
+    use_cache: bool = True,
+    context_budget_tokens: Optional[int] = None,
+) -> Iterator[str]:
+    """
+    Comme ollama_answer_from_context, mais produit les tokens au fil de l'eau (Streamlit).
+    Une réponse en cache est produite d'un seul bloc.
+    """
+    budget = _context_budget(context_budget_tokens)
+    key = _final_cache_key(model, question, contexts, max_chars_per_context, budget)
+    cache, cached = _cache_lookup(use_cache, key)
+    if cached is not None:
+        yield cached
+        return
+
+    parts: List[str] = []
+    for token in _ollama_generate_stream(
+        prompt=_final_prompt(question, contexts, max_chars_per_context, budget),
+        model=model,
+        base_url=base_url,
+        timeout=timeout,
+        num_predict=160,
+        temperature=0.2,
+    ):
+        parts.append(token)
+        yield token
+    if cache is not None:
+        cache.put(*key, "".join(parts).strip())
+
+
+async def ollama_answer_from_context_stream_async(
+    question: str,
+    contexts: List[Dict],
+    model: str = "phi3:mini",
+    base_url: Optional[str] = None,
+    timeout: int = 60,
+    max_chars_per_context: int = 900,
+    use_cache: bool = True,
+    context_budget_tokens: Optional[int] = None,
+) -> AsyncIterator[str]:
+    """
+    Version asynchrone de ollama_answer_from_context_stream (SSE FastAPI).
+    """
+    budget = _context_budget(context_budget_tokens)
+    key = _final_cache_key(model, question, contexts, max_chars_per_context, budget)
+    cache, cached = await _cache_lookup_async(use_cache, key)
+    if cached is not None:
+        yield cached
+        return
 
-    return _ollama_generate(
+    parts: List[str] = []
+    prompt = await asyncio.to_thread(_final_prompt, question, contexts, max_chars_per_context, budget)
+    async for token in _ollama_generate_stream_async(
         prompt=prompt,
         model=model,
         base_url=base_url,
         timeout=timeout,
         num_predict=160,
         temperature=0.2,
-    )
\ No newline at end of file
+    ):
+        parts.append(token)
+        yield token
+    if cache is not None:
+        await cache.put_async(*key, "".join(parts).strip())
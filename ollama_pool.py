@@ -0,0 +1,221 @@
+"""
+Répartition des appels entre plusieurs instances Ollama (OLLAMA_ENDPOINTS):
+- routage vers l'instance qui a le moins d'appels en cours (en attente compris)
+- au plus max_concurrency générations simultanées par instance (au-delà, l'appel attend)
+- disjoncteur: après failure_threshold échecs consécutifs (connexion, timeout, HTTP 5xx),
+  l'instance est écartée pendant cooldown secondes, puis un seul appel d'essai la réintègre
+  (ou la ré-écarte). Si toutes les instances sont écartées, l'appel échoue immédiatement
+  (OllamaUnavailable) au lieu d'attendre le timeout.
+"""
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import httpx
+
+from config import settings
+from metrics import record_stage
+
+# Erreurs de connexion: rien n'a été envoyé au modèle, l'appel peut partir vers une autre instance
+CONNECT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, ConnectionRefusedError)
+
+
+class OllamaUnavailable(RuntimeError):
+    pass
+
+
+def is_endpoint_failure(exc: BaseException) -> bool:
+    """
+    Échec imputable à l'instance (compte pour le disjoncteur); une erreur 4xx
+    (modèle inconnu, requête invalide) n'en est pas une.
+    """
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500
+    return isinstance(exc, (httpx.TransportError, OSError))
+
+
+def is_connect_error(exc: BaseException) -> bool:
+    return isinstance(exc, CONNECT_ERRORS)
+
+
+class Endpoint:
+    def __init__(self, url: str, max_concurrency: int):
+        self.url = url.rstrip("/")
+        self.max_concurrency = max(1, max_concurrency)
+        self.outstanding = 0
+        self.requests = 0
+        self.errors = 0
+        self.consecutive_failures = 0
+        self.open_until = 0.0  # disjoncteur ouvert jusqu'à (time.monotonic)
+        self.trial_inflight = False
+        self.last_error: Optional[str] = None
+        self._sync_slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._async_slots: Optional[asyncio.Semaphore] = None
+
+    def async_slots(self) -> asyncio.Semaphore:
+        # Créé dans la boucle d'événements de l'API, au premier appel
+        if self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(self.max_concurrency)
+        return self._async_slots
+
+    def state(self, now: float) -> str:
+        if self.open_until == 0.0:
+            return "closed"
+        return "open" if now < self.open_until else "half_open"
+
+    def stats(self, now: float) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "state": self.state(now),
+            "outstanding": self.outstanding,
+            "max_concurrency": self.max_concurrency,
+            "requests": self.requests,
+            "errors": self.errors,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_in_s": max(0.0, self.open_until - now) if self.open_until else 0.0,
+            "last_error": self.last_error,
+        }
+
+
+class OllamaPool:
+    def __init__(
+        self,
+        urls: Sequence[str],
+        max_concurrency: int = settings.ollama_max_concurrency,
+        failure_threshold: int = settings.ollama_breaker_failures,
+        cooldown: float = settings.ollama_breaker_cooldown,
+    ):
+        if not urls:
+            raise ValueError("Aucune instance Ollama (OLLAMA_ENDPOINTS)")
+        self.endpoints = [Endpoint(u, max_concurrency) for u in urls]
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._next = 0  # départage des égalités (tourniquet)
+
+    def _pick(self, exclude: Sequence[Endpoint] = ()) -> Tuple[Endpoint, bool]:
+        """
+        Instance écartée dont le délai est écoulé (l'appel sert d'essai, un seul à la fois),
+        sinon la moins chargée parmi celles dont le disjoncteur est fermé.
+        Retourne (instance, appel d'essai).
+        """
+        now = time.monotonic()
+        with self._lock:
+            n = len(self.endpoints)
+            order = [self.endpoints[(self._next + i) % n] for i in range(n)]
+            self._next = (self._next + 1) % n
+            candidates = [e for e in order if e not in exclude]
+            trials = [e for e in candidates if e.state(now) == "half_open" and not e.trial_inflight]
+            closed = [e for e in candidates if e.state(now) == "closed"]
+            if trials:
+                ep, trial = trials[0], True
+                ep.trial_inflight = True
+            elif closed:
+                ep, trial = min(closed, key=lambda e: e.outstanding), False
+            else:
+                retry = min((e.open_until - now for e in candidates), default=0.0)
+                raise OllamaUnavailable(
+                    f"Aucune instance Ollama disponible ({len(candidates)} écartée(s), "
+                    f"nouvel essai dans {max(0.0, retry):.0f} s)"
+                )
+            ep.outstanding += 1
+            ep.requests += 1
+        return ep, trial
+
+    def _record(self, ep: Endpoint, trial: bool, exc: Optional[BaseException]) -> None:
+        # Appelé sous self._lock
+        if exc is None:
+            ep.consecutive_failures = 0
+            ep.open_until = 0.0
+            return
+        if not is_endpoint_failure(exc):
+            return
+        ep.errors += 1
+        ep.consecutive_failures += 1
+        ep.last_error = f"{type(exc).__name__}: {exc}"
+        if trial or ep.consecutive_failures >= self.failure_threshold:
+            if ep.open_until == 0.0 or trial:
+                print(f"[OLLAMA] {ep.url} écartée pour {self.cooldown:.0f} s ({ep.last_error})")
+            ep.open_until = time.monotonic() + self.cooldown
+
+    def _done(self, ep: Endpoint, trial: bool, exc: Optional[BaseException]) -> None:
+        with self._lock:
+            ep.outstanding -= 1
+            if trial:
+                ep.trial_inflight = False
+            self._record(ep, trial, exc)
+
+    def can_failover(self, tried: Sequence[Endpoint]) -> bool:
+        return len(tried) < len(self.endpoints)
+
+    @contextmanager
+    def lease(self, exclude: Sequence[Endpoint] = ()) -> Iterator[Endpoint]:
+        ep, trial = self._pick(exclude)
+        exc: Optional[BaseException] = None
+        t0 = time.perf_counter()
+        try:
+            with ep._sync_slots:
+                record_stage("llm_queue", time.perf_counter() - t0)
+                yield ep
+        except BaseException as e:
+            exc = e
+            raise
+        finally:
+            self._done(ep, trial, exc)
+
+    @asynccontextmanager
+    async def lease_async(self, exclude: Sequence[Endpoint] = ()) -> AsyncIterator[Endpoint]:
+        ep, trial = self._pick(exclude)
+        exc: Optional[BaseException] = None
+        t0 = time.perf_counter()
+        try:
+            async with ep.async_slots():
+                record_stage("llm_queue", time.perf_counter() - t0)
+                yield ep
+        except BaseException as e:
+            exc = e
+            raise
+        finally:
+            self._done(ep, trial, exc)
+
+    def mark(self, ep: Endpoint, exc: Optional[BaseException] = None) -> None:
+        """
+        Résultat d'une sonde hors appel de génération (ping): referme ou ouvre le disjoncteur.
+        """
+        with self._lock:
+            self._record(ep, False, exc)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            return [e.stats(now) for e in self.endpoints]
+
+
+_pools: Dict[Tuple[str, ...], OllamaPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_ollama_pool(base_url: Optional[str] = None) -> OllamaPool:
+    """
+    Pool des instances OLLAMA_ENDPOINTS, ou d'une seule instance si base_url est donnée.
+    """
+    urls = (base_url,) if base_url else settings.ollama_endpoints
+    pool = _pools.get(urls)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.setdefault(urls, OllamaPool(urls))
+    return pool
+
+
+def set_ollama_endpoints(urls: Sequence[str]) -> OllamaPool:
+    """
+    Remplace les instances du pool par défaut (benchmarks, serveurs simulés).
+    """
+    pool = OllamaPool(list(urls))
+    with _pools_lock:
+        _pools[settings.ollama_endpoints] = pool
+    return pool
@@ -1,82 +1,251 @@
 from __future__ import annotations
 
-import os
-from dataclasses import dataclass
-from typing import List, Optional
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Union
 
 import numpy as np
-import psycopg
-from dotenv import load_dotenv
-from sentence_transformers import SentenceTransformer
 
+from config import settings
+from db import get_dsn  # get_dsn ré-exporté pour app.py
+from embedding_cache import encode_with_cache, get_embedding_cache
+from embed_batcher import EmbeddingBatcher
+from embedding_engine import cache_namespace, load_model
+from metrics import span
+from reranker import get_reranker, rerank_candidates
+from retrieval import SearchOptions, SearchResult, get_backend  # SearchResult ré-exporté (API publique)
 
-@dataclass(frozen=True)
-class SearchResult:
-    id_document: int
-    texte_fragment: str
-    score: float
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
 
+    from embedding_engine import OnnxEncoder
 
-def _to_pgvector_literal(vec: np.ndarray) -> str:
-    vec_list = vec.astype(float).tolist()
-    return "[" + ",".join(f"{x:.8f}" for x in vec_list) + "]"
 
+_model: Optional[Union["SentenceTransformer", "OnnxEncoder"]] = None
+_model_lock = threading.Lock()
 
-def get_dsn() -> str:
-    load_dotenv()
-    host = os.getenv("PG_HOST", "127.0.0.1")
-    port = os.getenv("PG_PORT", "5433")
-    db = os.getenv("PG_DB", "rag_db")
-    user = os.getenv("PG_USER", "postgres")
-    password = os.getenv("PG_PASSWORD", "postgres")
-    return f"postgresql://{user}:{password}@{host}:{port}/{db}"
 
-
-_model: Optional[SentenceTransformer] = None
-
-
-def get_model() -> SentenceTransformer:
-    # cache simple en mémoire (évite de re-télécharger/recharger à chaque clic)
+def get_model() -> Union["SentenceTransformer", "OnnxEncoder"]:
+    # cache simple en mémoire (évite de re-télécharger/recharger à chaque clic).
+    # Import paresseux: torch / onnxruntime n'est chargé qu'au premier appel (ou par warm_up).
+    # Moteur choisi par EMBEDDING_ENGINE (torch | onnx).
     global _model
     if _model is None:
-        load_dotenv()
-        model_name = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
-        _model = SentenceTransformer(model_name)
+        with _model_lock:
+            if _model is None:
+                _model = load_model()
     return _model
 
 
-def semantic_search(question: str, top_k: int = 3) -> List[SearchResult]:
-    load_dotenv()
-    model = get_model()
-
-    q_vec = model.encode(question, normalize_embeddings=True)
+def model_loaded() -> bool:
+    return _model is not None
+
+
+WARMUP_TEXTS = [
+    "préchauffage du modèle",
+    "Quel dosage d'acide ascorbique (E300) est conseillé pour un blocage froid positif ?",
+]
+
+
+def warm_up() -> Dict[str, float]:
+    """
+    Charge le modèle puis exécute des encodages à blanc (batch 1 puis batch de plusieurs
+    longueurs), hors cache d'embeddings: le premier utilisateur ne paie ni le chargement
+    ni le coût de la première inférence. Retourne la durée de chaque phase (ms).
+    """
+    timings: Dict[str, float] = {}
+    t0 = time.perf_counter()
+    model = get_model()  # inclut l'import de torch (ou d'onnxruntime)
+    timings["model_load"] = (time.perf_counter() - t0) * 1000
+
+    t0 = time.perf_counter()
+    model.encode(WARMUP_TEXTS[:1], normalize_embeddings=True)
+    model.encode(WARMUP_TEXTS * 4, normalize_embeddings=True)
+    timings["warmup_encode"] = (time.perf_counter() - t0) * 1000
+
+    # Tokenizer du regroupement des sources (réponse finale), chargé hors requête: le
+    # regroupement peut être demandé par requête (context_budget_tokens) même si le défaut est 0
+    from chunking import get_tokenizer
+
+    t0 = time.perf_counter()
+    get_tokenizer()
+    timings["tokenizer_load"] = (time.perf_counter() - t0) * 1000
+
+    if settings.rerank_enabled:
+        # Cross-encoder chargé et préchauffé hors requête (sinon la 1re requête dépasse le budget)
+        t0 = time.perf_counter()
+        get_reranker().get_model().predict([(WARMUP_TEXTS[1], WARMUP_TEXTS[0])], show_progress_bar=False)
+        timings["rerank_load"] = (time.perf_counter() - t0) * 1000
+    return timings
+
+
+def encode_texts(texts: Sequence[str]) -> np.ndarray:
+    """
+    Embeddings normalisés (n, 384) float32, via le cache d'embeddings (questions répétées).
+    """
+    return encode_with_cache(get_model(), texts, get_embedding_cache(cache_namespace()))
+
+
+def _options(
+    ef_search: Optional[int],
+    probes: Optional[int],
+    document_ids: Optional[Sequence[int]],
+    path_prefix: Optional[str],
+) -> SearchOptions:
+    return SearchOptions(
+        ef_search=ef_search,
+        probes=probes,
+        document_ids=tuple(int(d) for d in document_ids) if document_ids is not None else None,
+        path_prefix=path_prefix,
+    )
+
+
+def semantic_search(
+    question: str,
+    top_k: int = 3,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    hybrid: Optional[bool] = None,
+    document_ids: Optional[Sequence[int]] = None,
+    path_prefix: Optional[str] = None,
+    rerank: Optional[bool] = None,
+) -> List[SearchResult]:
+    """
+    ef_search (HNSW) / probes (IVFFlat, IVF numpy): compromis rappel / latence pour cette
+    requête uniquement (None = valeur par défaut).
+    hybrid: ajoute la recherche plein texte (termes exacts: amylase, E300...) fusionnée par
+    RRF avec la recherche vectorielle (None = HYBRID_SEARCH, pgvector uniquement).
+    document_ids / path_prefix: restreint la recherche à ces documents (id_document, ou chemin
+    du PDF commençant par path_prefix); le Top-K est calculé après filtrage.
+    rerank: RERANK_CANDIDATES candidats re-classés par le cross-encoder, dans la limite de
+    RERANK_BUDGET_MS (None = RERANK).
+    """
+    with span("embed"):
+        q_vec = encode_texts([question])[0]
     if len(q_vec) != 384:
         raise ValueError(f"Dimension embedding invalide: {len(q_vec)} (attendu 384)")
 
-    vec_literal = _to_pgvector_literal(np.array(q_vec, dtype=np.float32))
-    dsn = get_dsn()
-
-    with psycopg.connect(dsn) as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                SELECT
-                  id_document,
-                  texte_fragment,
-                  1 - (vecteur <=> %s::vector) AS score
-                FROM embeddings
-                ORDER BY vecteur <=> %s::vector
-                LIMIT %s;
-                """,
-                (vec_literal, vec_literal, top_k),
-            )
-            rows = cur.fetchall()
-
-    return [
-        SearchResult(
-            id_document=int(r[0]),
-            texte_fragment=str(r[1]),
-            score=float(r[2]),
+    # Backend choisi par RETRIEVAL_BACKEND (pgvector par défaut, ou numpy en mémoire)
+    options = _options(ef_search, probes, document_ids, path_prefix)
+    q_vec = np.asarray(q_vec, dtype=np.float32)
+    reranked = settings.rerank_enabled if rerank is None else rerank
+    n = rerank_candidates(top_k) if reranked else top_k
+    with span("retrieve"):
+        if settings.hybrid_search if hybrid is None else hybrid:
+            results = get_backend().search_hybrid(q_vec, question, n, options)
+        else:
+            results = get_backend().search(q_vec, n, options)
+    if reranked:
+        return get_reranker().rerank(question, results, top_k)
+    return results
+
+
+# ----------------------------
+# Chemin asynchrone (FastAPI): l'encodage CPU part dans un executor dédié,
+# la requête passe par le pool psycopg asynchrone
+# ----------------------------
+_embed_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_embed_executor() -> ThreadPoolExecutor:
+    global _embed_executor
+    if _embed_executor is None:
+        _embed_executor = ThreadPoolExecutor(max_workers=settings.embed_workers, thread_name_prefix="embed")
+    return _embed_executor
+
+
+async def encode_texts_async(texts: Sequence[str]) -> np.ndarray:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_embed_executor(), encode_texts, list(texts))
+
+
+# Micro-batching des questions concurrentes (un batcher par boucle d'événements, celle de l'API)
+_embed_batcher: Optional[EmbeddingBatcher] = None
+
+
+def get_embed_batcher() -> Optional[EmbeddingBatcher]:
+    """
+    Batcher partagé (None si EMBED_BATCH=0). Doit être appelé dans la boucle qui l'utilise.
+    """
+    global _embed_batcher
+    if not settings.embed_batch_enabled:
+        return None
+    if _embed_batcher is None:
+        _embed_batcher = EmbeddingBatcher(
+            encode_texts,
+            get_embed_executor(),
+            max_batch_size=settings.embed_batch_max_size,
+            max_wait_ms=settings.embed_batch_max_wait_ms,
+            max_inflight=settings.embed_workers,
         )
-        for r in rows
-    ]
\ No newline at end of file
+    return _embed_batcher
+
+
+async def close_embed_batcher() -> None:
+    global _embed_batcher
+    if _embed_batcher is not None:
+        await _embed_batcher.close()
+        _embed_batcher = None
+
+
+async def encode_question_async(question: str) -> np.ndarray:
+    batcher = get_embed_batcher()
+    if batcher is None:
+        return (await encode_texts_async([question]))[0]
+    return await batcher.encode(question)
+
+
+async def semantic_search_async(
+    question: str,
+    top_k: int = 3,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    hybrid: Optional[bool] = None,
+    document_ids: Optional[Sequence[int]] = None,
+    path_prefix: Optional[str] = None,
+    rerank: Optional[bool] = None,
+) -> List[SearchResult]:
+    with span("embed"):  # attente du lot (micro-batching) comprise
+        q_vec = await encode_question_async(question)
+    if len(q_vec) != 384:
+        raise ValueError(f"Dimension embedding invalide: {len(q_vec)} (attendu 384)")
+
+    options = _options(ef_search, probes, document_ids, path_prefix)
+    reranked = settings.rerank_enabled if rerank is None else rerank
+    n = rerank_candidates(top_k) if reranked else top_k
+    with span("retrieve"):
+        if settings.hybrid_search if hybrid is None else hybrid:
+            results = await get_backend().search_hybrid_async(q_vec, question, n, options)
+        else:
+            results = await get_backend().search_async(q_vec, n, options)
+    if reranked:
+        return await get_reranker().rerank_async(question, results, top_k)
+    return results
+
+
+def semantic_search_many(
+    questions: Sequence[str],
+    top_k: int = 3,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    document_ids: Optional[Sequence[int]] = None,
+    path_prefix: Optional[str] = None,
+) -> List[List[SearchResult]]:
+    """
+    Version batch de semantic_search: un seul encode (batch) et une seule recherche
+    (une requête SQL pour pgvector, un produit matriciel pour numpy).
+    Les résultats sont retournés dans l'ordre des questions.
+    """
+    if not questions:
+        return []
+
+    with span("embed"):
+        q_vecs = encode_texts(questions)
+    if q_vecs.shape[1] != 384:
+        raise ValueError(f"Dimension embedding invalide: {q_vecs.shape[1]} (attendu 384)")
+
+    options = _options(ef_search, probes, document_ids, path_prefix)
+    with span("retrieve"):
+        return get_backend().search_many(q_vecs, top_k, options)
@@ -0,0 +1,197 @@
+"""
+Re-classement des candidats de la recherche vectorielle par un cross-encoder CPU (RERANK=1,
+ou rerank=true par requête): RERANK_CANDIDATES candidats récupérés en une requête, scorés
+(question, fragment) en un seul lot, puis Top-K.
+- budget de latence RERANK_BUDGET_MS: au-delà, l'ordre vectoriel est renvoyé; le lot en cours
+  se termine en arrière-plan et ses scores vont dans le cache
+- cache des scores par (question normalisée, id_document, empreinte du fragment): une question
+  répétée ne recalcule que les nouveaux candidats
+"""
+from __future__ import annotations
+
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import replace
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+from answer_cache import fragment_digest, normalize_question
+from config import settings
+from metrics import RERANKS, span
+from retrieval import SearchResult
+
+if TYPE_CHECKING:
+    from sentence_transformers import CrossEncoder
+
+# (question normalisée, id_document, empreinte du fragment)
+ScoreKey = Tuple[str, int, str]
+
+
+class RerankScoreCache:
+    """
+    Scores du cross-encoder, éviction LRU, thread-safe.
+    """
+
+    def __init__(self, max_items: int = settings.rerank_cache_items):
+        self.max_items = max_items
+        self._scores: "OrderedDict[ScoreKey, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(question: str, result: SearchResult) -> ScoreKey:
+        return (normalize_question(question), int(result.id_document), fragment_digest(result.texte_fragment))
+
+    def get_many(self, keys: Sequence[ScoreKey]) -> List[Optional[float]]:
+        with self._lock:
+            scores: List[Optional[float]] = []
+            for key in keys:
+                score = self._scores.get(key)
+                if score is None:
+                    self.misses += 1
+                else:
+                    self._scores.move_to_end(key)
+                    self.hits += 1
+                scores.append(score)
+            return scores
+
+    def put_many(self, items: Sequence[Tuple[ScoreKey, float]]) -> None:
+        with self._lock:
+            for key, score in items:
+                self._scores[key] = score
+                self._scores.move_to_end(key)
+            while len(self._scores) > self.max_items:
+                self._scores.popitem(last=False)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "items": len(self._scores),
+        }
+
+
+class Reranker:
+    def __init__(
+        self,
+        model_name: str = settings.rerank_model,
+        max_length: int = settings.rerank_max_length,
+        budget_ms: float = settings.rerank_budget_ms,
+        cache: Optional[RerankScoreCache] = None,
+    ):
+        self.model_name = model_name
+        self.max_length = max_length
+        self.budget_ms = budget_ms
+        self.cache = cache or RerankScoreCache()
+        self._model: Optional["CrossEncoder"] = None
+        self._model_lock = threading.Lock()
+        # Un lot à la fois: torch utilise déjà plusieurs cœurs par lot
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+
+    def get_model(self) -> "CrossEncoder":
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    # Import paresseux: torch n'est chargé qu'au premier re-classement (ou par warm_up)
+                    from sentence_transformers import CrossEncoder
+
+                    self._model = CrossEncoder(self.model_name, max_length=self.max_length, device="cpu")
+        return self._model
+
+    def model_loaded(self) -> bool:
+        return self._model is not None
+
+    def _score(self, question: str, candidates: Sequence[SearchResult], cached: List[Optional[float]]) -> List[float]:
+        # Exécuté dans le thread "rerank": candidats absents du cache scorés en un seul lot
+        missing = [i for i, s in enumerate(cached) if s is None]
+        pairs = [(question, candidates[i].texte_fragment) for i in missing]
+        predicted = self.get_model().predict(pairs, batch_size=len(pairs), show_progress_bar=False)
+        scores = list(cached)
+        for i, score in zip(missing, predicted):
+            scores[i] = float(score)
+        self.cache.put_many([(self.cache.key(question, candidates[i]), scores[i]) for i in missing])
+        return scores  # type: ignore[return-value]
+
+    def _prepare(
+        self, question: str, candidates: Sequence[SearchResult]
+    ) -> Tuple[List[Optional[float]], Optional[Future]]:
+        cached = self.cache.get_many([self.cache.key(question, c) for c in candidates])
+        if all(s is not None for s in cached):
+            return cached, None
+        return cached, self._executor.submit(self._score, question, list(candidates), cached)
+
+    @staticmethod
+    def _ranked(candidates: Sequence[SearchResult], scores: Sequence[float], top_k: int) -> List[SearchResult]:
+        order = sorted(range(len(candidates)), key=lambda i: scores[i], reverse=True)[:top_k]
+        return [replace(candidates[i], rerank_score=float(scores[i])) for i in order]
+
+    @staticmethod
+    def _fallback(future: Future, candidates: Sequence[SearchResult], top_k: int) -> List[SearchResult]:
+        # Budget dépassé: un lot encore en file est annulé, un lot commencé remplira le cache
+        future.cancel()
+        RERANKS.inc("fallback")
+        return list(candidates[:top_k])
+
+    def rerank(self, question: str, candidates: Sequence[SearchResult], top_k: int) -> List[SearchResult]:
+        """
+        Top-K des candidats (ordre vectoriel) selon le cross-encoder; ordre vectoriel si le
+        budget de latence est dépassé.
+        """
+        if not candidates:
+            return []
+        with span("rerank"):
+            cached, future = self._prepare(question, candidates)
+            if future is None:
+                RERANKS.inc("cached")
+                return self._ranked(candidates, cached, top_k)  # type: ignore[arg-type]
+            try:
+                scores = future.result(timeout=self.budget_ms / 1000)
+            except FutureTimeoutError:
+                return self._fallback(future, candidates, top_k)
+        RERANKS.inc("reranked")
+        return self._ranked(candidates, scores, top_k)
+
+    async def rerank_async(
+        self, question: str, candidates: Sequence[SearchResult], top_k: int
+    ) -> List[SearchResult]:
+        """
+        Version asynchrone de rerank: le lot tourne dans le thread "rerank", la boucle n'est
+        pas bloquée pendant l'attente.
+        """
+        if not candidates:
+            return []
+        with span("rerank"):
+            cached, future = self._prepare(question, candidates)
+            if future is None:
+                RERANKS.inc("cached")
+                return self._ranked(candidates, cached, top_k)  # type: ignore[arg-type]
+            try:
+                # shield: le délai dépassé n'interrompt pas le lot (ses scores vont dans le cache)
+                scores = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), self.budget_ms / 1000)
+            except asyncio.TimeoutError:
+                return self._fallback(future, candidates, top_k)
+        RERANKS.inc("reranked")
+        return self._ranked(candidates, scores, top_k)
+
+
+_reranker: Optional[Reranker] = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker() -> Reranker:
+    global _reranker
+    if _reranker is None:
+        with _reranker_lock:
+            if _reranker is None:
+                _reranker = Reranker()
+    return _reranker
+
+
+def rerank_candidates(top_k: int) -> int:
+    # Candidats récupérés en une requête (au moins top_k)
+    return max(top_k, settings.rerank_candidates)
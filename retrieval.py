@@ -0,0 +1,822 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import shutil
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import psycopg
+
+from config import settings
+from db import get_async_pool, get_connection
+from metrics import record_stage, span
+
+
+@dataclass(frozen=True)
+class SearchResult:
+    id_document: int
+    texte_fragment: str
+    score: float
+    # Score du cross-encoder si les résultats ont été re-classés (reranker.py); score reste la similarité
+    rerank_score: Optional[float] = None
+
+
+@dataclass(frozen=True)
+class SearchOptions:
+    """
+    Réglages par requête (None = valeur par défaut du serveur / du backend).
+    - ef_search: taille de la liste de candidats HNSW (hnsw.ef_search), rappel vs latence
+    - probes: nombre de listes IVF parcourues (ivfflat.probes, ou IVF du backend numpy)
+    - document_ids / path_prefix: ne chercher que dans ces documents (table documents)
+    """
+
+    ef_search: Optional[int] = None
+    probes: Optional[int] = None
+    document_ids: Optional[Tuple[int, ...]] = None
+    path_prefix: Optional[str] = None
+
+    @property
+    def filtered(self) -> bool:
+        return self.document_ids is not None or self.path_prefix is not None
+
+
+DEFAULT_OPTIONS = SearchOptions()
+
+
+def _rows_to_results(rows: Sequence[Sequence]) -> List[SearchResult]:
+    return [
+        SearchResult(
+            id_document=int(r[0]),
+            texte_fragment=str(r[1]),
+            score=float(r[2]),
+        )
+        for r in rows
+    ]
+
+
+class RetrievalBackend(ABC):
+    """
+    Backend de recherche Top-K derrière semantic_search.
+    Les vecteurs reçus sont déjà normalisés (float32, 384-d).
+    """
+
+    name: str = ""
+    _hybrid_warned: bool = False
+
+    @abstractmethod
+    def search(
+        self, q_vec: np.ndarray, top_k: int, options: SearchOptions = DEFAULT_OPTIONS
+    ) -> List[SearchResult]:
+        ...
+
+    @abstractmethod
+    def search_many(
+        self, q_vecs: np.ndarray, top_k: int, options: SearchOptions = DEFAULT_OPTIONS
+    ) -> List[List[SearchResult]]:
+        ...
+
+    async def search_async(
+        self, q_vec: np.ndarray, top_k: int, options: SearchOptions = DEFAULT_OPTIONS
+    ) -> List[SearchResult]:
+        return await asyncio.to_thread(self.search, q_vec, top_k, options)
+
+    def _hybrid_unavailable(self) -> None:
+        # Averti une seule fois par backend (HYBRID_SEARCH=1 le demande à chaque requête)
+        if not self._hybrid_warned:
+            self._hybrid_warned = True
+            print(f"[{self.name} backend] recherche hybride non disponible: recherche vectorielle seule")
+
+    def search_hybrid(
+        self, q_vec: np.ndarray, question: str, top_k: int, options: SearchOptions = DEFAULT_OPTIONS
+    ) -> List[SearchResult]:
+        """
+        Top-K plein texte + vecteurs fusionnés (reciprocal rank fusion). Backend sans index
+        plein texte (numpy): recherche vectorielle seule.
+        """
+        self._hybrid_unavailable()
+        return self.search(q_vec, top_k, options)
+
+    async def search_hybrid_async(
+        self, q_vec: np.ndarray, question: str, top_k: int, options: SearchOptions = DEFAULT_OPTIONS
+    ) -> List[SearchResult]:
+        self._hybrid_unavailable()
+        return await self.search_async(q_vec, top_k, options)
+
+
+# ----------------------------
+# pgvector (PostgreSQL)
+# ----------------------------
+# Modes de stockage/index (VECTOR_STORAGE). Pour halfvec/binary, l'expression de tri des
+# candidats doit être identique à celle de l'index (schema_quantized.sql).
+VECTOR_STORAGES = ("full", "halfvec", "binary")
+_CANDIDATE_ORDER = {
+    "halfvec": "e.vecteur::halfvec(384) <=> ({q})::halfvec(384)",
+    "binary": "binary_quantize(e.vecteur)::bit(384) <~> binary_quantize({q})",
+}
+
+
+# Filtre par document (SearchOptions.document_ids / path_prefix):
+# - index: même index vectoriel + WHERE id_document, avec parcours itératif de l'index
+#   (pgvector >= 0.8) pour ne pas renvoyer moins de top_k lignes après filtrage
+# - exact: peu de lignes concernées => lecture par l'index B-tree id_document puis tri exact
+FILTER_MODES = (None, "index", "exact")
+_FILTERED_CTE = """WITH filtered AS MATERIALIZED (
+  SELECT id_document, texte_fragment, vecteur
+  FROM embeddings
+  WHERE id_document = ANY(%(doc_ids)s::int[])
+)"""
+
+
+def _top_k_subquery(storage: str, q: str, filter_mode: Optional[str] = None) -> str:
+    if filter_mode == "exact":
+        return f"""
+  SELECT
+    e.id_document,
+    e.texte_fragment,
+    1 - (e.vecteur <=> {q}) AS score
+  FROM filtered e
+  ORDER BY e.vecteur <=> {q}
+  LIMIT %(top_k)s"""
+
+    where = "\n    WHERE e.id_document = ANY(%(doc_ids)s::int[])" if filter_mode == "index" else ""
+    if storage == "full" and not where:
+        return f"""
+  SELECT
+    e.id_document,
+    e.texte_fragment,
+    1 - (e.vecteur <=> {q}) AS score
+  FROM embeddings e
+  ORDER BY e.vecteur <=> {q}
+  LIMIT %(top_k)s"""
+
+    # Index compact => %(candidates)s candidats, re-classés avec les vecteurs complets.
+    # Filtre => l'ordre d'un parcours itératif "relaxed" est corrigé par le tri externe.
+    if storage == "full":
+        order, limit = f"e.vecteur <=> {q}", "%(top_k)s"
+    else:
+        order, limit = _CANDIDATE_ORDER[storage].format(q=q), "%(candidates)s"
+    return f"""
+  SELECT
+    c.id_document,
+    c.texte_fragment,
+    1 - (c.vecteur <=> {q}) AS score
+  FROM (
+    SELECT e.id_document, e.texte_fragment, e.vecteur
+    FROM embeddings e{where}
+    ORDER BY {order}
+    LIMIT {limit}
+  ) c
+  ORDER BY c.vecteur <=> {q}
+  LIMIT %(top_k)s"""
+
+
+def top_k_sql(storage: str = "full", filter_mode: Optional[str] = None) -> str:
+    """
+    Requête Top-K (exécutée avec prepare=True => plan préparé une fois par connexion du pool).
+    Le vecteur est un np.ndarray float32 envoyé en binaire (voir vector_codec.py).
+    """
+    cte = _FILTERED_CTE if filter_mode == "exact" else ""
+    return cte + _top_k_subquery(storage, "%(vec)s::vector", filter_mode)
+
+
+def top_k_many_sql(storage: str = "full", filter_mode: Optional[str] = None) -> str:
+    """
+    Top-K pour plusieurs questions en un seul aller-retour: LATERAL sur le tableau des vecteurs.
+    """
+    cte = _FILTERED_CTE if filter_mode == "exact" else ""
+    return f"""{cte}
+SELECT q.ord, r.id_document, r.texte_fragment, r.score
+FROM unnest(%(vecs)s::vector[]) WITH ORDINALITY AS q(vec, ord)
+CROSS JOIN LATERAL ({_top_k_subquery(storage, "q.vec", filter_mode)}
+) r
+ORDER BY q.ord, r.score DESC
+"""
+
+
+def hybrid_sql(storage: str = "full", filter_mode: Optional[str] = None) -> str:
+    """
+    Recherche hybride en un seul aller-retour: %(candidates)s meilleurs candidats vectoriels
+    (index HNSW / compact) et plein texte (index GIN sur texte_tsv, configuration french),
+    fusionnés par RRF: somme de 1 / (%(rrf_k)s + rang). Le score retourné reste le cosinus.
+    """
+    q = "%(vec)s::vector"
+    source, vec_where, lex_filter = "embeddings e", "", ""
+    if filter_mode is not None:
+        lex_filter = "\n      AND e.id_document = ANY(%(doc_ids)s::int[])"
+    if filter_mode == "exact":
+        source, storage = "filtered e", "full"
+    elif filter_mode == "index":
+        vec_where = "\n    WHERE e.id_document = ANY(%(doc_ids)s::int[])"
+    order = f"e.vecteur <=> {q}" if storage == "full" else _CANDIDATE_ORDER[storage].format(q=q)
+    cte = (
+        "WITH filtered AS MATERIALIZED (\n"
+        "  SELECT id, vecteur FROM embeddings WHERE id_document = ANY(%(doc_ids)s::int[])\n"
+        "),\n"
+        if filter_mode == "exact"
+        else "WITH "
+    )
+    return f"""
+{cte}vec AS (
+  SELECT v.id, row_number() OVER (ORDER BY v.dist) AS rank
+  FROM (
+    SELECT e.id, {order} AS dist
+    FROM {source}{vec_where}
+    ORDER BY {order}
+    LIMIT %(candidates)s
+  ) v
+),
+lex AS (
+  SELECT l.id, row_number() OVER (ORDER BY l.rank_cd DESC) AS rank
+  FROM (
+    SELECT e.id, ts_rank_cd(e.texte_tsv, t.query) AS rank_cd
+    FROM embeddings e, websearch_to_tsquery('french', %(question)s) AS t(query)
+    WHERE e.texte_tsv @@ t.query{lex_filter}
+    ORDER BY rank_cd DESC
+    LIMIT %(candidates)s
+  ) l
+),
+fused AS (
+  SELECT r.id, SUM(1.0 / (%(rrf_k)s + r.rank)) AS rrf
+  FROM (SELECT id, rank FROM vec UNION ALL SELECT id, rank FROM lex) r
+  GROUP BY r.id
+)
+SELECT e.id_document, e.texte_fragment, 1 - (e.vecteur <=> {q}) AS score
+FROM fused f
+JOIN embeddings e ON e.id = f.id
+ORDER BY f.rrf DESC, score DESC
+LIMIT %(top_k)s
+"""
+
+
+TOP_K_SQL = top_k_sql("full")
+TOP_K_MANY_SQL = top_k_many_sql("full")
+
+# Réglages de recherche par requête (valables pour la transaction courante uniquement).
+# set_config(..., NULL, ...) n'est pas permis: COALESCE garde la valeur courante.
+KNOBS_SQL = """
+SELECT
+  set_config('hnsw.ef_search', COALESCE(%(ef_search)s, current_setting('hnsw.ef_search', true), '40'), true),
+  set_config('ivfflat.probes', COALESCE(%(probes)s, current_setting('ivfflat.probes', true), '1'), true)
+"""
+
+# Parcours itératif des index (pgvector >= 0.8) pour les recherches filtrées
+ITERATIVE_SCAN_SQL = """
+SELECT
+  set_config('hnsw.iterative_scan', %(mode)s, true),
+  set_config('ivfflat.iterative_scan', %(mode)s, true)
+"""
+
+# Documents retenus par le filtre et nombre de fragments concernés (sélectivité)
+FILTER_DOCUMENTS_SQL = """
+SELECT id_document, n_fragments
+FROM documents
+WHERE (%(doc_ids)s::int[] IS NULL OR id_document = ANY(%(doc_ids)s::int[]))
+  AND (%(path_prefix)s::text IS NULL OR starts_with(path, %(path_prefix)s::text))
+"""
+
+Prelude = List[Tuple[str, dict]]
+
+
+def _filter_params(options: SearchOptions) -> dict:
+    doc_ids = list(options.document_ids) if options.document_ids is not None else None
+    return {"doc_ids": doc_ids, "path_prefix": options.path_prefix}
+
+
+def _plan_filter(rows: Sequence[Sequence], exact_max_rows: int) -> Tuple[str, List[int]]:
+    doc_ids = [int(r[0]) for r in rows]
+    n_rows = sum(int(r[1]) for r in rows)
+    return ("exact" if n_rows <= exact_max_rows else "index"), doc_ids
+
+
+def resolve_filter(conn: psycopg.Connection, options: SearchOptions, exact_max_rows: int) -> Tuple[str, List[int]]:
+    """
+    (mode de filtrage, id_document retenus) d'après la table documents.
+    """
+    rows = conn.execute(FILTER_DOCUMENTS_SQL, _filter_params(options), prepare=True).fetchall()
+    return _plan_filter(rows, exact_max_rows)
+
+
+@contextmanager
+def _connection() -> Iterator[psycopg.Connection]:
+    # Attente d'une connexion du pool (db_acquire), puis requêtes sur cette connexion (db_query)
+    t0 = time.perf_counter()
+    with get_connection() as conn:
+        record_stage("db_acquire", time.perf_counter() - t0)
+        with span("db_query"):
+            yield conn
+
+
+@asynccontextmanager
+async def _connection_async() -> AsyncIterator[psycopg.AsyncConnection]:
+    t0 = time.perf_counter()
+    pool = await get_async_pool()
+    async with pool.connection() as conn:
+        record_stage("db_acquire", time.perf_counter() - t0)
+        with span("db_query"):
+            yield conn
+
+
+class PgVectorBackend(RetrievalBackend):
+    """
+    Top-K dans PostgreSQL. storage=halfvec|binary: recherche sur un index compact puis
+    re-classement de oversample x top_k candidats avec les vecteurs complets.
+    search_hybrid: index vectoriel + index GIN plein texte, fusion RRF dans la même requête.
+    Filtre par document: recherche exacte si au plus filter_exact_max_rows fragments sont
+    concernés, sinon index vectoriel filtré en parcours itératif.
+    """
+
+    name = "pgvector"
+
+    def __init__(
+        self,
+        storage: str = settings.vector_storage,
+        oversample: int = settings.quantized_oversample,
+        hybrid_candidates: int = settings.hybrid_candidates,
+        rrf_k: int = settings.rrf_k,
+        filter_exact_max_rows: int = settings.filter_exact_max_rows,
+        iterative_scan: str = settings.pgvector_iterative_scan,
+    ):
+        if storage not in VECTOR_STORAGES:
+            raise ValueError(f"VECTOR_STORAGE inconnu: {storage} (attendu: {', '.join(VECTOR_STORAGES)})")
+        self.storage = storage
+        self.oversample = max(1, oversample)
+        self.hybrid_candidates = max(1, hybrid_candidates)
+        self.rrf_k = rrf_k
+        self.filter_exact_max_rows = filter_exact_max_rows
+        self.iterative_scan = iterative_scan
+        self._sql = {mode: top_k_sql(storage, mode) for mode in FILTER_MODES}
+        self._sql_many = {mode: top_k_many_sql(storage, mode) for mode in FILTER_MODES}
+        self._sql_hybrid = {mode: hybrid_sql(storage, mode) for mode in FILTER_MODES}
+
+    def _params(self, top_k: int, **params) -> dict:
+        return {"top_k": top_k, "candidates": top_k * self.oversample, **params}
+
+    def _hybrid_params(self, top_k: int, q_vec: np.ndarray, question: str) -> dict:
+        candidates = max(self.hybrid_candidates, top_k)
+        return {"top_k": top_k, "candidates": candidates, "rrf_k": self.rrf_k, "vec": q_vec, "question": question}
+
+    def _knobs(self, top_k: int, options: SearchOptions, candidates: Optional[int] = None) -> Optional[dict]:
+        """
+        Paramètres de session (SET LOCAL) à appliquer avant la requête, ou None.
+        Quand la requête lit plus de candidats que top_k (mode compact, recherche hybride),
+        ef_search couvre au moins ce nombre: sinon l'index HNSW en renverrait moins que demandé.
+        """
+        ef_search = options.ef_search
+        if candidates is None and self.storage != "full":
+            candidates = top_k * self.oversample
+        if candidates is not None:
+            ef_search = max(ef_search or 40, candidates)
+        if ef_search is None and options.probes is None:
+            return None
+        return {
+            "ef_search": str(ef_search) if ef_search is not None else None,
+            "probes": str(options.probes) if options.probes is not None else None,
+        }
+
+    def _prelude(
+        self, top_k: int, options: SearchOptions, filter_mode: Optional[str], candidates: Optional[int] = None
+    ) -> Prelude:
+        prelude: Prelude = []
+        knobs = self._knobs(top_k, options, candidates)
+        if knobs is not None:
+            prelude.append((KNOBS_SQL, knobs))
+        if filter_mode == "index" and self.iterative_scan != "off":
+            prelude.append((ITERATIVE_SCAN_SQL, {"mode": self.iterative_scan}))
+        return prelude
+
+    def _execute(self, conn: psycopg.Connection, sql: str, params: dict, prelude: Prelude, prepare: bool):
+        with conn.cursor() as cur:
+            if not prelude:
+                cur.execute(sql, params, prepare=prepare)
+                return cur.fetchall()
+            # Pipeline: SET LOCAL + requête en un seul aller-retour
+            with conn.pipeline():
+                for pre_sql, pre_params in prelude:
+                    cur.execute(pre_sql, pre_params)
+                cur.execute(sql, params, prepare=prepare)
+            return cur.fetchall()
+
+    async def _execute_async(self, conn: psycopg.AsyncConnection, sql: str, params: dict, prelude: Prelude):
+        async with conn.cursor() as cur:
+            if not prelude:
+                await cur.execute(sql, params, prepare=True)
+            else:
+                async with conn.pipeline():
+                    for pre_sql, pre_params in prelude:
+                        await cur.execute(pre_sql, pre_params)
+                    await cur.execute(sql, params, prepare=True)
+            return await cur.fetchall()
+
+    def _filter(self, conn: psycopg.Connection, options: SearchOptions) -> Tuple[Optional[str], List[int]]:
+        if not options.filtered:
+            return None, []
+        return resolve_filter(conn, options, self.filter_exact_max_rows)
+
+    async def _filter_async(
+        self, conn: psycopg.AsyncConnection, options: SearchOptions
+    ) -> Tuple[Optional[str], List[int]]:
+        if not options.filtered:
+            return None, []
+        cur = await conn.execute(FILTER_DOCUMENTS_SQL, _filter_params(options), prepare=True)
+        return _plan_filter(await cur.fetchall(), self.filter_exact_max_rows)
+
+    def search(
+        self, q_vec: np.ndarray, top_k: int, options: SearchOptions = DEFAULT_OPTIONS
+    ) -> List[SearchResult]:
+        with _connection() as conn:
+            mode, doc_ids = self._filter(conn, options)
+            if mode is not None and not doc_ids:
+                return []
+            params = self._params(top_k, vec=q_vec, doc_ids=doc_ids)
+            rows = self._execute(conn, self._sql[mode], params, self._prelude(top_k, options, mode), True)
+        return _rows_to_results(rows)
+
+    async def search_async(
+        self, q_vec: np.ndarray, top_k: int, options: SearchOptions = DEFAULT_OPTIONS
+    ) -> List[SearchResult]:
+        async with _connection_async() as conn:
+            mode, doc_ids = await self._filter_async(conn, options)
+            if mode is not None and not doc_ids:
+                return []
+            params = self._params(top_k, vec=q_vec, doc_ids=doc_ids)
+            rows = await self._execute_async(conn, self._sql[mode], params, self._prelude(top_k, options, mode))
+        return _rows_to_results(rows)
+
+    def search_hybrid(
+        self, q_vec: np.ndarray, question: str, top_k: int, options: SearchOptions = DEFAULT_OPTIONS
+    ) -> List[SearchResult]:
+        params = self._hybrid_params(top_k, q_vec, question)
+        with _connection() as conn:
+            mode, params["doc_ids"] = self._filter(conn, options)
+            if mode is not None and not params["doc_ids"]:
+                return []
+            prelude = self._prelude(top_k, options, mode, candidates=params["candidates"])
+            rows = self._execute(conn, self._sql_hybrid[mode], params, prelude, True)
+        return _rows_to_results(rows)
+
+    async def search_hybrid_async(
+        self, q_vec: np.ndarray, question: str, top_k: int, options: SearchOptions = DEFAULT_OPTIONS
+    ) -> List[SearchResult]:
+        params = self._hybrid_params(top_k, q_vec, question)
+        async with _connection_async() as conn:
+            mode, params["doc_ids"] = await self._filter_async(conn, options)
+            if mode is not None and not params["doc_ids"]:
+                return []
+            prelude = self._prelude(top_k, options, mode, candidates=params["candidates"])
+            rows = await self._execute_async(conn, self._sql_hybrid[mode], params, prelude)
+        return _rows_to_results(rows)
+
+    def search_many(
+        self, q_vecs: np.ndarray, top_k: int, options: SearchOptions = DEFAULT_OPTIONS
+    ) -> List[List[SearchResult]]:
+        out: List[List[SearchResult]] = [[] for _ in range(len(q_vecs))]
+        with _connection() as conn:
+            mode, doc_ids = self._filter(conn, options)
+            if mode is not None and not doc_ids:
+                return out
+            params = self._params(top_k, vecs=list(q_vecs), doc_ids=doc_ids)
+            rows = self._execute(conn, self._sql_many[mode], params, self._prelude(top_k, options, mode), False)
+
+        for ord_, id_document, texte_fragment, score in rows:
+            out[int(ord_) - 1].append(
+                SearchResult(
+                    id_document=int(id_document),
+                    texte_fragment=str(texte_fragment),
+                    score=float(score),
+                )
+            )
+        return out
+
+
+# ----------------------------
+# NumPy en mémoire (exact + IVF optionnel)
+# ----------------------------
+def _top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices des k meilleurs scores, triés par score décroissant (argpartition: O(n)).
+    """
+    k = min(k, scores.shape[-1])
+    if k <= 0:
+        return np.zeros(scores.shape[:-1] + (0,), dtype=np.int64)
+    part = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    part_scores = np.take_along_axis(scores, part, axis=-1)
+    order = np.argsort(-part_scores, axis=-1, kind="stable")
+    return np.take_along_axis(part, order, axis=-1)
+
+
+class IvfIndex:
+    """
+    Index IVF simple (k-means sphérique): chaque vecteur est rangé dans la liste de son
+    centroïde le plus proche; une requête ne compare que les vecteurs des `probes`
+    listes les plus proches.
+    """
+
+    def __init__(self, vectors: np.ndarray, n_lists: int, n_iter: int = 10, seed: int = 0):
+        n = vectors.shape[0]
+        n_lists = max(1, min(n_lists, n))
+        rng = np.random.default_rng(seed)
+
+        sample = np.asarray(vectors[np.sort(rng.choice(n, size=min(n, n_lists * 64), replace=False))])
+        centroids = sample[rng.choice(sample.shape[0], size=n_lists, replace=False)].copy()
+        for _ in range(n_iter):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            counts = np.bincount(assign, minlength=n_lists)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / np.linalg.norm(sums[filled], axis=1, keepdims=True)
+
+        assign = np.empty(n, dtype=np.int64)
+        for start in range(0, n, 65536):
+            block = np.asarray(vectors[start : start + 65536])
+            assign[start : start + block.shape[0]] = np.argmax(block @ centroids.T, axis=1)
+
+        self.centroids = centroids.astype(np.float32)
+        self.order = np.argsort(assign, kind="stable")
+        self.offsets = np.searchsorted(assign[self.order], np.arange(n_lists + 1))
+
+    def candidates(self, q_vec: np.ndarray, probes: int) -> np.ndarray:
+        lists = _top_k_indices(self.centroids @ q_vec, probes)
+        return np.concatenate([self.order[self.offsets[c] : self.offsets[c + 1]] for c in lists])
+
+
+# (COUNT(*), MAX(id), SUM(id), dernière ingestion en µs): un fragment supprimé puis remplacé
+# change SUM(id), un document ré-ingéré change documents.ingested_at
+Signature = Tuple[int, int, int, int]
+
+_SIGNATURE_SQL = """
+SELECT COUNT(*), COALESCE(MAX(id), 0), COALESCE(SUM(id), 0),
+  (SELECT COALESCE(FLOOR(EXTRACT(EPOCH FROM MAX(ingested_at)) * 1000000), 0) FROM documents)
+FROM embeddings
+"""
+
+
+@dataclass
+class _Snapshot:
+    signature: Signature
+    ids: np.ndarray
+    doc_ids: np.ndarray
+    texts: List[str]
+    vectors: np.ndarray  # (n, 384) float32, memory-mapped
+    ivf: Optional[IvfIndex] = None
+
+
+class NumpyBackend(RetrievalBackend):
+    """
+    Tous les vecteurs de la table embeddings dans une matrice float32 contiguë,
+    memory-mappée depuis un fichier .npy (settings.numpy_index_dir).
+    Top-K = produit scalaire vectorisé (vecteurs normalisés => cosinus) + argpartition.
+    L'instantané est rechargé en arrière-plan quand la signature de la table change
+    (nombre de lignes, MAX(id), SUM(id), dernière ingestion de la table documents).
+    options.probes = listes IVF parcourues (ef_search est sans objet ici); avec un filtre par
+    document, recherche exacte sur les seules lignes retenues.
+    """
+
+    name = "numpy"
+
+    def __init__(
+        self,
+        index_dir: Path = settings.numpy_index_dir,
+        refresh_seconds: float = settings.numpy_refresh_seconds,
+        ivf_lists: int = settings.numpy_ivf_lists,
+        ivf_probes: int = settings.numpy_ivf_probes,
+    ):
+        self.index_dir = index_dir
+        self.refresh_seconds = refresh_seconds
+        self.ivf_lists = ivf_lists
+        self.ivf_probes = ivf_probes
+        self._snapshot: Optional[_Snapshot] = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._refreshing = False
+        self._last_check = 0.0
+
+    # ----------------------------
+    # Instantané
+    # ----------------------------
+    @staticmethod
+    def _db_signature(conn: Optional[psycopg.Connection] = None) -> Signature:
+        if conn is None:
+            with get_connection() as own:
+                return NumpyBackend._db_signature(own)
+        row = conn.execute(_SIGNATURE_SQL).fetchone()
+        return int(row[0]), int(row[1]), int(row[2]), int(row[3])
+
+    def _snapshot_dir(self, signature: Signature) -> Path:
+        return self.index_dir / ("snapshot-" + "-".join(str(v) for v in signature))
+
+    def _export(self) -> Path:
+        """
+        Copie la table embeddings dans un nouveau dossier d'instantané (lecture cohérente).
+        """
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        with get_connection() as conn:
+            conn.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+            signature = self._db_signature(conn)
+            target = self._snapshot_dir(signature)
+            if (target / "meta.json").exists():
+                return target
+
+            tmp = self.index_dir / f".tmp-{time.time_ns()}"
+            tmp.mkdir()
+            vectors = np.lib.format.open_memmap(
+                tmp / "vectors.npy", mode="w+", dtype=np.float32, shape=(signature[0], 384)
+            )
+            ids = np.empty(signature[0], dtype=np.int64)
+            doc_ids = np.empty(signature[0], dtype=np.int64)
+            texts: List[str] = []
+
+            with conn.cursor(name="numpy_backend_export", binary=True) as cur:
+                cur.itersize = 5000
+                cur.execute("SELECT id, id_document, texte_fragment, vecteur FROM embeddings ORDER BY id")
+                for i, (id_, doc_id, text, vec) in enumerate(cur):
+                    ids[i] = id_
+                    doc_ids[i] = doc_id
+                    texts.append(text)
+                    vectors[i] = vec
+
+            vectors.flush()
+            del vectors
+            np.save(tmp / "ids.npy", ids)
+            np.save(tmp / "doc_ids.npy", doc_ids)
+            (tmp / "texts.json").write_text(json.dumps(texts, ensure_ascii=False), encoding="utf-8")
+            meta = {"count": signature[0], "signature": list(signature)}
+            (tmp / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+
+        if target.exists():
+            shutil.rmtree(target, ignore_errors=True)
+        tmp.rename(target)
+        return target
+
+    def _load(self, path: Path) -> _Snapshot:
+        meta = json.loads((path / "meta.json").read_text(encoding="utf-8"))
+        vectors = np.load(path / "vectors.npy", mmap_mode="r")
+        snap = _Snapshot(
+            signature=tuple(int(v) for v in meta["signature"]),  # type: ignore[arg-type]
+            ids=np.load(path / "ids.npy"),
+            doc_ids=np.load(path / "doc_ids.npy"),
+            texts=json.loads((path / "texts.json").read_text(encoding="utf-8")),
+            vectors=vectors,
+        )
+        if self.ivf_lists > 0 and vectors.shape[0] > 0:
+            snap.ivf = IvfIndex(vectors, self.ivf_lists)
+        return snap
+
+    def _cleanup(self, keep: Path) -> None:
+        # Best effort: sous Windows, un fichier encore mappé ne peut pas être supprimé
+        for old in self.index_dir.glob("snapshot-*"):
+            if old != keep:
+                shutil.rmtree(old, ignore_errors=True)
+
+    def refresh(self) -> None:
+        """
+        Recharge l'instantané si la table a changé (sinon ne fait rien).
+        """
+        signature = self._db_signature()
+        if self._snapshot is not None and self._snapshot.signature == signature:
+            return
+        path = self._snapshot_dir(signature)
+        if not (path / "meta.json").exists():
+            path = self._export()
+        snap = self._load(path)
+        with self._lock:
+            self._snapshot = snap
+        self._cleanup(path)
+
+    def load_arrays(self, doc_ids: np.ndarray, texts: List[str], vectors: np.ndarray) -> None:
+        """
+        Instantané construit depuis des tableaux en mémoire (benchmarks hors ligne, sans
+        PostgreSQL); il n'est plus rafraîchi depuis la table embeddings.
+        """
+        n = len(texts)
+        snap = _Snapshot(
+            signature=(n, n, n * (n + 1) // 2, 0),
+            ids=np.arange(1, n + 1, dtype=np.int64),
+            doc_ids=np.asarray(doc_ids, dtype=np.int64),
+            texts=list(texts),
+            vectors=np.ascontiguousarray(vectors, dtype=np.float32),
+        )
+        if self.ivf_lists > 0 and n > 0:
+            snap.ivf = IvfIndex(snap.vectors, self.ivf_lists)
+        with self._lock:
+            self._snapshot = snap
+        self.refresh_seconds = float("inf")
+
+    def _background_refresh(self) -> None:
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"[numpy backend] rafraîchissement impossible: {e}")
+        finally:
+            self._refreshing = False
+
+    def _current(self) -> _Snapshot:
+        if self._snapshot is None:
+            # Premier appel: chargement synchrone (un seul thread construit l'instantané)
+            with self._load_lock:
+                if self._snapshot is None:
+                    self._last_check = time.monotonic()
+                    self.refresh()
+        elif time.monotonic() - self._last_check > self.refresh_seconds:
+            with self._lock:
+                start = not self._refreshing
+                self._refreshing = True
+                self._last_check = time.monotonic()
+            if start:
+                threading.Thread(target=self._background_refresh, name="numpy-refresh", daemon=True).start()
+        assert self._snapshot is not None
+        return self._snapshot
+
+    # ----------------------------
+    # Recherche
+    # ----------------------------
+    def _results(self, snap: _Snapshot, idx: np.ndarray, scores: np.ndarray) -> List[SearchResult]:
+        return [
+            SearchResult(
+                id_document=int(snap.doc_ids[i]),
+                texte_fragment=snap.texts[i],
+                score=float(s),
+            )
+            for i, s in zip(idx, scores)
+        ]
+
+    @staticmethod
+    def _filtered_rows(snap: _Snapshot, options: SearchOptions) -> np.ndarray:
+        """
+        Lignes de l'instantané appartenant aux documents retenus par le filtre (recherche exacte).
+        """
+        with get_connection() as conn:
+            _, doc_ids = resolve_filter(conn, options, exact_max_rows=0)
+        return np.flatnonzero(np.isin(snap.doc_ids, np.asarray(doc_ids, dtype=np.int64)))
+
+    def search(
+        self, q_vec: np.ndarray, top_k: int, options: SearchOptions = DEFAULT_OPTIONS
+    ) -> List[SearchResult]:
+        snap = self._current()
+        q_vec = np.asarray(q_vec, dtype=np.float32)
+        if options.filtered:
+            rows = self._filtered_rows(snap, options)
+            scores = np.asarray(snap.vectors[rows]) @ q_vec
+            best = _top_k_indices(scores, top_k)
+            return self._results(snap, rows[best], scores[best])
+
+        if snap.ivf is not None:
+            cand = snap.ivf.candidates(q_vec, options.probes or self.ivf_probes)
+            scores = np.asarray(snap.vectors[cand]) @ q_vec
+            best = _top_k_indices(scores, top_k)
+            return self._results(snap, cand[best], scores[best])
+
+        scores = snap.vectors @ q_vec
+        best = _top_k_indices(scores, top_k)
+        return self._results(snap, best, scores[best])
+
+    def search_many(
+        self, q_vecs: np.ndarray, top_k: int, options: SearchOptions = DEFAULT_OPTIONS
+    ) -> List[List[SearchResult]]:
+        snap = self._current()
+        q_vecs = np.asarray(q_vecs, dtype=np.float32)
+        if options.filtered:
+            rows = self._filtered_rows(snap, options)
+            scores = q_vecs @ np.asarray(snap.vectors[rows]).T
+            best = _top_k_indices(scores, top_k)
+            best_scores = np.take_along_axis(scores, best, axis=1)
+            return [self._results(snap, rows[b], s) for b, s in zip(best, best_scores)]
+
+        if snap.ivf is not None:
+            return [self.search(q, top_k, options) for q in q_vecs]
+
+        scores = q_vecs @ snap.vectors.T  # (n_questions, n_fragments)
+        best = _top_k_indices(scores, top_k)
+        best_scores = np.take_along_axis(scores, best, axis=1)
+        return [self._results(snap, b, s) for b, s in zip(best, best_scores)]
+
+
+_backend: Optional[RetrievalBackend] = None
+_backend_lock = threading.Lock()
+
+BACKENDS = {
+    PgVectorBackend.name: PgVectorBackend,
+    NumpyBackend.name: NumpyBackend,
+}
+
+
+def get_backend() -> RetrievalBackend:
+    """
+    Backend choisi par RETRIEVAL_BACKEND (pgvector | numpy), instancié une fois.
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                name = settings.retrieval_backend
+                if name not in BACKENDS:
+                    raise ValueError(f"RETRIEVAL_BACKEND inconnu: {name} (attendu: {', '.join(BACKENDS)})")
+                _backend = BACKENDS[name]()
+    return _backend
@@ -7,7 +7,42 @@ CREATE TABLE IF NOT EXISTS embeddings (
   vecteur VECTOR(384) NOT NULL
 );
 
--- Index recommandé (rapide) si supporté par votre version pgvector
-CREATE INDEX IF NOT EXISTS embeddings_vecteur_hnsw
+-- Un document source (PDF) par ligne: sert à la ré-ingestion incrémentale
+-- (id_document stable, seuls les fichiers nouveaux/modifiés sont ré-encodés)
+CREATE TABLE IF NOT EXISTS documents (
+  id_document SERIAL PRIMARY KEY,
+  path TEXT NOT NULL UNIQUE,
+  sha256 CHAR(64) NOT NULL,
+  mtime DOUBLE PRECISION NOT NULL,
+  size BIGINT NOT NULL,
+  chunk_size INT NOT NULL,
+  chunk_overlap INT NOT NULL,
+  model_name TEXT NOT NULL,
+  n_fragments INT NOT NULL DEFAULT 0,
+  ingested_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- Chunker utilisé (chars: chunk_size/chunk_overlap en caractères, structure: en tokens);
+-- changer de chunker déclenche la ré-ingestion des documents
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS chunker TEXT NOT NULL DEFAULT 'chars';
+
+-- Recherche plein texte (recherche hybride): tsvector français calculé par PostgreSQL,
+-- y compris pour les lignes chargées par COPY
+ALTER TABLE embeddings
+ADD COLUMN IF NOT EXISTS texte_tsv TSVECTOR
+GENERATED ALWAYS AS (to_tsvector('french', texte_fragment)) STORED;
+
+CREATE INDEX IF NOT EXISTS embeddings_texte_tsv_gin
 ON embeddings
-USING hnsw (vecteur vector_cosine_ops);
\ No newline at end of file
+USING gin (texte_tsv);
+
+-- Suppression / remplacement des fragments d'un document
+CREATE INDEX IF NOT EXISTS embeddings_id_document
+ON embeddings (id_document);
+
+-- Index vectoriel: ajouté par ingest.py selon VECTOR_INDEX_METHOD (hnsw par défaut, avec
+-- HNSW_M / HNSW_EF_CONSTRUCTION) ou IVFFLAT_LISTS; reconstruction sans blocage: vector_index.py.
+-- Équivalent des valeurs par défaut:
+-- CREATE INDEX IF NOT EXISTS embeddings_vecteur_hnsw
+-- ON embeddings
+-- USING hnsw (vecteur vector_cosine_ops) WITH (m = 16, ef_construction = 64);
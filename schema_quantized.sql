@@ -0,0 +1,13 @@
+-- Index compacts optionnels (VECTOR_STORAGE=halfvec | binary), pgvector >= 0.7.
+-- Les vecteurs complets restent dans embeddings.vecteur: ils servent au re-ranking
+-- des candidats sur-échantillonnés.
+
+-- float16: index ~2x plus petit, rappel quasi identique
+CREATE INDEX IF NOT EXISTS embeddings_vecteur_halfvec_hnsw
+ON embeddings
+USING hnsw ((vecteur::halfvec(384)) halfvec_cosine_ops);
+
+-- Quantification binaire (1 bit / dimension): index ~32x plus petit, re-ranking indispensable
+CREATE INDEX IF NOT EXISTS embeddings_vecteur_bq_hnsw
+ON embeddings
+USING hnsw ((binary_quantize(vecteur)::bit(384)) bit_hamming_ops);
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from config import settings
+
+# Composants attendus avant de déclarer le service prêt (GET /ready)
+COMPONENTS = ("db_pool", "model", "ollama")
+
+
+class Readiness:
+    """
+    État de démarrage partagé: composants prêts, durée de chaque phase (ms), dernière erreur.
+    /health reste une simple sonde de vie; /ready ne passe à 200 qu'une fois tous les
+    composants requis prêts.
+    """
+
+    def __init__(self, required: tuple = COMPONENTS):
+        self.required = required
+        self.t_start = time.perf_counter()
+        self.ready_at_ms: Optional[float] = None
+        self.components: Dict[str, bool] = {name: False for name in required}
+        self.phases_ms: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - t0) * 1000)
+
+    def record(self, name: str, ms: float) -> None:
+        with self._lock:
+            self.phases_ms[name] = ms
+        print(f"[STARTUP] {name}: {ms:.0f} ms")
+
+    def mark(self, component: str, ok: bool = True, error: Optional[str] = None) -> None:
+        with self._lock:
+            if component in self.components:
+                self.components[component] = ok
+            if error:
+                self.errors[component] = error
+            else:
+                self.errors.pop(component, None)
+            if self.ready_at_ms is None and all(self.components.values()):
+                self.ready_at_ms = (time.perf_counter() - self.t_start) * 1000
+                print(f"[STARTUP] prêt en {self.ready_at_ms:.0f} ms")
+
+    @property
+    def ready(self) -> bool:
+        return all(self.components.values())
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "ready": all(self.components.values()),
+                "components": dict(self.components),
+                "phases_ms": dict(self.phases_ms),
+                "ready_after_ms": self.ready_at_ms,
+                "errors": dict(self.errors),
+            }
+
+
+def _required() -> tuple:
+    return COMPONENTS if settings.ready_requires_ollama else tuple(c for c in COMPONENTS if c != "ollama")
+
+
+readiness = Readiness(_required())
+
+
+async def wait_for_db_async(state: Readiness = readiness) -> None:
+    """
+    Tâche de fond: SELECT 1 sur le pool asynchrone. Le pool s'ouvre sans attendre de
+    connexion: PostgreSQL arrêté ou DSN invalide laissent db_pool non prêt (avec l'erreur)
+    et un nouvel essai a lieu toutes les READY_RETRY_SECONDS.
+    """
+    from db import get_async_pool
+
+    t0 = time.perf_counter()
+    while True:
+        try:
+            pool = await get_async_pool()
+            async with pool.connection() as conn:
+                await conn.execute("SELECT 1")
+            state.record("db_pool", (time.perf_counter() - t0) * 1000)
+            state.mark("db_pool")
+            return
+        except Exception as e:
+            state.mark("db_pool", ok=False, error=f"{type(e).__name__}: {e}")
+        await asyncio.sleep(settings.ready_retry_seconds)
+
+
+async def warm_up_async(state: Readiness = readiness) -> None:
+    """
+    Tâche de fond lancée au démarrage de l'API: chargement + encodage à blanc du modèle
+    (dans un thread, la boucle d'événements reste disponible pour /health), puis attente
+    d'Ollama (nouvel essai toutes les READY_RETRY_SECONDS).
+    """
+    # Imports différés: torch n'est chargé que par cette tâche, pas à l'import de l'API
+    from ollama_client import ollama_ping_async
+    from rag_search import warm_up
+
+    if settings.warmup_on_startup:
+        try:
+            timings = await asyncio.to_thread(warm_up)
+            for name, ms in timings.items():
+                state.record(name, ms)
+            state.mark("model")
+        except Exception as e:
+            state.mark("model", ok=False, error=f"{type(e).__name__}: {e}")
+    else:
+        state.mark("model")  # chargement au premier appel
+
+    if "ollama" not in state.required:
+        return
+    t0 = time.perf_counter()
+    while True:
+        try:
+            await ollama_ping_async()
+            state.record("ollama", (time.perf_counter() - t0) * 1000)
+            state.mark("ollama")
+            return
+        except Exception as e:
+            state.mark("ollama", ok=False, error=f"{type(e).__name__}: {e}")
+        await asyncio.sleep(settings.ready_retry_seconds)
@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("dotenv")
+
+from answer_cache import AnswerCache  # noqa: E402
+
+FRAGMENTS = ["fragment un", "fragment deux"]
+
+
+def _get(cache, question, fragments=FRAGMENTS):
+    return cache.get("phi3:mini", "v1", 900, question, fragments)
+
+
+def _put(cache, question, answer, fragments=FRAGMENTS):
+    cache.put("phi3:mini", "v1", 900, question, fragments, answer)
+
+
+def _unit(*values):
+    v = np.asarray(values, dtype=np.float32)
+    return v / np.linalg.norm(v)
+
+
+def _fake_embed(cache, vectors):
+    async def embed_async(question):
+        return vectors[question]
+
+    cache._embed = lambda question: vectors[question]
+    cache._embed_async = embed_async
+
+
+def test_exact_hit_normalizes_question():
+    cache = AnswerCache(max_items=10, ttl_seconds=60, semantic_threshold=0)
+    _put(cache, "Quel est le rôle de l'E300 ?", "réponse")
+    assert _get(cache, "  quel est le RÔLE de l'e300 ? ") == "réponse"
+    assert _get(cache, "Quel est le rôle de l'E300 ?", fragments=["autre fragment"]) is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_ttl_expiry():
+    cache = AnswerCache(max_items=10, ttl_seconds=0, semantic_threshold=0)
+    _put(cache, "question", "réponse")
+    assert _get(cache, "question") is None
+    assert cache.stats()["items"] == 0
+
+
+def test_lru_eviction():
+    cache = AnswerCache(max_items=2, ttl_seconds=60, semantic_threshold=0)
+    _put(cache, "a", "A")
+    _put(cache, "b", "B")
+    assert _get(cache, "a") == "A"  # "a" redevient la plus récente
+    _put(cache, "c", "C")
+    assert _get(cache, "b") is None
+    assert _get(cache, "a") == "A"
+    assert _get(cache, "c") == "C"
+
+
+def test_empty_answer_not_stored():
+    cache = AnswerCache(max_items=10, ttl_seconds=60, semantic_threshold=0)
+    _put(cache, "question", "")
+    assert cache.stats()["items"] == 0
+
+
+def test_semantic_hit_same_fragments_only():
+    cache = AnswerCache(max_items=10, ttl_seconds=60, semantic_threshold=0.95)
+    _fake_embed(cache, {
+        "rôle de l'E300": _unit(1, 0, 0),
+        "à quoi sert l'E300": _unit(1, 0.1, 0),
+        "dosage du sel": _unit(0, 1, 0),
+    })
+    _put(cache, "rôle de l'E300", "oxydant")
+    assert _get(cache, "à quoi sert l'E300") == "oxydant"
+    assert _get(cache, "dosage du sel") is None
+    assert _get(cache, "à quoi sert l'E300", fragments=["autre fragment"]) is None
+    assert cache.stats()["semantic_hits"] == 1
+
+
+def test_async_lookup_uses_async_embedding():
+    cache = AnswerCache(max_items=10, ttl_seconds=60, semantic_threshold=0.95)
+    _fake_embed(cache, {"question": _unit(0, 0, 1), "question proche": _unit(0, 0.05, 1)})
+    # Le chemin asynchrone ne doit jamais encoder de façon synchrone
+    calls = []
+    cache._embed = lambda question: calls.append(question)
+
+    async def scenario():
+        await cache.put_async("phi3:mini", "v1", 900, "question", FRAGMENTS, "réponse")
+        return await cache.get_async("phi3:mini", "v1", 900, "question proche", FRAGMENTS)
+
+    assert asyncio.run(scenario()) == "réponse"
+    assert calls == []
@@ -0,0 +1,111 @@
+import re
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("dotenv")
+
+from context_packer import _merge, allocate_budget, pack_contexts  # noqa: E402
+
+
+class WordTokenizer:
+    """
+    Un token par mot (suffisant pour vérifier les comptes et les coupes, sans transformers).
+    """
+
+    def __call__(self, texts, add_special_tokens=False, return_offsets_mapping=False, verbose=False):
+        if isinstance(texts, str):
+            spans = [m.span() for m in re.finditer(r"\S+", texts)]
+            return {"input_ids": list(range(len(spans))), "offset_mapping": spans}
+        return {"input_ids": [t.split() for t in texts]}
+
+
+TOK = WordTokenizer()
+
+LONG = " ".join(f"mot{i}" for i in range(40))
+
+
+def _ctx(doc, score, text):
+    return {"id_document": doc, "score": score, "texte_fragment": text}
+
+
+def test_merge_overlap_both_directions():
+    a = "A" * 50 + "recouvrement commun de plus de quarante caracteres"
+    b = "recouvrement commun de plus de quarante caracteres" + "B" * 50
+    assert _merge(a, b) == "A" * 50 + "recouvrement commun de plus de quarante caracteres" + "B" * 50
+    assert _merge(b, a) == _merge(a, b)
+    assert _merge("x" * 60, "y" * 60) is None
+    assert _merge("abc def ghi", "def") == "abc def ghi"
+
+
+def test_pack_merges_same_document_and_keeps_original_ranks():
+    head = "debut du document sur la farine de ble " * 2
+    overlap = "les enzymes amylase et xylanase ameliorent la pate. "
+    tail = "fin du document sur la cuisson au four " * 2
+    contexts = [
+        _ctx(1, 0.9, head + overlap),
+        _ctx(2, 0.8, "document different sans lien avec les autres sources du tout"),
+        _ctx(1, 0.7, overlap + tail),
+    ]
+    packed, stats = pack_contexts(contexts, token_budget=1000, min_tokens=1, tokenizer=TOK)
+    assert [c["sources"] for c in packed] == [[1, 3], [2]]
+    assert packed[0]["score"] == 0.9
+    assert packed[0]["texte_fragment"].count("amylase") == 1
+    assert stats["fragments_in"] == 3
+    assert stats["fragments_out"] == 2
+    assert stats["merged"] == 1
+    assert stats["context_tokens_out"] < stats["context_tokens_in"]
+
+
+def test_pack_ranks_skip_empty_fragments_and_dedupe_lines():
+    line = "ligne repetee dans deux documents differents du corpus"
+    contexts = [
+        _ctx(1, 0.9, "premier\n" + line),
+        _ctx(2, 0.8, "   "),
+        _ctx(3, 0.7, line + "\ntroisieme"),
+    ]
+    packed, stats = pack_contexts(contexts, token_budget=1000, min_tokens=1, tokenizer=TOK)
+    # Rang d'origine (3) et non position dans la liste filtrée (2)
+    assert [c["sources"] for c in packed] == [[1], [3]]
+    assert packed[1]["texte_fragment"] == "troisieme"
+    assert stats["duplicate_lines"] == 1
+
+
+def test_pack_truncates_to_budget():
+    contexts = [_ctx(1, 0.9, LONG), _ctx(2, 0.9, LONG.replace("mot", "terme"))]
+    packed, stats = pack_contexts(contexts, token_budget=20, min_tokens=1, tokenizer=TOK)
+    assert stats["context_tokens_out"] <= 20 + len(packed)  # " ..." ajouté par source coupée
+    assert all(c["texte_fragment"].endswith(" ...") for c in packed)
+
+
+def test_pack_tokens_in_counts_char_truncated_fragments():
+    _, stats = pack_contexts([_ctx(1, 0.9, LONG)], token_budget=1000, min_tokens=1, tokenizer=TOK,
+                             max_chars_per_context=20)
+    assert stats["context_tokens_in"] == len(LONG[:20].split()) + 1
+
+
+def test_allocate_budget_gives_needs_when_budget_suffices():
+    assert allocate_budget([0.9, 0.5], [10, 20], budget=100, min_tokens=5) == [10, 20]
+
+
+def test_allocate_budget_water_filling():
+    # La source courte laisse le reste de sa part à la longue
+    alloc = allocate_budget([0.5, 0.5], [10, 200], budget=100, min_tokens=5)
+    assert alloc == [10, 90]
+
+
+def test_allocate_budget_proportional_to_score():
+    alloc = allocate_budget([0.75, 0.25], [1000, 1000], budget=100, min_tokens=5)
+    assert alloc[0] > alloc[1] > 0
+    assert sum(alloc) <= 100
+
+
+def test_allocate_budget_drops_small_shares_but_keeps_best():
+    alloc = allocate_budget([0.9, 0.1], [1000, 1000], budget=40, min_tokens=32)
+    assert alloc[1] == 0
+    assert alloc[0] == pytest.approx(40, abs=1)  # parts arrondies à l'entier inférieur
+    assert allocate_budget([0.9], [1000], budget=10, min_tokens=32)[0] == pytest.approx(10, abs=1)
+
+
+def test_allocate_budget_skips_empty_sources():
+    assert allocate_budget([0.9, 0.8], [0, 50], budget=100, min_tokens=5) == [0, 50]
@@ -0,0 +1,113 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("dotenv")
+
+from embed_batcher import EmbeddingBatcher  # noqa: E402
+
+
+class RecordingEncoder:
+    def __init__(self, fail: bool = False):
+        self.batches = []
+        self.fail = fail
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, texts):
+        self.release.wait(5)
+        self.batches.append(list(texts))
+        if self.fail:
+            raise RuntimeError("encodage impossible")
+        return np.array([[float(len(t))] for t in texts], dtype=np.float32)
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_concurrent_requests_share_one_batch():
+    encoder = RecordingEncoder()
+
+    async def scenario():
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            batcher = EmbeddingBatcher(encoder, executor, max_batch_size=32, max_wait_ms=50)
+            vecs = await asyncio.gather(*(batcher.encode("x" * n) for n in range(1, 6)))
+            await batcher.close()
+            return vecs, batcher.stats()
+
+    vecs, stats = _run(scenario())
+    assert [float(v[0]) for v in vecs] == [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert len(encoder.batches) == 1
+    assert stats["batch_size"]["count"] == 1
+
+
+def test_batch_closed_at_max_size():
+    encoder = RecordingEncoder()
+
+    async def scenario():
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            batcher = EmbeddingBatcher(encoder, executor, max_batch_size=2, max_wait_ms=50)
+            await asyncio.gather(*(batcher.encode(str(i)) for i in range(5)))
+            await batcher.close()
+
+    _run(scenario())
+    assert [len(b) for b in encoder.batches] == [2, 2, 1]
+
+
+def test_encode_error_reaches_every_caller():
+    encoder = RecordingEncoder(fail=True)
+
+    async def scenario():
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            batcher = EmbeddingBatcher(encoder, executor, max_wait_ms=20)
+            results = await asyncio.gather(batcher.encode("a"), batcher.encode("b"), return_exceptions=True)
+            await batcher.close()
+            return results
+
+    results = _run(scenario())
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+def test_close_waits_for_inflight_batch():
+    encoder = RecordingEncoder()
+    encoder.release.clear()
+
+    async def scenario():
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            batcher = EmbeddingBatcher(encoder, executor, max_wait_ms=0)
+            pending = asyncio.ensure_future(batcher.encode("abc"))
+            while not batcher._inflight:
+                await asyncio.sleep(0.001)
+            closing = asyncio.ensure_future(batcher.close())
+            await asyncio.sleep(0.02)
+            assert not closing.done()
+            encoder.release.set()
+            await closing
+            assert not batcher._inflight
+            return await pending
+
+    assert float(_run(scenario())[0]) == 3.0
+
+
+def test_close_cancels_batch_being_collected():
+    encoder = RecordingEncoder()
+
+    async def scenario():
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            batcher = EmbeddingBatcher(encoder, executor, max_wait_ms=10_000)
+            pending = asyncio.ensure_future(batcher.encode("abc"))
+            # Demande retirée de la file par _collect, qui attend la suite du lot
+            while not batcher._collecting:
+                await asyncio.sleep(0.001)
+            assert batcher._queue.empty()
+            await batcher.close()
+            await asyncio.wait_for(asyncio.wait([pending]), 1)
+            return pending
+
+    pending = _run(scenario())
+    assert pending.cancelled()
+    assert encoder.batches == []
@@ -0,0 +1,39 @@
+import pytest
+
+fitz = pytest.importorskip("fitz")
+pytest.importorskip("numpy")
+pytest.importorskip("psycopg_pool")
+pytest.importorskip("dotenv")
+
+from ingest import iter_chunked_pdfs, iter_page_tasks  # noqa: E402
+
+
+def _pdf(path, n_pages):
+    doc = fitz.open()
+    for i in range(n_pages):
+        doc.new_page().insert_text((72, 72), f"page numero {i}")
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def test_page_tasks_bounded_and_flagged(tmp_path):
+    big = _pdf(tmp_path / "big.pdf", 7)
+    small = _pdf(tmp_path / "small.pdf", 2)
+    tasks = [(p.name, (r.start, r.stop), first, last) for p, r, first, last in iter_page_tasks([big, small], 3)]
+    assert tasks == [
+        ("big.pdf", (0, 3), True, False),
+        ("big.pdf", (3, 6), False, False),
+        ("big.pdf", (6, 7), False, True),
+        ("small.pdf", (0, 2), True, True),
+    ]
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_chunked_parts_keep_page_order(tmp_path, workers):
+    big = _pdf(tmp_path / "big.pdf", 5)
+    parts = list(iter_chunked_pdfs([big], workers=workers, max_pending=2, pages_per_task=2))
+    assert [(first, last) for _, _, _, first, last in parts] == [(True, False), (False, False), (False, True)]
+    text = "\n".join(c for _, chunks, _, _, _ in parts for c in chunks)
+    assert [f"page numero {i}" in text for i in range(5)] == [True] * 5
+    assert text.index("page numero 1") < text.index("page numero 2") < text.index("page numero 4")
@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+pytest.importorskip("numpy")
+pytest.importorskip("psycopg_pool")
+pytest.importorskip("dotenv")
+
+import ollama_client  # noqa: E402
+from ollama_pool import get_ollama_pool  # noqa: E402
+
+
+async def _hung_server():
+    # Accepte la connexion, lit la requête et ne répond jamais (instance Ollama bloquée)
+    async def handle(reader, writer):
+        await reader.read(65536)
+        await asyncio.sleep(3600)
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    return server, f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+
+
+def test_hung_async_call_opens_breaker():
+    async def scenario():
+        server, url = await _hung_server()
+        pool = get_ollama_pool(url)
+        pool.failure_threshold = 1
+        try:
+            # Même délai global que backend/api.py (_fill_phrase)
+            with pytest.raises(httpx.ReadTimeout):
+                await asyncio.wait_for(
+                    ollama_client.ollama_one_sentence_answer_for_result_async(
+                        "question", "fragment", base_url=url, timeout=0.2, use_cache=False
+                    ),
+                    timeout=ollama_client.llm_deadline(0.2),
+                )
+        finally:
+            await ollama_client.close_async_client()
+            server.close()
+        return pool.stats()[0]
+
+    stats = asyncio.run(scenario())
+    assert stats["state"] == "open"
+    assert stats["errors"] == 1
+    assert stats["outstanding"] == 0
+
+
+def test_deadline_exceeds_http_timeout():
+    assert ollama_client.llm_deadline(60) > 60 + ollama_client.settings.ollama_connect_timeout
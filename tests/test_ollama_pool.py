@@ -0,0 +1,107 @@
+import time
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+pytest.importorskip("dotenv")
+
+from ollama_pool import OllamaPool, OllamaUnavailable, is_connect_error, is_endpoint_failure  # noqa: E402
+
+REQUEST = httpx.Request("POST", "http://a/api/generate")
+
+
+def _status_error(code: int) -> httpx.HTTPStatusError:
+    return httpx.HTTPStatusError("erreur", request=REQUEST, response=httpx.Response(code, request=REQUEST))
+
+
+def _fail(pool: OllamaPool, exc: BaseException, exclude=()) -> None:
+    with pytest.raises(type(exc)):
+        with pool.lease(exclude=exclude):
+            raise exc
+
+
+def test_error_classification():
+    assert is_connect_error(httpx.ConnectError("refus"))
+    assert is_connect_error(httpx.ConnectTimeout("délai"))
+    assert not is_connect_error(httpx.ReadTimeout("délai"))
+    assert is_endpoint_failure(httpx.ReadTimeout("délai"))
+    assert is_endpoint_failure(_status_error(503))
+    assert not is_endpoint_failure(_status_error(404))
+    assert not is_endpoint_failure(ValueError("réponse invalide"))
+
+
+def test_least_outstanding_routing():
+    pool = OllamaPool(["http://a", "http://b"], max_concurrency=4)
+    with pool.lease() as first:
+        with pool.lease() as second:
+            assert second is not first
+            with pool.lease() as third:
+                assert third in (first, second)
+    assert [e.outstanding for e in pool.endpoints] == [0, 0]
+
+
+def test_exclude_and_failover_limit():
+    pool = OllamaPool(["http://a", "http://b"])
+    with pool.lease() as first:
+        pass
+    with pool.lease(exclude=[first]) as second:
+        assert second is not first
+    assert pool.can_failover([first])
+    assert not pool.can_failover([first, second])
+    with pytest.raises(OllamaUnavailable):
+        pool._pick(exclude=[first, second])
+
+
+def test_breaker_opens_after_consecutive_failures():
+    pool = OllamaPool(["http://a"], failure_threshold=2, cooldown=60)
+    ep = pool.endpoints[0]
+    _fail(pool, httpx.ConnectError("refus"))
+    assert ep.state(time.monotonic()) == "closed"
+    _fail(pool, _status_error(500))
+    assert ep.state(time.monotonic()) == "open"
+    with pytest.raises(OllamaUnavailable):
+        with pool.lease():
+            pass
+
+
+def test_client_errors_do_not_open_breaker():
+    pool = OllamaPool(["http://a"], failure_threshold=1, cooldown=60)
+    _fail(pool, _status_error(404))
+    assert pool.endpoints[0].state(time.monotonic()) == "closed"
+    assert pool.endpoints[0].errors == 0
+
+
+def test_success_resets_failure_count():
+    pool = OllamaPool(["http://a"], failure_threshold=2, cooldown=60)
+    _fail(pool, httpx.ReadTimeout("délai"))
+    with pool.lease():
+        pass
+    _fail(pool, httpx.ReadTimeout("délai"))
+    assert pool.endpoints[0].state(time.monotonic()) == "closed"
+
+
+def test_half_open_single_trial_then_close():
+    pool = OllamaPool(["http://a", "http://b"], failure_threshold=1, cooldown=0.05)
+    a = pool.endpoints[0]
+    _fail(pool, httpx.ConnectError("refus"), exclude=[pool.endpoints[1]])
+    assert a.state(time.monotonic()) == "open"
+    with pool.lease() as ep:
+        assert ep is not a  # écartée pendant le délai
+    time.sleep(0.06)
+    assert a.state(time.monotonic()) == "half_open"
+    with pool.lease() as trial:
+        assert trial is a  # l'appel suivant sert d'essai
+        with pool.lease() as other:
+            assert other is not a  # un seul essai à la fois
+    assert a.state(time.monotonic()) == "closed"
+
+
+def test_failed_trial_reopens_breaker():
+    pool = OllamaPool(["http://a"], failure_threshold=3, cooldown=0.05)
+    a = pool.endpoints[0]
+    for _ in range(3):
+        _fail(pool, httpx.ConnectError("refus"))
+    time.sleep(0.06)
+    _fail(pool, httpx.ConnectError("refus"))
+    assert a.state(time.monotonic()) == "open"
+    assert not a.trial_inflight
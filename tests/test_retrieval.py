@@ -0,0 +1,35 @@
+import asyncio
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("psycopg_pool")
+pytest.importorskip("dotenv")
+
+from retrieval import NumpyBackend  # noqa: E402
+
+
+def _backend(tmp_path):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((20, 384)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    backend = NumpyBackend(index_dir=tmp_path, ivf_lists=0)
+    backend.load_arrays(np.arange(20) % 4, [f"fragment {i}" for i in range(20)], vectors)
+    return backend, vectors
+
+
+def test_numpy_top_k(tmp_path):
+    backend, vectors = _backend(tmp_path)
+    results = backend.search(vectors[7], 3)
+    assert results[0].texte_fragment == "fragment 7"
+    assert results[0].score == pytest.approx(1.0, abs=1e-5)
+    assert len(results) == 3
+
+
+def test_numpy_hybrid_falls_back_to_vector_search(tmp_path, capsys):
+    backend, vectors = _backend(tmp_path)
+    expected = backend.search(vectors[3], 5)
+    assert backend.search_hybrid(vectors[3], "amylase E300", 5) == expected
+    assert asyncio.run(backend.search_hybrid_async(vectors[3], "amylase E300", 5)) == expected
+    # Avertissement journalisé une seule fois
+    assert capsys.readouterr().out.count("recherche hybride non disponible") == 1
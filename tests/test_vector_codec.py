@@ -0,0 +1,30 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("psycopg")
+
+from vector_codec import decode_vector_binary, encode_vector_binary, to_pgvector_literal  # noqa: E402
+
+
+def test_binary_round_trip():
+    vec = np.random.default_rng(0).standard_normal(384).astype(np.float32)
+    data = encode_vector_binary(vec)
+    assert len(data) == 4 + 384 * 4
+    out = decode_vector_binary(data)
+    assert out.dtype == np.float32
+    np.testing.assert_array_equal(out, vec)
+
+
+def test_binary_header_is_big_endian_dim():
+    data = encode_vector_binary(np.array([1.0, -2.5, 0.0], dtype=np.float32))
+    assert data[:4] == b"\x00\x03\x00\x00"
+    np.testing.assert_array_equal(decode_vector_binary(memoryview(data)), [1.0, -2.5, 0.0])
+
+
+def test_binary_rejects_2d():
+    with pytest.raises(ValueError):
+        encode_vector_binary(np.zeros((2, 3), dtype=np.float32))
+
+
+def test_text_literal():
+    assert to_pgvector_literal(np.array([0.5, -1.0])) == "[0.50000000,-1.00000000]"
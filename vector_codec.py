@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import struct
+from typing import Union
+
+import numpy as np
+import psycopg
+from psycopg.adapt import Dumper, Loader
+from psycopg.pq import Format
+from psycopg.types import TypeInfo
+
+# Format binaire pgvector (vector_send / vector_recv):
+#   int16 dim | int16 unused | dim x float4 (big-endian)
+_HEADER = struct.Struct(">HH")
+_BE_F4 = np.dtype(">f4")
+
+
+def to_pgvector_literal(vec: np.ndarray) -> str:
+    """
+    Ancien format texte "[x1,x2,...]" (gardé pour le debug et le benchmark texte vs binaire).
+    """
+    vec_list = vec.astype(float).tolist()
+    return "[" + ",".join(f"{x:.8f}" for x in vec_list) + "]"
+
+
+def encode_vector_binary(vec: np.ndarray) -> bytes:
+    arr = np.asarray(vec, dtype=_BE_F4)
+    if arr.ndim != 1:
+        raise ValueError(f"Vecteur 1-D attendu, reçu shape={arr.shape}")
+    return _HEADER.pack(arr.shape[0], 0) + arr.tobytes()
+
+
+def decode_vector_binary(data: Union[bytes, bytearray, memoryview]) -> np.ndarray:
+    dim, _ = _HEADER.unpack_from(data)
+    return np.frombuffer(data, dtype=_BE_F4, count=dim, offset=_HEADER.size).astype(np.float32)
+
+
+class VectorBinaryDumper(Dumper):
+    """
+    np.ndarray -> vector (binaire). Aucun formatage Python élément par élément.
+    L'oid est fixé par register_vector() (il dépend de la base).
+    """
+
+    format = Format.BINARY
+
+    def dump(self, obj: np.ndarray) -> bytes:
+        return encode_vector_binary(obj)
+
+
+class VectorBinaryLoader(Loader):
+    format = Format.BINARY
+
+    def load(self, data) -> np.ndarray:
+        return decode_vector_binary(data)
+
+
+class VectorTextLoader(Loader):
+    format = Format.TEXT
+
+    def load(self, data) -> np.ndarray:
+        txt = bytes(data).decode("ascii").strip("[]")
+        return np.array(txt.split(","), dtype=np.float32) if txt else np.zeros(0, dtype=np.float32)
+
+
+def _register(ctx: psycopg.Connection | psycopg.AsyncConnection, info: TypeInfo) -> None:
+    info.register(ctx)
+    dumper = type("VectorBinaryDumper", (VectorBinaryDumper,), {"oid": info.oid})
+    ctx.adapters.register_dumper(np.ndarray, dumper)
+    ctx.adapters.register_loader(info.oid, VectorBinaryLoader)
+    ctx.adapters.register_loader(info.oid, VectorTextLoader)
+
+
+def register_vector(conn: psycopg.Connection) -> bool:
+    """
+    Enregistre l'adaptateur binaire sur la connexion.
+    Retourne False si l'extension pgvector n'est pas (encore) installée.
+    """
+    info = TypeInfo.fetch(conn, "vector")
+    if info is None:
+        return False
+    _register(conn, info)
+    return True
+
+
+async def register_vector_async(conn: psycopg.AsyncConnection) -> bool:
+    info = await TypeInfo.fetch(conn, "vector")
+    if info is None:
+        return False
+    _register(conn, info)
+    return True
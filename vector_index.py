@@ -0,0 +1,219 @@
+"""
+Gestion des index vectoriels pgvector: HNSW (m, ef_construction) ou IVFFlat (lists).
+
+L'index est construit avec CREATE INDEX CONCURRENTLY sous un nom temporaire (la table reste
+lisible et modifiable), puis remplace l'ancien index du même nom. L'avancement est lu dans
+pg_stat_progress_create_index depuis une seconde connexion.
+
+Usage:
+    python vector_index.py --list
+    python vector_index.py --method hnsw --m 16 --ef_construction 64
+    python vector_index.py --method ivfflat --lists 1000 --replace
+    python vector_index.py --method hnsw --storage halfvec --maintenance_work_mem 2GB
+"""
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import psycopg
+
+from config import settings
+from db import get_dsn
+
+INDEX_METHODS = ("hnsw", "ivfflat")
+
+# storage -> (expression indexée, opclass cosinus/hamming, préfixe du nom d'index).
+# Les expressions doivent rester identiques à celles des requêtes (retrieval._CANDIDATE_ORDER).
+_INDEXED = {
+    "full": ("vecteur", "vector_cosine_ops", "embeddings_vecteur"),
+    "halfvec": ("(vecteur::halfvec(384))", "halfvec_cosine_ops", "embeddings_vecteur_halfvec"),
+    "binary": ("(binary_quantize(vecteur)::bit(384))", "bit_hamming_ops", "embeddings_vecteur_bq"),
+}
+
+
+def index_name(storage: str, method: str) -> str:
+    # full/hnsw => embeddings_vecteur_hnsw (schema.sql), binary/hnsw => embeddings_vecteur_bq_hnsw...
+    return f"{_INDEXED[storage][2]}_{method}"
+
+
+# Tous les index vectoriels possibles (supprimés avant un chargement massif)
+VECTOR_INDEX_NAMES = tuple(index_name(s, m) for s in _INDEXED for m in INDEX_METHODS)
+
+
+@dataclass(frozen=True)
+class IndexParams:
+    method: str = settings.vector_index_method
+    storage: str = "full"
+    m: int = settings.hnsw_m  # HNSW: voisins par nœud (mémoire / rappel)
+    ef_construction: int = settings.hnsw_ef_construction  # HNSW: candidats à la construction (durée / qualité)
+    lists: int = settings.ivfflat_lists  # IVFFlat: ~ lignes / 1000 (sqrt(lignes) au-delà de 1M)
+
+    def with_options(self) -> str:
+        if self.method == "hnsw":
+            return f"m = {int(self.m)}, ef_construction = {int(self.ef_construction)}"
+        return f"lists = {int(self.lists)}"
+
+
+def create_index_sql(params: IndexParams, name: str, concurrently: bool = True) -> str:
+    """
+    CREATE INDEX pour params (noms et expressions internes, aucune valeur utilisateur brute).
+    Hors CONCURRENTLY, IF NOT EXISTS rend l'instruction idempotente (schéma à l'ingestion).
+    """
+    if params.method not in INDEX_METHODS:
+        raise ValueError(f"VECTOR_INDEX_METHOD inconnu: {params.method} (attendu: {', '.join(INDEX_METHODS)})")
+    expr, opclass, _ = _INDEXED[params.storage]
+    mode = "CONCURRENTLY" if concurrently else "IF NOT EXISTS"
+    return (
+        f"CREATE INDEX {mode} {name}\nON embeddings\n"
+        f"USING {params.method} ({expr} {opclass})\nWITH ({params.with_options()})"
+    )
+
+
+def list_vector_indexes(conn: psycopg.Connection) -> List[Dict[str, str]]:
+    """
+    Index hnsw / ivfflat de la table embeddings: nom, méthode, taille, validité, définition.
+    """
+    rows = conn.execute(
+        """
+        SELECT c.relname, am.amname, pg_size_pretty(pg_relation_size(c.oid)), i.indisvalid,
+               pg_get_indexdef(c.oid)
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_am am ON am.oid = c.relam
+        WHERE i.indrelid = 'embeddings'::regclass AND am.amname = ANY(%s)
+        ORDER BY c.relname
+        """,
+        (list(INDEX_METHODS),),
+    ).fetchall()
+    return [
+        {"name": r[0], "method": r[1], "size": r[2], "valid": "oui" if r[3] else "non", "definition": r[4]}
+        for r in rows
+    ]
+
+
+PROGRESS_SQL = """
+SELECT phase, blocks_done, blocks_total, tuples_done, tuples_total
+FROM pg_stat_progress_create_index
+WHERE pid = %s
+"""
+
+
+def _format_progress(row: Optional[Tuple]) -> str:
+    if row is None:
+        return "en attente"
+    phase, blocks_done, blocks_total, tuples_done, tuples_total = row
+    if tuples_total:
+        return f"{phase}: {tuples_done}/{tuples_total} lignes ({100 * tuples_done / tuples_total:.0f}%)"
+    if blocks_total:
+        return f"{phase}: {blocks_done}/{blocks_total} blocs ({100 * blocks_done / blocks_total:.0f}%)"
+    return str(phase)
+
+
+def build_index(
+    params: IndexParams,
+    replace: bool = False,
+    maintenance_work_mem: Optional[str] = None,
+    parallel_workers: Optional[int] = None,
+    poll_seconds: float = 2.0,
+) -> float:
+    """
+    Construit (ou reconstruit) l'index décrit par params sans bloquer les écritures.
+    replace=True supprime aussi l'index de l'autre méthode pour le même storage
+    (sinon le planificateur choisit lui-même entre HNSW et IVFFlat).
+    Retourne la durée de construction (s).
+    """
+    target = index_name(params.storage, params.method)
+    tmp = f"{target}_new"
+
+    # CONCURRENTLY est interdit dans une transaction => connexions autocommit, hors pool
+    with psycopg.connect(get_dsn(), autocommit=True) as conn, psycopg.connect(get_dsn(), autocommit=True) as monitor:
+        if maintenance_work_mem:
+            conn.execute("SELECT set_config('maintenance_work_mem', %s, false)", (maintenance_work_mem,))
+        if parallel_workers is not None:
+            conn.execute(
+                "SELECT set_config('max_parallel_maintenance_workers', %s, false)", (str(parallel_workers),)
+            )
+        # Reste d'une construction interrompue (index INVALID)
+        conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {tmp}")
+
+        pid = conn.info.backend_pid
+        error: List[BaseException] = []
+
+        def run() -> None:
+            try:
+                conn.execute(create_index_sql(params, tmp))
+            except BaseException as e:
+                error.append(e)
+
+        print(f"[INDEX] {target}: {params.method} ({params.with_options()}), storage={params.storage}")
+        t0 = time.perf_counter()
+        worker = threading.Thread(target=run, name="create-index", daemon=True)
+        worker.start()
+        last = ""
+        while worker.is_alive():
+            worker.join(poll_seconds)
+            if worker.is_alive():
+                status = _format_progress(monitor.execute(PROGRESS_SQL, (pid,)).fetchone())
+                if status != last:
+                    print(f"[INDEX] {time.perf_counter() - t0:6.1f}s {status}")
+                    last = status
+        if error:
+            conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {tmp}")
+            raise error[0]
+        seconds = time.perf_counter() - t0
+
+        # Bascule: l'ancien index sert les requêtes pendant toute la construction
+        to_drop = [target]
+        if replace:
+            to_drop += [index_name(params.storage, m) for m in INDEX_METHODS if m != params.method]
+        for name in to_drop:
+            conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+        conn.execute(f"ALTER INDEX {tmp} RENAME TO {target}")
+        conn.execute("ANALYZE embeddings")
+
+    print(f"[INDEX] {target} construit en {seconds:.1f}s")
+    return seconds
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from retrieval import VECTOR_STORAGES
+
+    parser = argparse.ArgumentParser(description="Construit un index pgvector HNSW / IVFFlat (CONCURRENTLY).")
+    parser.add_argument("--list", action="store_true", help="Affiche les index vectoriels existants et quitte")
+    parser.add_argument("--method", choices=INDEX_METHODS, default=settings.vector_index_method)
+    parser.add_argument(
+        "--storage", choices=VECTOR_STORAGES, default=settings.vector_storage, help="Colonne indexée (VECTOR_STORAGE)"
+    )
+    parser.add_argument("--m", type=int, default=settings.hnsw_m, help="HNSW: voisins par nœud")
+    parser.add_argument(
+        "--ef_construction", type=int, default=settings.hnsw_ef_construction, help="HNSW: candidats pendant la construction"
+    )
+    parser.add_argument("--lists", type=int, default=settings.ivfflat_lists, help="IVFFlat: nombre de listes")
+    parser.add_argument("--replace", action="store_true", help="Supprime l'index de l'autre méthode (même storage)")
+    parser.add_argument("--maintenance_work_mem", default=None, help="Ex: 2GB (construction HNSW en mémoire)")
+    parser.add_argument("--parallel_workers", type=int, default=None, help="max_parallel_maintenance_workers")
+    args = parser.parse_args()
+
+    if args.list:
+        with psycopg.connect(get_dsn()) as conn:
+            for idx in list_vector_indexes(conn):
+                print(f"{idx['name']:<40} {idx['method']:<8} {idx['size']:>10} valide={idx['valid']}")
+                print(f"    {idx['definition']}")
+    else:
+        build_index(
+            IndexParams(
+                method=args.method,
+                storage=args.storage,
+                m=args.m,
+                ef_construction=args.ef_construction,
+                lists=args.lists,
+            ),
+            replace=args.replace,
+            maintenance_work_mem=args.maintenance_work_mem,
+            parallel_workers=args.parallel_workers,
+        )
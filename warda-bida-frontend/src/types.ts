@@ -3,6 +3,8 @@ export type SearchResult = {
   score: number; // 0..1
   texte_fragment: string;
   phrase_llm?: string;
+  llm_latency_ms?: number | null; // durée de l'appel LLM (mode per_result)
+  llm_error?: string | null; // ex: "timeout" (résultat partiel)
 };
 
 export type SearchResponse = {
@@ -10,6 +12,7 @@ export type SearchResponse = {
   top_k: number;
   results: SearchResult[];
   final_answer?: string | null;
+  final_answer_latency_ms?: number | null;
 };
 
 export type SearchRequest = {